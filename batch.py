@@ -0,0 +1,96 @@
+import csv
+import json
+import os
+import sys
+import time
+
+import diagnostics
+from cache import SegmentCache, cache_dir_for
+from loader import (
+    find_geojson_files, load_files, simulate_segments, simulation_key, score_segments, SIMULATION_SEED,
+)
+from model import TIER_LABELS
+
+# --- Пакетный режим без GUI ---
+# Скоринг всех участков из каталога и потоковая запись результатов в .jsonl или .csv.
+# Модуль не импортирует PyQt5, reportlab и openpyxl.
+
+CHUNK_SIZE = 5000
+
+OUTPUT_FIELDS = [
+    'ST_NAME', 'RoadClass', 'CurLoad', 'PredictiveLoad', 'Width', 'Lanes',
+    'CrossRoad', 'Control', 'WeatherImpact',
+    'Severity', 'Tier', 'TierLabel', 'Action', 'ActionCost', 'EffectReduction', 'SourceFile',
+]
+
+
+def _row_writer(f, output_format):
+    """Функция записи одной строки результата в выбранном формате."""
+    if output_format == 'csv':
+        writer = csv.DictWriter(f, fieldnames=OUTPUT_FIELDS)
+        writer.writeheader()
+        return writer.writerow
+    return lambda row: f.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+
+def iter_result_rows(segments, scores, source_file):
+    """Строки результата для порции участков (segments.SegmentStore) и их пакетного скоринга."""
+    actions = scores['actions']
+    fields = OUTPUT_FIELDS[:11]
+    columns = [segments.field_values(field) for field in fields]
+    for values, action_index in zip(zip(*columns), scores['action'].tolist()):
+        action = actions[action_index]
+        row = dict(zip(fields, values))
+        row.update(
+            TierLabel=TIER_LABELS[row['Tier'] - 1],
+            Action=action['name'],
+            ActionCost=action['cost'],
+            EffectReduction=action['effect_reduction'],
+            SourceFile=source_file,
+        )
+        yield row
+
+
+def run_batch(data_dir, out_path, load_workers=0, use_cache=True, log=sys.stderr, seed=SIMULATION_SEED,
+              history=None):
+    """
+    Скоринг всех .geojson в data_dir с записью результатов в out_path
+    (.csv - CSV, иначе JSON Lines). seed - сид симуляции дополнительных факторов,
+    history - история нагрузки для прогноза PredictiveLoad (history.LoadHistory).
+    Возвращает код завершения процесса.
+    """
+    started = time.perf_counter()
+    geojson_files = find_geojson_files(data_dir)
+    if not geojson_files:
+        print("Ошибка: Файлы .geojson не найдены.", file=log)
+        return 1
+
+    output_format = 'csv' if out_path.lower().endswith('.csv') else 'jsonl'
+    cache = SegmentCache(cache_dir_for(data_dir)) if use_cache else None
+    errors = []
+    rows = 0
+
+    with open(out_path, 'w', encoding='utf-8', newline='') as f:
+        write_row = _row_writer(f, output_format)
+        for filepath, file_segments, error in load_files(geojson_files, load_workers, cache):
+            if error:
+                errors.append(error)
+                print(error, file=log)
+                continue
+            # Ключ симуляции - путь относительно data_dir: результаты совпадают с GUI
+            simulate_segments(file_segments, seed, simulation_key(filepath, data_dir), history)
+            for start in range(0, len(file_segments), CHUNK_SIZE):
+                segments, scores = score_segments(file_segments[start:start + CHUNK_SIZE])
+                with diagnostics.stage('write_rows', len(segments)):
+                    for row in iter_result_rows(segments, scores, filepath):
+                        write_row(row)
+                rows += len(segments)
+
+    if not rows and not errors:
+        print("Предупреждение: Файлы .geojson найдены, но не содержат корректных данных.", file=log)
+    print(
+        f"Участков: {rows}, файлов: {len(geojson_files)}, ошибок: {len(errors)}, сид симуляции: {seed}, "
+        f"время: {time.perf_counter() - started:.2f} с -> {out_path}",
+        file=log,
+    )
+    return 0 if rows else 1
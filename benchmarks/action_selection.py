@@ -0,0 +1,55 @@
+"""
+Регрессионный бенчмарк выбора мероприятия: стоимость вызова select_optimal_action
+не должна расти с числом вызовов (ранее библиотека мероприятий увеличивалась
+при каждом вызове для магистралей).
+
+Запуск: python benchmarks/action_selection.py
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model  # noqa: E402
+
+BATCHES = 20
+CALLS_PER_BATCH = 20000
+# Допустимый рост времени вызова между первыми и последними пачками
+MAX_GROWTH = 1.5
+
+
+def measure():
+    """Время одного вызова (мкс) по пачкам для всех сочетаний ТИР x класс дороги."""
+    combos = [(tier, road_class) for tier in model.TIER_LABELS for road_class in model.ROAD_CLASSES]
+    timings = []
+    for _ in range(BATCHES):
+        start = time.perf_counter()
+        for i in range(CALLS_PER_BATCH):
+            tier, road_class = combos[i % len(combos)]
+            model.select_optimal_action(tier, road_class)
+        timings.append((time.perf_counter() - start) / CALLS_PER_BATCH * 1e6)
+    return timings
+
+
+def main():
+    library_size = sum(len(actions) for actions in model.ACTION_LIBRARY.values())
+    timings = measure()
+    head = statistics.median(timings[:5])
+    tail = statistics.median(timings[-5:])
+    growth = tail / head
+    library_growth = sum(len(actions) for actions in model.ACTION_LIBRARY.values()) - library_size
+
+    print(f"вызовов: {BATCHES * CALLS_PER_BATCH}")
+    print(f"время вызова, мкс: начало {head:.3f}, конец {tail:.3f} (x{growth:.2f})")
+    print(f"рост библиотеки мероприятий: {library_growth}")
+
+    if growth > MAX_GROWTH or library_growth:
+        print("РЕГРЕССИЯ: стоимость вызова не постоянна")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""
+Бенчмарк запуска пакетного режима: время от старта интерпретатора до готовности
+к работе и проверка, что PyQt5, reportlab и openpyxl не импортируются.
+
+Запуск: python benchmarks/headless_startup.py
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNS = 5
+STARTUP_BUDGET_MS = 500
+HEAVY_MODULES = ('PyQt5', 'reportlab', 'openpyxl')
+
+FEATURE = {
+    'type': 'Feature',
+    'properties': {'ST_NAME': 'ул. Тестовая', 'Width': 9, 'CurLoad': 0.7, 'Control': '1', 'CrossRoad': '0'},
+}
+
+
+def imported_heavy_modules():
+    """Тяжелые модули, загруженные при импорте main и batch."""
+    code = (
+        "import sys, main, batch; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return [name for name in output.stdout.strip().split(',') if name]
+
+
+def batch_run_times(data_dir):
+    """Полное время процесса `main.py --batch` на одном участке, мс."""
+    out_path = os.path.join(data_dir, 'results.jsonl')
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, os.path.join(ROOT, 'main.py'), '--batch', data_dir, '--out', out_path, '--no-cache'],
+            capture_output=True, check=True,
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    heavy = imported_heavy_modules()
+    with tempfile.TemporaryDirectory() as data_dir:
+        with open(os.path.join(data_dir, 'one.geojson'), 'w', encoding='utf-8') as f:
+            json.dump({'type': 'FeatureCollection', 'features': [FEATURE]}, f, ensure_ascii=False)
+        timings = batch_run_times(data_dir)
+
+    median = statistics.median(timings)
+    print(f"пакетный режим (1 участок), мс: медиана {median:.0f}, мин {min(timings):.0f}, макс {max(timings):.0f}")
+    print(f"тяжелые модули при импорте: {', '.join(heavy) or 'нет'}")
+
+    if heavy or median > STARTUP_BUDGET_MS:
+        print(f"РЕГРЕССИЯ: бюджет запуска {STARTUP_BUDGET_MS} мс без GUI/отчетных библиотек")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
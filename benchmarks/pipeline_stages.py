@@ -0,0 +1,375 @@
+"""
+Бенчмарк конвейера по стадиям на синтетической сети (см. synthetic_geojson.py):
+поиск файлов, разбор JSON, построение хранилища участков, симуляция, скоринг
+(пакетный, select_optimal_action, get_recommendation), пространственный индекс
+(построение и запросы), поиск по названию (индекс и запросы), граф дорожной сети
+и перетекание заторов, история нагрузки (дописывание дней и прогноз), сценарный
+анализ Монте-Карло, запросы к сервису анализа, модель таблицы (с сортировкой,
+фильтром и сводкой по ТИРам) и выгрузка отчетов. Результаты (вместе с памятью
+колонок на участок) пишутся в JSON для
+сравнения между версиями. Qt работает без дисплея (QT_QPA_PLATFORM=offscreen).
+
+Запуск: python benchmarks/pipeline_stages.py --sizes 1000 100000 1000000 [--out results.json]
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import numpy as np  # noqa: E402
+
+import model  # noqa: E402
+import reports  # noqa: E402
+import scenarios  # noqa: E402
+import synthetic_geojson  # noqa: E402
+from history import HOURS_PER_DAY, LoadHistory  # noqa: E402
+from loader import (  # noqa: E402
+    build_segment_record, find_geojson_files, iter_geojson_features, simulate_segments, simulation_key,
+)
+from network import RoadGraph  # noqa: E402
+from search import SegmentSearch  # noqa: E402
+from segments import SegmentStore, TierSummary  # noqa: E402
+from service import AnalysisService  # noqa: E402
+from spatial import SpatialIndex  # noqa: E402
+
+FEATURES_PER_FILE = 20_000
+MAX_FILES = 500
+# Строки таблицы, отрисовываемые в видимой области окна
+VISIBLE_ROWS = 50
+# Запросов к пространственному индексу каждого вида и радиус поиска (м)
+SPATIAL_QUERIES = 1000
+SPATIAL_RADIUS_M = 300
+# Запросов поиска по названию (префиксы и фрагменты имен участков) и строк в выдаче
+SEARCH_QUERIES = 1000
+SEARCH_LIMIT = 50
+# Запросов к сервису анализа (оценка и рекомендация участка, гистограмма) и соединений
+SERVICE_REQUESTS = 5000
+SERVICE_CONNECTIONS = 16
+
+
+class StageTimer:
+    """Накопитель времени и числа элементов по стадиям."""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name, items=0):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, items)
+
+    def add(self, name, seconds, items):
+        stage = self.stages.setdefault(name, {'seconds': 0.0, 'items': 0})
+        stage['seconds'] += seconds
+        stage['items'] += items
+
+    def results(self):
+        return [
+            {
+                'stage': name,
+                'seconds': round(stage['seconds'], 6),
+                'items': stage['items'],
+                'items_per_second': round(stage['items'] / stage['seconds'], 1) if stage['seconds'] else None,
+            }
+            for name, stage in self.stages.items()
+        ]
+
+
+def auto_files(features):
+    return max(1, min(MAX_FILES, features // FEATURES_PER_FILE))
+
+
+def run_pipeline(data_dir, args, timer):
+    """Прогон всех стадий на каталоге data_dir; возвращает (число участков, байт колонок на участок)."""
+    start = time.perf_counter()
+    paths = find_geojson_files(data_dir)
+    timer.add('discovery', time.perf_counter() - start, len(paths))
+
+    segments = SegmentStore()
+    for path in paths:
+        start = time.perf_counter()
+        with open(path, 'r', encoding='utf-8') as f:
+            features = list(iter_geojson_features(f))
+        timer.add('parsing', time.perf_counter() - start, len(features))
+
+        with timer.stage('record_building', len(features)):
+            built = SegmentStore.from_records(
+                record for record in map(build_segment_record, features) if record is not None
+            )
+        del features
+
+        with timer.stage('simulation', len(built)):
+            simulate_segments(built, args.seed, simulation_key(path, data_dir))
+        with timer.stage('store_append', len(built)):
+            segments.extend(built)
+
+    with timer.stage('scoring_batch', len(segments)):
+        scores = model.score_batch(**segments.score_columns())
+        segments.severity[:] = scores['severity']
+        segments.tier[:] = scores['tier']
+
+    sample = segments[:args.scalar_sample]
+    with timer.stage('select_optimal_action', len(sample)):
+        for item in sample:
+            model.select_optimal_action(model.TIER_LABELS[item['Tier'] - 1], item['RoadClass'])
+    with timer.stage('get_recommendation', len(sample)):
+        for item in sample:
+            model.get_recommendation(item)
+
+    run_spatial_queries(segments, args, timer)
+    run_name_search(segments, args, timer)
+    run_network(segments, timer)
+    if args.history_days:
+        run_load_history(segments, args, timer)
+    if args.scenarios:
+        # Единица стадии - пара (участок, сценарий)
+        with timer.stage('scenarios', len(segments) * args.scenarios):
+            scenarios.run_scenarios(segments, args.scenarios, args.seed, workers=args.scenario_workers)
+    run_service_requests(segments, args, timer)
+    run_table_model(segments, timer)
+    run_reports(segments[:args.report_rows], args, timer)
+    return len(segments), segments.nbytes() / len(segments) if len(segments) else None
+
+
+def run_spatial_queries(segments, args, timer):
+    """Построение пространственного индекса и запросы в случайных точках сети."""
+    with timer.stage('spatial_index', len(segments)):
+        index = SpatialIndex.build(segments)
+    coords = segments.coords
+    if not len(coords):
+        return
+    rng = np.random.default_rng(args.seed)
+    low, high = np.nanmin(coords, axis=0), np.nanmax(coords, axis=0)
+    points = (low + (high - low) * rng.random((SPATIAL_QUERIES, 2))).tolist()
+    with timer.stage('spatial_nearest', len(points)):
+        for lon, lat in points:
+            index.nearest(lon, lat)
+    with timer.stage('spatial_radius', len(points)):
+        for lon, lat in points:
+            index.query_radius(lon, lat, SPATIAL_RADIUS_M)
+
+
+def run_name_search(segments, args, timer):
+    """Построение индекса поиска по названию и запросы по фрагментам случайных имен."""
+    search = SegmentSearch(segments)
+    with timer.stage('search_index', len(segments.names)):
+        search.prepare()
+    if not len(segments):
+        return
+    rng = np.random.default_rng(args.seed)
+    queries = []
+    for row in rng.integers(0, len(segments), SEARCH_QUERIES).tolist():
+        name = segments[row]['ST_NAME']
+        start = int(rng.integers(0, max(1, len(name) - 2)))
+        queries.append(name[start:start + int(rng.integers(1, 8))])
+    with timer.stage('search_query', len(queries)):
+        for query in queries:
+            search.search(query, SEARCH_LIMIT)
+
+
+def run_network(segments, timer):
+    """Граф смежности по общим концам линий и перетекание заторов с пересчетом Индекса."""
+    with timer.stage('road_graph', len(segments)):
+        graph = RoadGraph.build(segments)
+    columns = segments.score_columns()
+    start = time.perf_counter()
+    spillover, iterations = graph.spillover(np.maximum(columns['cur_load'], columns['pred_load']))
+    # Единица стадии - ненулевой элемент матрицы смежности за одну итерацию
+    timer.add('spillover', time.perf_counter() - start, len(graph.indices) * iterations)
+    with timer.stage('scoring_spillover', len(segments)):
+        model.score_batch(**columns, spillover=spillover)
+
+
+def run_load_history(segments, args, timer):
+    """История нагрузки во временном каталоге: дописывание --history-days дней снимков и прогноз."""
+    rng = np.random.default_rng(args.seed)
+    n = len(segments)
+    base = segments.cur_load.astype(np.float32)
+    trend = rng.normal(0, 0.003, n).astype(np.float32)
+    with tempfile.TemporaryDirectory() as history_dir:
+        history = LoadHistory.create(history_dir, [('synthetic', n)], '2026-01-01')
+        for day in range(args.history_days):
+            loads = base[:, None] + trend[:, None] * day + rng.normal(0, 0.02, (n, HOURS_PER_DAY)).astype(np.float32)
+            with timer.stage('history_append', n):
+                history.append_day(loads)
+        with timer.stage('history_forecast', n):
+            history.forecast()
+        with timer.stage('history_window', n * HOURS_PER_DAY):
+            float(history.window((args.history_days - 1) * HOURS_PER_DAY).mean())
+        # memory-map закрывается до удаления каталога
+        del history
+
+
+def run_service_requests(segments, args, timer):
+    """Сервис анализа на свободном порту и клиенты с keep-alive в том же цикле событий."""
+    if not len(segments):
+        return
+    rng = np.random.default_rng(args.seed)
+    paths = [
+        f'/segments/{row}/{kind}'
+        for row, kind in zip(rng.integers(0, len(segments), SERVICE_REQUESTS).tolist(),
+                             rng.choice(['score', 'recommendation'], SERVICE_REQUESTS).tolist())
+    ]
+    paths[::10] = ['/histogram'] * len(paths[::10])
+
+    async def client(port, requests):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        for path in requests:
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode('ascii'))
+            await writer.drain()
+            await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line == b'\r\n':
+                    break
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+            await reader.readexactly(length)
+        writer.close()
+
+    async def run():
+        service = AnalysisService(segments, workers=0)
+        server = await service.start('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            with timer.stage('service_requests', len(paths)):
+                await asyncio.gather(*(client(port, paths[k::SERVICE_CONNECTIONS]) for k in range(SERVICE_CONNECTIONS)))
+
+    asyncio.run(run())
+
+
+def run_table_model(segments, timer):
+    """
+    Построение модели таблицы порциями (как при загрузке) и отрисовка видимых строк;
+    сортировка и фильтр прокси-модели, полный пересчет сводки по ТИРам и классам дорог.
+    """
+    from PyQt5.QtCore import Qt
+    from PyQt5.QtWidgets import QApplication, QTableView
+    import gui
+
+    app = QApplication.instance() or QApplication([sys.argv[0]])
+    with timer.stage('table_model', len(segments)):
+        view = QTableView()
+        table_model = gui.SegmentTableModel(SegmentStore())
+        view.setModel(table_model)
+        for start in range(0, len(segments), gui.DataLoadWorker.CHUNK_SIZE):
+            table_model.append_rows(segments[start:start + gui.DataLoadWorker.CHUNK_SIZE])
+        for row in range(min(VISIBLE_ROWS, table_model.rowCount())):
+            for column in range(table_model.columnCount()):
+                index = table_model.index(row, column)
+                table_model.data(index, Qt.DisplayRole)
+                table_model.data(index, Qt.BackgroundRole)
+        app.processEvents()
+    view_model = gui.SegmentViewModel(table_model)
+    view.setModel(view_model)
+    with timer.stage('view_sort', len(segments)):
+        view_model.sort(9, Qt.DescendingOrder)
+        app.processEvents()
+    with timer.stage('view_filter', len(segments)):
+        view_model.set_filter(tier=1, min_load=0.5)
+        app.processEvents()
+    with timer.stage('summary', len(segments)):
+        TierSummary().add(table_model.segments.tier, table_model.segments.road_class)
+    view.deleteLater()
+    app.processEvents()
+
+
+def run_reports(segments, args, timer):
+    """Выгрузка отчетов по первым --report-rows участкам во временный каталог."""
+    if not segments:
+        return
+    with tempfile.TemporaryDirectory() as out_dir:
+        if reports.excel_available():
+            with timer.stage('report_excel', len(segments)):
+                reports.export_excel(os.path.join(out_dir, 'report.xlsx'), segments)
+        if reports.pdf_available():
+            with timer.stage('report_pdf', len(segments)):
+                reports.export_pdf(os.path.join(out_dir, 'report.pdf'), segments, workers=args.pdf_workers)
+
+
+def git_revision():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True)
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк стадий конвейера на синтетической сети")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100_000],
+                        help="числа объектов GeoJSON (от 1k до 10M)")
+    parser.add_argument('--files', type=int, default=0,
+                        help=f"число файлов (0 - по одному на {FEATURES_PER_FILE} объектов)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scalar-sample', type=int, default=10_000,
+                        help="участков для стадий select_optimal_action и get_recommendation")
+    parser.add_argument('--report-rows', type=int, default=20_000,
+                        help="участков в отчетах Excel/PDF (0 - без отчетов)")
+    parser.add_argument('--pdf-workers', type=int, default=None)
+    parser.add_argument('--scenarios', type=int, default=200,
+                        help="сценариев Монте-Карло по всем участкам (0 - без сценарного анализа)")
+    parser.add_argument('--scenario-workers', type=int, default=None)
+    parser.add_argument('--history-days', type=int, default=14,
+                        help="дней почасовой истории нагрузки для стадий history_* (0 - без истории)")
+    parser.add_argument('--data-dir', help="каталог для сгенерированных данных (по умолчанию временный)")
+    parser.add_argument('--out', default='pipeline_stages.json', help="файл результатов JSON")
+    args = parser.parse_args()
+
+    runs = []
+    for features in args.sizes:
+        files = args.files or auto_files(features)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            data_dir = os.path.join(args.data_dir or tmp_dir, f'synthetic_{features}_{files}_{args.seed}')
+            start = time.perf_counter()
+            if not os.path.isdir(data_dir):
+                synthetic_geojson.generate(data_dir, features, files, args.seed)
+            generation = time.perf_counter() - start
+
+            timer = StageTimer()
+            records, bytes_per_segment = run_pipeline(data_dir, args, timer)
+
+        run = {'features': features, 'files': files, 'records': records,
+               'store_bytes_per_segment': bytes_per_segment,
+               'generation_seconds': round(generation, 3), 'stages': timer.results()}
+        runs.append(run)
+        print(f"\n{features} объектов, {files} файлов, {records} участков")
+        for stage in run['stages']:
+            rate = f"{stage['items_per_second']:,.0f}/с" if stage['items_per_second'] else "-"
+            print(f"  {stage['stage']:<24}{stage['seconds']:>10.3f} с{stage['items']:>12}  {rate}")
+
+    result = {
+        'benchmark': 'pipeline_stages',
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': args.seed,
+        'runs': runs,
+    }
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультаты: {args.out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
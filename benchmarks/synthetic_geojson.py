@@ -0,0 +1,114 @@
+"""
+Детерминированный генератор синтетической сети УДС в формате GeoJSON для бенчмарков.
+
+Участки - ребра регулярной сетки улиц (LineString с общими концами на перекрестках),
+свойства - поля, которые требует загрузчик (ST_NAME, Width, CurLoad, Control,
+CrossRoad). Около 0.5% объектов намеренно без CurLoad - загрузчик их пропускает.
+Одинаковые параметры (число объектов, файлов, seed) дают побайтно одинаковые файлы.
+
+Запуск: python benchmarks/synthetic_geojson.py OUT_DIR --features 100000 --files 20 [--seed 0]
+"""
+import argparse
+import json
+import math
+import os
+import random
+
+ORIGIN_LON, ORIGIN_LAT = 37.55, 55.70
+GRID_STEP = 0.0012
+INVALID_SHARE = 0.005
+
+STREET_KINDS = ('ул.', 'пр-т', 'пер.', 'ш.', 'наб.', 'б-р')
+STREET_NAMES = (
+    'Тверская', 'Ленинский', 'Арбат', 'Садовая', 'Профсоюзная', 'Мира', 'Вернадского',
+    'Щербаковская', 'Новослободская', 'Пресненская', 'Ёлочная', 'Юности', 'Октябрьская',
+    'Берёзовая', 'Каширское', 'Рязанский', 'Лесная', 'Никольская', 'Остоженка', 'Полянка',
+)
+
+
+def street_name(kind_index, number):
+    """Имя улицы линии сетки: одинаково для всех участков линии."""
+    kind = STREET_KINDS[number % len(STREET_KINDS)]
+    name = STREET_NAMES[(number * 7 + kind_index) % len(STREET_NAMES)]
+    return f"{kind} {name}-{number}"
+
+
+def grid_size(features):
+    """Сторона квадратной сетки, в которой не меньше features ребер."""
+    return max(2, math.isqrt(features // 2) + 2)
+
+
+def make_feature(index, side, rng):
+    """Объект GeoJSON для ребра сетки с номером index (четные - горизонтальные)."""
+    node, vertical = divmod(index, 2)
+    row, col = divmod(node, side)
+    if vertical:
+        end_row, end_col = row + 1, col
+        name = street_name(1, col)
+    else:
+        end_row, end_col = row, col + 1
+        name = street_name(0, row)
+    coordinates = [
+        [round(ORIGIN_LON + col * GRID_STEP, 6), round(ORIGIN_LAT + row * GRID_STEP, 6)],
+        [round(ORIGIN_LON + end_col * GRID_STEP, 6), round(ORIGIN_LAT + end_row * GRID_STEP, 6)],
+    ]
+
+    width_kind = rng.random()
+    if width_kind < 0.05:
+        width = None
+    elif width_kind < 0.6:
+        width = rng.randint(6, 30)
+    else:
+        width = round(rng.uniform(5.0, 32.0), 1)
+    properties = {
+        'ST_NAME': name,
+        'Width': width,
+        'CurLoad': round(rng.random(), 3),
+        'Control': '1' if rng.random() < 0.35 else '0',
+        'CrossRoad': '1' if rng.random() < 0.4 else '0',
+    }
+    if rng.random() < INVALID_SHARE:
+        del properties['CurLoad']
+    return {'type': 'Feature', 'geometry': {'type': 'LineString', 'coordinates': coordinates}, 'properties': properties}
+
+
+def generate(out_dir, features, files=1, seed=0):
+    """
+    Записывает features объектов в files файлов out_dir/segments_NNNN.geojson.
+    Возвращает список путей. Каждый файл пишется потоково, по объекту.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    files = max(1, min(files, features))
+    side = grid_size(features)
+    per_file, extra = divmod(features, files)
+    paths = []
+    index = 0
+    for file_index in range(files):
+        rng = random.Random(seed * 1_000_003 + file_index)
+        count = per_file + (1 if file_index < extra else 0)
+        path = os.path.join(out_dir, f'segments_{file_index:04d}.geojson')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('{"type": "FeatureCollection", "features": [\n')
+            for i in range(count):
+                if i:
+                    f.write(',\n')
+                f.write(json.dumps(make_feature(index, side, rng), ensure_ascii=False))
+                index += 1
+            f.write('\n]}\n')
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синтетическая сеть УДС (GeoJSON) для бенчмарков")
+    parser.add_argument('out_dir')
+    parser.add_argument('--features', type=int, default=100_000)
+    parser.add_argument('--files', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    paths = generate(args.out_dir, args.features, args.files, args.seed)
+    print(f"{args.features} объектов в {len(paths)} файлах: {args.out_dir}")
+
+
+if __name__ == '__main__':
+    main()
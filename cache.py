@@ -0,0 +1,266 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from segments import SegmentStore
+
+# --- Дисковый кэш разобранных участков ---
+# Для каждого исходного .geojson хранится каталог с колонками хранилища участков
+# (segments.SegmentStore) в формате .npy (читаются через memory-map и принимаются
+# хранилищем без копирования). Запись кэша действительна, пока у исходного файла
+# не изменились размер и время модификации.
+#
+# Кэш хранится не в каталоге данных (он может быть только для чтения или общим),
+# а в пользовательском кэше ОС: <корень>/<хэш абсолютного пути каталога данных>.
+# У каждого каталога данных свой каталог кэша, поэтому удаление устаревших записей
+# при загрузке одного набора не затрагивает другие. Корень задается --cache-dir.
+
+CACHE_APP_NAME = 'kait'
+MANIFEST_NAME = 'manifest.json'
+CACHE_FORMAT_VERSION = 3
+
+# Разделитель имен в колонке NameTable (таблица интернированных имен улиц)
+_NAME_SEPARATOR = '\x00'
+
+_cache_root = None
+
+
+def default_cache_root():
+    """Каталог кэша приложения в пользовательском кэше ОС."""
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), 'AppData', 'Local')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, CACHE_APP_NAME)
+
+
+def set_cache_root(path):
+    """Задает корневой каталог кэша (None - пользовательский кэш ОС)."""
+    global _cache_root
+    _cache_root = path
+
+
+def cache_root():
+    return _cache_root or default_cache_root()
+
+
+def cache_dir_for(data_root='.'):
+    """Каталог кэша для каталога данных data_root."""
+    key = os.path.abspath(data_root)
+    return os.path.join(cache_root(), hashlib.sha1(key.encode('utf-8')).hexdigest()[:16])
+
+
+def file_signature(filepath):
+    """Размер и время модификации файла - ключ актуальности записи кэша."""
+    stat = os.stat(filepath)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def store_to_columns(store):
+    """
+    Колонки кэша для хранилища участков разобранного файла (исходные поля
+    ST_NAME, Width, CurLoad, Control, CrossRoad, Lanes и вершины геометрии).
+    Возвращает None, если имена не укладываются в формат кэша.
+    """
+    names = store.names
+    if any(_NAME_SEPARATOR in name for name in names):
+        return None
+    return {
+        'NameTable': np.frombuffer(_NAME_SEPARATOR.join(names).encode('utf-8'), dtype=np.uint8),
+        'Name': store.name,
+        'Width': store.width,
+        'WidthKind': store.width_kind,
+        'CurLoad': store.cur_load,
+        'Control': store.control,
+        'CrossRoad': store.crossroad,
+        'Lanes': store.lanes,
+        'VertexStart': store.vertex_start,
+        'VertexCount': store.vertex_count,
+        'Coords': store.coords,
+    }
+
+
+def columns_to_store(columns, rows):
+    """Восстанавливает хранилище участков из колонок кэша."""
+    if rows == 0:
+        return SegmentStore()
+    return SegmentStore.from_arrays(
+        bytes(columns['NameTable']).decode('utf-8').split(_NAME_SEPARATOR),
+        columns['Name'],
+        columns['CurLoad'],
+        coords=columns['Coords'],
+        width=columns['Width'],
+        width_kind=columns['WidthKind'],
+        control=columns['Control'],
+        crossroad=columns['CrossRoad'],
+        lanes=columns['Lanes'],
+        vertex_start=columns['VertexStart'],
+        vertex_count=columns['VertexCount'],
+    )
+
+
+def _replace_dir(src, dst):
+    """
+    Переименовывает каталог src в dst. Существующий dst сначала переносится в сторону
+    и удаляется после замены (каталог нельзя заменить непустым через os.replace); файлы,
+    открытые через memory-map, остаются доступны до закрытия (на Windows перенос
+    каталога с открытыми файлами не удается - OSError).
+    """
+    try:
+        os.replace(src, dst)
+        return
+    except OSError:
+        if not os.path.isdir(dst):
+            raise
+    old = tempfile.mkdtemp(prefix=os.path.basename(dst) + '.', suffix='.old', dir=os.path.dirname(dst))
+    os.rmdir(old)
+    os.replace(dst, old)
+    try:
+        os.replace(src, dst)
+    except OSError:
+        os.replace(old, dst)
+        raise
+    shutil.rmtree(old, ignore_errors=True)
+
+
+class SegmentCache:
+    """Кэш разобранных участков по исходным файлам (ключ - путь, размер и mtime)."""
+
+    COLUMNS = (
+        'NameTable', 'Name', 'Width', 'WidthKind', 'CurLoad', 'Control', 'CrossRoad', 'Lanes',
+        'VertexStart', 'VertexCount', 'Coords',
+    )
+
+    def __init__(self, cache_dir=None):
+        """cache_dir - каталог кэша (по умолчанию - cache_dir_for для текущего каталога)."""
+        self.cache_dir = cache_dir_for() if cache_dir is None else cache_dir
+        self._manifest_path = os.path.join(self.cache_dir, MANIFEST_NAME)
+        self._entries = self._read_manifest()
+        self._dirty = False
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get('version') != CACHE_FORMAT_VERSION:
+            return {}
+        return manifest.get('entries', {})
+
+    @staticmethod
+    def _key(filepath):
+        return os.path.abspath(filepath)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest()[:16])
+
+    def is_fresh(self, filepath):
+        """Есть ли действительная запись для файла (размер и mtime не изменились)."""
+        entry = self._entries.get(self._key(filepath))
+        if entry is None:
+            return False
+        try:
+            signature = file_signature(filepath)
+        except OSError:
+            return False
+        return entry['size'] == signature['size'] and entry['mtime_ns'] == signature['mtime_ns']
+
+    def load_columns(self, filepath):
+        """Колонки файла из кэша (memory-map) или None, если запись недействительна."""
+        key = self._key(filepath)
+        if not self.is_fresh(filepath):
+            return None
+        entry_dir = self._entry_dir(key)
+        try:
+            columns = {
+                name: np.load(os.path.join(entry_dir, name + '.npy'), mmap_mode='r')
+                for name in self.COLUMNS
+            }
+        except (OSError, ValueError):
+            self._evict(key)
+            return None
+        return columns, self._entries[key]['rows']
+
+    def load(self, filepath):
+        """Хранилище участков файла (segments.SegmentStore) из кэша или None."""
+        cached = self.load_columns(filepath)
+        if cached is None:
+            return None
+        return columns_to_store(*cached)
+
+    def store(self, filepath, segments, signature=None):
+        """
+        Сохраняет участки файла (segments.SegmentStore). signature - размер/mtime,
+        снятые до разбора файла, чтобы изменение файла во время чтения не попало
+        в кэш как актуальное.
+
+        Колонки пишутся во временный каталог, который затем заменяет каталог записи:
+        файлы прежней записи не перезаписываются на месте, поэтому открытые по ним
+        memory-map (участки, уже загруженные из кэша) продолжают читать прежние данные.
+        """
+        columns = store_to_columns(segments)
+        if columns is None:
+            return False
+        key = self._key(filepath)
+        entry_dir = self._entry_dir(key)
+        tmp_dir = None
+        try:
+            if signature is None:
+                signature = file_signature(filepath)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_dir = tempfile.mkdtemp(prefix=os.path.basename(entry_dir) + '.', suffix='.tmp', dir=self.cache_dir)
+            for name, values in columns.items():
+                np.save(os.path.join(tmp_dir, name + '.npy'), values)
+            _replace_dir(tmp_dir, entry_dir)
+        except OSError:
+            if tmp_dir is not None:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            return False
+        self._entries[key] = dict(signature, rows=len(segments))
+        self._dirty = True
+        return True
+
+    def _evict(self, key):
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+        if self._entries.pop(key, None) is not None:
+            self._dirty = True
+
+    def evict_stale(self, filepaths):
+        """Удаляет записи файлов, которых больше нет в наборе или которые изменились."""
+        current = {self._key(filepath): filepath for filepath in filepaths}
+        for key in list(self._entries):
+            if key not in current or not self.is_fresh(current[key]):
+                self._evict(key)
+
+        # Каталоги, не описанные в манифесте (например, после аварийного завершения)
+        known_dirs = {os.path.basename(self._entry_dir(key)) for key in self._entries}
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            if name not in known_dirs and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def flush(self):
+        """Атомарно записывает манифест кэша на диск."""
+        if not self._dirty:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = self._manifest_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': CACHE_FORMAT_VERSION, 'entries': self._entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self._manifest_path)
+            self._dirty = False
+        except OSError:
+            pass
@@ -0,0 +1,175 @@
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError: # Windows: пиковая память процесса недоступна
+    resource = None
+
+# --- Диагностика: замер стадий обработки ---
+# Использование:
+#
+#     with diagnostics.stage('parse') as st:
+#         records = ...
+#         st.items = len(records)
+#
+# Пока запись выключена, stage() возвращает общий пустой объект: цена замера -
+# одна проверка флага (items у него всегда 0, присваивания и += игнорируются, так
+# что вызовы не влияют друг на друга). При включенной записи по каждой стадии сохраняются время,
+# число элементов, пропускная способность и пиковая память процесса (RSS).
+# Трасса выгружается в формате Chrome Trace Event (chrome://tracing, Perfetto).
+
+_enabled = False
+_lock = threading.Lock()
+_events = []
+_origin = time.perf_counter()
+_version = 0
+
+
+class _NullStage:
+    """Стадия при выключенной записи: ничего не измеряет."""
+    __slots__ = ()
+
+    @property
+    def items(self):
+        return 0
+
+    @items.setter
+    def items(self, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux - килобайты, macOS - байты
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class _Stage:
+    __slots__ = ('name', 'items', '_start', '_rss_start')
+
+    def __init__(self, name, items):
+        self.name = name
+        self.items = items
+
+    def __enter__(self):
+        self._rss_start = _peak_rss_mb()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        _record(self.name, self._start, end, self.items, self._rss_start, exc_type is not None)
+        return False
+
+
+def _record(name, start, end, items, rss_start, failed):
+    global _version
+    seconds = end - start
+    peak = _peak_rss_mb()
+    event = {
+        'name': name,
+        'thread': threading.current_thread().name,
+        'start': start - _origin,
+        'seconds': seconds,
+        'items': items,
+        'per_second': items / seconds if items and seconds > 0 else None,
+        'peak_rss_mb': peak,
+        # Рост пика RSS за стадию: какие стадии поднимают максимум памяти
+        'peak_rss_growth_mb': peak - rss_start if peak is not None and rss_start is not None else None,
+        'failed': failed,
+    }
+    with _lock:
+        _events.append(event)
+        _version += 1
+
+
+def stage(name, items=0):
+    """Контекст замера стадии; items можно задать позже через атрибут."""
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name, items)
+
+
+def enable(enabled=True):
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """Очищает накопленные замеры."""
+    global _version
+    with _lock:
+        _events.clear()
+        _version += 1
+
+
+def version():
+    """Счетчик изменений: позволяет не перестраивать отображение без новых замеров."""
+    return _version
+
+
+def events():
+    with _lock:
+        return list(_events)
+
+
+def summary():
+    """Сводка по стадиям: вызовы, суммарное/максимальное время, элементы, пропускная способность, пик RSS."""
+    stages = {}
+    for event in events():
+        stats = stages.setdefault(event['name'], {
+            'stage': event['name'], 'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0,
+            'items': 0, 'per_second': None, 'peak_rss_mb': None,
+        })
+        stats['calls'] += 1
+        stats['seconds'] += event['seconds']
+        stats['max_seconds'] = max(stats['max_seconds'], event['seconds'])
+        stats['items'] += event['items'] or 0
+        if event['peak_rss_mb'] is not None:
+            stats['peak_rss_mb'] = max(stats['peak_rss_mb'] or 0.0, event['peak_rss_mb'])
+    for stats in stages.values():
+        if stats['items'] and stats['seconds'] > 0:
+            stats['per_second'] = stats['items'] / stats['seconds']
+    return list(stages.values())
+
+
+def dump_trace(path):
+    """Сохраняет замеры в JSON (Chrome Trace Event) вместе со сводкой по стадиям."""
+    threads = {}
+    trace_events = []
+    for event in events():
+        tid = threads.setdefault(event['thread'], len(threads) + 1)
+        trace_events.append({
+            'name': event['name'],
+            'cat': 'stage',
+            'ph': 'X',
+            'ts': round(event['start'] * 1e6, 1),
+            'dur': round(event['seconds'] * 1e6, 1),
+            'pid': os.getpid(),
+            'tid': tid,
+            'args': {key: event[key] for key in ('items', 'per_second', 'peak_rss_mb', 'peak_rss_growth_mb', 'failed')},
+        })
+    for thread, tid in threads.items():
+        trace_events.append({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': thread}})
+
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms', 'stages': summary()}, f, ensure_ascii=False, indent=1)
@@ -0,0 +1,1812 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from functools import partial
+
+import numpy as np
+from PyQt5.QtWidgets import (
+    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
+    QTableView, QPushButton, QLineEdit, QCompleter, QLabel, QTextEdit,
+    QHeaderView, QSizePolicy, QSpacerItem, QMessageBox, QProgressBar, QInputDialog,
+    QFileDialog, QProgressDialog, QCheckBox, QTableWidget, QTableWidgetItem, QComboBox, QDoubleSpinBox
+)
+from PyQt5.QtGui import QColor
+from PyQt5.QtCore import (
+    Qt, QThread, QTimer, pyqtSignal, QAbstractTableModel, QAbstractProxyModel, QModelIndex, QFileSystemWatcher,
+    QStringListModel
+)
+
+# Модель рекомендаций (ИИ v3.0) вынесена в model.py
+from model import get_recommendation, score_batch, TIER_LABELS, WEATHER_CONDITIONS
+from network import RoadGraph
+from portfolio import optimize_portfolio
+from scenarios import DEFAULT_SCENARIOS, run_scenarios
+from loader import (
+    find_geojson_files, load_files, simulate_segments, simulation_key, score_segments, SIMULATION_SEED
+)
+from cache import SegmentCache, cache_dir_for, file_signature
+from search import SegmentSearch
+from service import ServiceClient, ServiceError, dataset_hash
+from segments import CLASS_LABELS, SegmentStore, TierSummary
+from spatial import SpatialIndex
+import diagnostics
+import reports
+
+
+# --- 1. Фоновая загрузка данных (QThread) ---
+
+class DataLoadWorker(QThread):
+    """
+    Загрузка, симуляция и скоринг участков в фоновом потоке.
+    Готовые участки передаются в GUI порциями через сигнал rows_loaded.
+    filepaths - список файлов для повторной загрузки (None - поиск всех .geojson).
+    """
+    files_found = pyqtSignal(dict) # Размер/mtime файлов, снятые до разбора
+    rows_loaded = pyqtSignal(str, object) # Файл, порция участков (SegmentStore)
+    file_loaded = pyqtSignal(str, str) # Файл, текст ошибки ('' - файл загружен полностью)
+    progress = pyqtSignal(int, int) # Обработано файлов, всего файлов
+    loading_finished = pyqtSignal(list, bool) # Ошибки по файлам, признак отмены
+
+    CHUNK_SIZE = 5000
+
+    def __init__(self, load_workers=0, use_cache=True, parent=None, filepaths=None, seed=SIMULATION_SEED,
+                 history=None):
+        super().__init__(parent)
+        # Число процессов для параллельной загрузки файлов (0/1 - последовательно)
+        self.load_workers = load_workers
+        # Дисковый кэш разобранных файлов (см. cache.py)
+        self.use_cache = use_cache
+        self.filepaths = filepaths
+        # Сид симуляции дополнительных факторов (см. loader.simulate_segments)
+        self.seed = seed
+        # История нагрузки (history.LoadHistory): прогноз PredictiveLoad вместо симуляции
+        self.history = history
+
+    def run(self):
+        errors = []
+        if self.history is not None:
+            # История могла пополниться после прошлой загрузки
+            self.history.refresh()
+
+        # Поиск GeoJSON файлов
+        geojson_files = find_geojson_files() if self.filepaths is None else self.filepaths
+
+        if not geojson_files:
+            self.loading_finished.emit(["Ошибка: Файлы .geojson не найдены."], False)
+            return
+
+        signatures = {}
+        for filepath in geojson_files:
+            try:
+                signatures[filepath] = file_signature(filepath)
+            except OSError:
+                signatures[filepath] = None
+        self.files_found.emit(signatures)
+
+        self.progress.emit(0, len(geojson_files))
+        # Потоковый разбор файлов (см. loader.py), при load_workers > 1 - в пуле процессов
+        cache = SegmentCache() if self.use_cache else None
+        results = load_files(geojson_files, self.load_workers, cache, evict_stale=self.filepaths is None)
+        with diagnostics.stage('load_data') as load_stage:
+            try:
+                for done, (filepath, file_segments, error) in enumerate(results, start=1):
+                    if self.isInterruptionRequested():
+                        break
+                    if error:
+                        errors.append(error)
+                        self.file_loaded.emit(filepath, error)
+                    else:
+                        simulate_segments(file_segments, self.seed, simulation_key(filepath), self.history)
+                        for start in range(0, len(file_segments), self.CHUNK_SIZE):
+                            if self.isInterruptionRequested():
+                                break
+                            segments, _ = score_segments(file_segments[start:start + self.CHUNK_SIZE])
+                            load_stage.items += len(segments)
+                            self.rows_loaded.emit(filepath, segments)
+                        else:
+                            self.file_loaded.emit(filepath, "")
+                    self.progress.emit(done, len(geojson_files))
+            finally:
+                results.close()
+
+        self.loading_finished.emit(errors, self.isInterruptionRequested())
+
+
+class ReportExportWorker(QThread):
+    """
+    Генерация отчета в фоновом потоке: export(path, segments, progress, is_cancelled)
+    выполняется вне потока GUI, прогресс передается сигналом.
+    """
+    progress = pyqtSignal(int, int) # Выгружено участков, всего участков
+    export_finished = pyqtSignal(str, bool, str) # Путь, признак отмены, текст ошибки
+
+    def __init__(self, export, path, segments, parent=None):
+        super().__init__(parent)
+        self.export = export
+        self.path = path
+        # Снимок хранилища: участки, догружаемые во время выгрузки, в отчет не попадают
+        self.segments = segments.copy()
+
+    def run(self):
+        try:
+            completed = self.export(self.path, self.segments, self.progress.emit, self.isInterruptionRequested)
+        except Exception as e:
+            self.export_finished.emit(self.path, False, str(e))
+            return
+        self.export_finished.emit(self.path, not completed, "")
+
+
+class ScenarioWorker(QThread):
+    """
+    Сценарный анализ Монте-Карло (scenarios.run_scenarios) по снимку участков.
+    Выполняется вне потока GUI, блоки участков считаются в пуле процессов.
+    """
+    progress = pyqtSignal(int, int) # Готово блоков участков, всего блоков
+    scenarios_finished = pyqtSignal(object, str) # Результат (None - отменено), текст ошибки
+
+    def __init__(self, segments, scenarios, seed, parent=None):
+        super().__init__(parent)
+        self.segments = segments.copy()
+        self.scenarios = scenarios
+        self.seed = seed
+
+    def run(self):
+        try:
+            result = run_scenarios(
+                self.segments, self.scenarios, self.seed,
+                progress=self.progress.emit, is_cancelled=self.isInterruptionRequested,
+            )
+        except Exception as e:
+            self.scenarios_finished.emit(None, str(e))
+            return
+        self.scenarios_finished.emit(result, "")
+
+
+class PortfolioWorker(QThread):
+    """Подбор портфеля мероприятий (portfolio.optimize_portfolio) по снимку участков вне потока GUI."""
+    portfolio_finished = pyqtSignal(object, str) # Результат, текст ошибки
+
+    def __init__(self, segments, budget, parent=None):
+        super().__init__(parent)
+        self.segments = segments.copy()
+        self.budget = budget
+
+    def run(self):
+        try:
+            with diagnostics.stage('portfolio', len(self.segments)):
+                result = optimize_portfolio(self.segments.score_columns(), self.budget)
+        except Exception as e:
+            self.portfolio_finished.emit(None, str(e))
+            return
+        self.portfolio_finished.emit(result, "")
+
+
+class NetworkWorker(QThread):
+    """
+    Граф дорожной сети (network.RoadGraph) и перетекание заторов по снимку участков
+    вне потока GUI. Готовый граф (если данные не менялись) передается и не строится заново.
+    """
+    network_finished = pyqtSignal(object, str) # Результат, текст ошибки
+
+    def __init__(self, segments, graph=None, parent=None):
+        super().__init__(parent)
+        self.segments = segments.copy()
+        self.graph = graph
+
+    def run(self):
+        try:
+            graph = self.graph if self.graph is not None else RoadGraph.build(self.segments)
+            result = {'graph': graph}
+            if graph.edge_count:
+                columns = self.segments.score_columns()
+                spillover, iterations = graph.spillover(np.maximum(columns['cur_load'], columns['pred_load']))
+                with diagnostics.stage('scoring_batch', len(self.segments)):
+                    scores = score_batch(**columns, spillover=spillover)
+                result.update(spillover=spillover, iterations=iterations, scores=scores)
+        except Exception as e:
+            self.network_finished.emit(None, str(e))
+            return
+        self.network_finished.emit(result, "")
+
+
+class SpatialIndexWorker(QThread):
+    """
+    Пространственный индекс (spatial.SpatialIndex) по снимку участков вне потока GUI:
+    сохраненный в path (если ключ набора данных key совпадает) или построенный заново
+    и сохраненный. path=None - без дискового кэша.
+    """
+    index_finished = pyqtSignal(object, str) # Индекс, текст ошибки
+
+    def __init__(self, segments, key, path=None, parent=None):
+        super().__init__(parent)
+        self.segments = segments.copy()
+        self.key = key
+        self.path = path
+
+    def run(self):
+        try:
+            index = SpatialIndex.load(self.path, self.segments, self.key) if self.path else None
+            if index is None:
+                index = SpatialIndex.build(self.segments)
+                if self.path:
+                    try:
+                        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                        index.save(self.path, self.key)
+                    except OSError:
+                        pass
+        except Exception as e:
+            self.index_finished.emit(None, str(e))
+            return
+        self.index_finished.emit(index, "")
+
+
+# --- 2. Виртуальная модель таблицы участков ---
+
+# Цвета подсветки создаются один раз, а не для каждой ячейки
+CLASS_COLORS = {
+    'Магистральная': QColor(255, 200, 200),
+    'Районная': QColor(255, 255, 180),
+}
+CLASS_DEFAULT_COLOR = QColor(240, 240, 240)
+CUR_LOAD_HIGH_COLOR = QColor(255, 150, 150)
+CUR_LOAD_MEDIUM_COLOR = QColor(255, 220, 150)
+CUR_LOAD_LOW_COLOR = QColor(220, 220, 255)
+PRED_LOAD_GROWTH_COLOR = QColor(173, 216, 230) # Light Blue
+TIER_COLORS = (QColor(255, 150, 150), QColor(255, 200, 150), QColor(255, 255, 180), QColor(200, 240, 200))
+
+
+class SegmentTableModel(QAbstractTableModel):
+    """
+    Модель таблицы, читающая участки напрямую из хранилища self.data (segments.SegmentStore).
+    Текст, цвета и подсказки вычисляются в data() только для отображаемых ячеек.
+    Индекс Серьезности и ТИР уже посчитаны при загрузке и хранятся колонками хранилища.
+    Сводка по ТИРам и классам дорог (self.summary) обновляется по измененным строкам.
+    """
+    HEADERS = [
+        "Участок",
+        "Класс Дороги",
+        "CurLoad (Текущая)",
+        "PredLoad (Прогноз)",
+        "Ширина (м)",
+        "Полос",
+        "Перекресток",
+        "Светофор",
+        "Погода",
+        "Индекс Серьезности",
+        "ТИР"
+    ]
+
+    def __init__(self, segments, parent=None):
+        super().__init__(parent)
+        self._segments = segments
+        self.summary = TierSummary()
+        self.summary.add(segments.tier, segments.road_class)
+
+    @property
+    def segments(self):
+        return self._segments
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._segments)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole:
+            if orientation == Qt.Horizontal:
+                return self.HEADERS[section]
+            return str(section + 1)
+        return None
+
+    def append_rows(self, segments):
+        """Добавляет порцию участков (SegmentStore) в конец хранилища с уведомлением представления."""
+        if not len(segments):
+            return
+        first_row = len(self._segments)
+        self.beginInsertRows(QModelIndex(), first_row, first_row + len(segments) - 1)
+        self._segments.extend(segments)
+        self.summary.add(segments.tier, segments.road_class)
+        self.endInsertRows()
+
+    def replace_rows(self, first_row, count, segments):
+        """
+        Замена участков [first_row, first_row + count) на segments без сброса модели:
+        совпадающие по числу строки обновляются, лишние вставляются или удаляются.
+        """
+        rows = slice(first_row, first_row + count)
+        self.summary.remove(self._segments.tier[rows], self._segments.road_class[rows])
+        self.summary.add(segments.tier, segments.road_class)
+        common = min(count, len(segments))
+        if common:
+            self._segments.replace(first_row, common, segments[:common])
+            self.dataChanged.emit(self.index(first_row, 0), self.index(first_row + common - 1, self.columnCount() - 1))
+        if len(segments) > count:
+            start = first_row + count
+            self.beginInsertRows(QModelIndex(), start, start + len(segments) - count - 1)
+            self._segments.replace(start, 0, segments[count:])
+            self.endInsertRows()
+        elif len(segments) < count:
+            start = first_row + common
+            self.beginRemoveRows(QModelIndex(), start, first_row + count - 1)
+            self._segments.replace(start, first_row + count - start, SegmentStore())
+            self.endRemoveRows()
+
+    # Роли, для которых data() что-то возвращает; для остальных запись участка не читается
+    DATA_ROLES = frozenset((Qt.DisplayRole, Qt.BackgroundRole, Qt.TextAlignmentRole, Qt.ToolTipRole))
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in self.DATA_ROLES:
+            return None
+        item = self._segments[index.row()]
+        column = index.column()
+
+        if role == Qt.DisplayRole:
+            return self._display_text(item, column)
+        if role == Qt.BackgroundRole:
+            return self._background(item, column)
+        if role == Qt.TextAlignmentRole and column in (1, 2, 3, 9, 10):
+            return Qt.AlignCenter
+        if role == Qt.ToolTipRole and column == 3 and self._has_load_growth(item):
+            return "Прогнозируется значительный рост нагрузки!"
+        return None
+
+    @staticmethod
+    def _display_text(item, column):
+        if column == 0:
+            return item.get('ST_NAME', 'Н/Д')
+        if column == 1:
+            return item.get('RoadClass', 'Н/Д')
+        if column == 2:
+            return f"{item.get('CurLoad', 0.0):.2f}"
+        if column == 3:
+            return f"{item.get('PredictiveLoad', 0.0):.2f}"
+        if column == 4:
+            return str(item.get('Width', 0))
+        if column == 5:
+            return str(item.get('Lanes', 0))
+        if column == 6:
+            return 'ДА' if item.get('CrossRoad') == '1' else 'Нет'
+        if column == 7:
+            return 'ДА' if item.get('Control') == '1' else 'Нет'
+        if column == 8:
+            return item.get('WeatherImpact', 'Н/Д')
+        if column == 9:
+            return f"{item.get('Severity', 0.0):.1f}"
+        if column == 10:
+            return str(item.get('Tier', len(TIER_LABELS)))
+        return None
+
+    @staticmethod
+    def _has_load_growth(item):
+        # Подсветка, если прогнозная нагрузка значительно выше текущей
+        return item.get('PredictiveLoad', 0.0) > item.get('CurLoad', 0.0) + 0.15
+
+    def _background(self, item, column):
+        if column == 1:
+            return CLASS_COLORS.get(item.get('RoadClass', 'Н/Д'), CLASS_DEFAULT_COLOR)
+        if column == 2:
+            cur_load = item.get('CurLoad', 0.0)
+            if cur_load > 0.8: return CUR_LOAD_HIGH_COLOR
+            elif cur_load > 0.6: return CUR_LOAD_MEDIUM_COLOR
+            return CUR_LOAD_LOW_COLOR
+        if column == 3 and self._has_load_growth(item):
+            return PRED_LOAD_GROWTH_COLOR
+        if column == 10:
+            return TIER_COLORS[item.get('Tier', len(TIER_LABELS)) - 1]
+        return None
+
+
+class SegmentViewModel(QAbstractProxyModel):
+    """
+    Сортировка и фильтр строк SegmentTableModel по колонкам хранилища участков.
+    Порядок отображения - массив NumPy номеров строк источника: сортировка - один
+    устойчивый argsort по колонке-ключу, фильтр - маска по колонкам tier, road_class,
+    weather и cur_load, поэтому оба быстры и на миллионах строк (без сравнений через
+    data(), как в QSortFilterProxyModel). Без сортировки и фильтра строки отображаются
+    как есть, изменения источника передаются без пересчета. Строки, добавленные в конец
+    хранилища при загрузке, вливаются в готовый порядок (searchsorted), остальные
+    изменения пересчитывают порядок целиком.
+    """
+    # Колонка таблицы -> колонка хранилища для сортировки (0 - ранг названия участка)
+    SORT_COLUMNS = (
+        None, 'road_class', 'cur_load', 'pred_load', 'width', 'lanes',
+        'crossroad', 'control', 'weather', 'severity', 'tier',
+    )
+
+    def __init__(self, source, parent=None):
+        super().__init__(parent)
+        self._order = None # Строки источника в порядке отображения (None - все строки подряд)
+        self._inverse = None # Строка источника -> строка представления (строится по запросу)
+        self._sort_column = -1
+        self._sort_order = Qt.AscendingOrder
+        self._filters = {} # tier / road_class / weather -> код, min_load -> порог CurLoad
+        self._name_ranks = np.empty(0, dtype=np.int64)
+        self.setSourceModel(source)
+        source.rowsAboutToBeInserted.connect(self._on_rows_about_to_be_inserted)
+        source.rowsInserted.connect(self._on_rows_inserted)
+        source.rowsAboutToBeRemoved.connect(self._on_rows_about_to_be_removed)
+        source.rowsRemoved.connect(self._on_rows_removed)
+        source.dataChanged.connect(self._on_data_changed)
+
+    @property
+    def segments(self):
+        return self.sourceModel().segments
+
+    # --- Отображение строк ---
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not 0 <= row < self.rowCount() or not 0 <= column < self.columnCount():
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=QModelIndex()):
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.segments) if self._order is None else len(self._order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.sourceModel().columnCount()
+
+    def source_row(self, row):
+        """Строка хранилища для строки представления."""
+        return row if self._order is None else int(self._order[row])
+
+    def proxy_row(self, source_row):
+        """Строка представления для строки хранилища (-1 - скрыта фильтром)."""
+        if self._order is None:
+            return source_row if 0 <= source_row < len(self.segments) else -1
+        if self._inverse is None:
+            self._inverse = np.full(len(self.segments), -1, dtype=np.int64)
+            self._inverse[self._order] = np.arange(len(self._order))
+        return int(self._inverse[source_row]) if 0 <= source_row < len(self._inverse) else -1
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid():
+            return QModelIndex()
+        return self.sourceModel().index(self.source_row(proxy_index.row()), proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QModelIndex()
+        row = self.proxy_row(source_index.row())
+        return self.index(row, source_index.column()) if row >= 0 else QModelIndex()
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        # Номер строки - номер участка в хранилище, а не позиция после сортировки
+        if orientation == Qt.Vertical and role == Qt.DisplayRole:
+            return str(self.source_row(section) + 1)
+        source = self.sourceModel()
+        return source.headerData(section, orientation, role) if source is not None else None
+
+    # --- Сортировка и фильтр ---
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """Сортировка по колонке таблицы (-1 - порядок хранилища)."""
+        self._sort_column = column if 0 <= column < len(self.SORT_COLUMNS) else -1
+        self._sort_order = order
+        with diagnostics.stage('view_sort', len(self.segments)):
+            self.beginResetModel()
+            self._rebuild()
+            self.endResetModel()
+
+    def set_filter(self, tier=None, road_class=None, weather=None, min_load=None):
+        """Фильтр по ТИРу (1-4), коду класса дороги, коду погоды и порогу CurLoad (None - без условия)."""
+        filters = {'tier': tier, 'road_class': road_class, 'weather': weather, 'min_load': min_load}
+        self._filters = {name: value for name, value in filters.items() if value is not None}
+        with diagnostics.stage('view_filter', len(self.segments)):
+            self.beginResetModel()
+            self._rebuild()
+            self.endResetModel()
+
+    def _sort_key(self):
+        """Ключ сортировки всех строк хранилища (по убыванию - с обратным знаком)."""
+        segments = self.segments
+        if self._sort_column == 0:
+            # Ранг имени в алфавитном порядке; таблица имен только растет - ранги пересчитываются при ее росте
+            if len(self._name_ranks) != len(segments.names):
+                self._name_ranks = np.empty(len(segments.names), dtype=np.int64)
+                self._name_ranks[np.argsort(np.array(segments.names, dtype=object), kind='stable')] = \
+                    np.arange(len(segments.names))
+            key = self._name_ranks[segments.name]
+        else:
+            key = getattr(segments, self.SORT_COLUMNS[self._sort_column])
+        key = key.astype(np.float64)
+        return -key if self._sort_order == Qt.DescendingOrder else key
+
+    def _filtered_rows(self, first=0):
+        """Строки хранилища от first, прошедшие фильтр."""
+        segments = self.segments
+        mask = None
+        for name, value in self._filters.items():
+            if name == 'min_load':
+                condition = segments.cur_load[first:] >= value
+            else:
+                condition = getattr(segments, name)[first:] == value
+            mask = condition if mask is None else mask & condition
+        if mask is None:
+            return np.arange(first, len(segments), dtype=np.int64)
+        return first + np.flatnonzero(mask)
+
+    def _rebuild(self):
+        self._inverse = None
+        if self._sort_column < 0 and not self._filters:
+            self._order = None
+            return
+        rows = self._filtered_rows()
+        if self._sort_column >= 0:
+            rows = rows[np.argsort(self._sort_key()[rows], kind='stable')]
+        self._order = rows
+
+    def _merge_appended(self, first):
+        """Добавление строк [first, N) в готовый порядок без полной сортировки."""
+        self._inverse = None
+        rows = self._filtered_rows(first)
+        if self._sort_column < 0:
+            self._order = np.concatenate((self._order, rows))
+            return
+        key = self._sort_key()
+        rows = rows[np.argsort(key[rows], kind='stable')]
+        # side='right': при равных ключах новые строки идут после прежних, как в устойчивой сортировке
+        positions = np.searchsorted(key[self._order], key[rows], side='right')
+        self._order = np.insert(self._order, positions, rows)
+
+    # --- Изменения источника ---
+
+    def _on_rows_about_to_be_inserted(self, parent, first, last):
+        if self._order is None:
+            self.beginInsertRows(QModelIndex(), first, last)
+        else:
+            self.beginResetModel()
+
+    def _on_rows_inserted(self, parent, first, last):
+        if self._order is None:
+            self.endInsertRows()
+            return
+        if last == len(self.segments) - 1:
+            self._merge_appended(first)
+        else:
+            self._rebuild()
+        self.endResetModel()
+
+    def _on_rows_about_to_be_removed(self, parent, first, last):
+        if self._order is None:
+            self.beginRemoveRows(QModelIndex(), first, last)
+        else:
+            self.beginResetModel()
+
+    def _on_rows_removed(self, parent, first, last):
+        if self._order is None:
+            self.endRemoveRows()
+            return
+        self._rebuild()
+        self.endResetModel()
+
+    def _on_data_changed(self, top_left, bottom_right, roles=()):
+        if self._order is None:
+            self.dataChanged.emit(
+                self.index(top_left.row(), top_left.column()), self.index(bottom_right.row(), bottom_right.column())
+            )
+            return
+        # Замененные строки могли сменить ключ сортировки и результат фильтра
+        self.beginResetModel()
+        self._rebuild()
+        self.endResetModel()
+
+
+# --- 3. Приложение PyQt5 (Консоль v3.0) ---
+
+class TrafficAnalyzerApp(QMainWindow):
+
+    # Задержка перед повторным сканированием: серия событий файловой системы объединяется
+    RESCAN_DELAY_MS = 1000
+    # Пространственный индекс сохраняется в каталоге кэша участков (cache.cache_dir_for)
+    SPATIAL_INDEX_NAME = 'spatial_index.npz'
+    NEARBY_RADIUS_M = 300
+    NEARBY_MAX_ROWS = 50
+    SEARCH_MAX_ROWS = 50
+    SCENARIO_TOP_ROWS = 10
+    NETWORK_TOP_ROWS = 10
+    DIAGNOSTICS_HEADERS = ["Стадия", "Вызовов", "Время (с)", "Макс. (с)", "Элементов", "Элем./с", "Пик RSS (МБ)"]
+    
+    def __init__(self, load_workers=0, use_cache=True, seed=SIMULATION_SEED, history=None, service_url=None):
+        super().__init__()
+        # Обновляем заголовок, чтобы отразить улучшенную модель
+        self.setWindowTitle("Транспортный Анализатор (Консоль v3.0 - Стратегическое Планирование)")
+        self.setGeometry(100, 100, 1400, 850) # Увеличили размер для новых полей
+        
+        # Колоночное хранилище всех участков (см. segments.py)
+        self.data = SegmentStore()
+        self.current_selected_data = None
+        self.selected_row = -1 # Строка выбранного участка в self.data (-1 - не выбран)
+        # Поиск по названию: индекс строится при первом запросе, строки сбрасываются при изменении данных
+        self.segment_search = SegmentSearch(self.data)
+        self._search_rows = [] # Строки участков в выпадающем списке результатов поиска
+        self.load_error_message = None
+        self.load_errors = [] # Ошибки по каждому файлу (load_error_message - последняя из них)
+        self.load_workers = load_workers
+        self.use_cache = use_cache
+        self.seed = seed
+        self.history = history
+        # Клиент сервиса анализа (service.py): рекомендации считает сервис, а не этот процесс
+        self.service = ServiceClient(service_url) if service_url else None
+        # Отпечаток self.data для запросов к сервису: считается при первом запросе после изменения данных
+        self._dataset_hash = None
+        self.load_worker = None
+        # Строки участков каждого файла в self.data: путь -> [первая строка, число строк]
+        self.file_rows = {}
+        # Размер/mtime загруженных файлов; изменение - повод для повторной загрузки файла
+        self.file_signatures = {}
+        self._pending_signatures = {}
+        self.reload_worker = None
+        self._reload_buffer = {}
+        self._reload_stats = None
+        self._rescan_pending = False
+        self.report_worker = None
+        self.report_progress = None
+        # Сценарный анализ: результат сбрасывается при изменении данных
+        self.portfolio_worker = None
+        self.portfolio_progress = None
+        self.scenario_worker = None
+        self.scenario_progress = None
+        self.scenario_result = None
+        self._scenario_data_changed = False
+        self._diagnostics_version = -1
+        # Пространственный индекс по self.data: загружается или строится в фоновом потоке
+        # после загрузки (и повторной загрузки) данных, сбрасывается при их изменении
+        self.spatial_index = None
+        self.spatial_worker = None
+        self._spatial_data_changed = False
+        # Запрос "Участки рядом", ожидающий готовности индекса: (долгота, широта, радиус)
+        self._pending_nearby = None
+        # Граф дорожной сети и перетекание заторов: так же сбрасываются при изменении данных
+        self.road_graph = None
+        self.network_spillover = None
+        self.network_worker = None
+        self.network_progress = None
+        self._network_data_changed = False
+        
+        self._setup_ui()
+        self._setup_file_watcher()
+        self._start_loading()
+
+    def _setup_ui(self):
+        """Настройка элементов пользовательского интерфейса."""
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        main_layout = QVBoxLayout(central_widget)
+        main_layout.setContentsMargins(20, 20, 20, 20)
+        main_layout.setSpacing(15)
+
+        title_label = QLabel("СИСТЕМА СТРАТЕГИЧЕСКОГО ТРАНСПОРТНОГО ПЛАНИРОВАНИЯ (v3.0)")
+        title_label.setStyleSheet("font-size: 20px; font-weight: bold; padding-bottom: 5px;")
+        main_layout.addWidget(title_label)
+
+        # Сообщение об ошибках загрузки (показывается по ее завершении)
+        self.error_label = QLabel()
+        self.error_label.hide()
+        main_layout.addWidget(self.error_label)
+
+        # --- СТАТУС ФОНОВОЙ ЗАГРУЗКИ ---
+        load_layout = QHBoxLayout()
+        self.load_status_label = QLabel("Поиск файлов .geojson...")
+        load_layout.addWidget(self.load_status_label)
+        self.load_progress = QProgressBar()
+        self.load_progress.setRange(0, 0) # Неопределенный прогресс до получения числа файлов
+        self.load_progress.setMaximumWidth(400)
+        load_layout.addWidget(self.load_progress)
+        self.cancel_load_button = QPushButton("Отмена")
+        self.cancel_load_button.clicked.connect(self._cancel_loading)
+        load_layout.addWidget(self.cancel_load_button)
+        load_layout.addSpacerItem(QSpacerItem(40, 20, QSizePolicy.Expanding, QSizePolicy.Minimum))
+        main_layout.addLayout(load_layout)
+
+        # --- СЕГМЕНТ 01: ТАБЛИЧНЫЕ ДАННЫЕ ---
+        self.data_label = QLabel()
+        self._update_data_label()
+        self.data_label.setStyleSheet("font-size: 14px; font-weight: bold; margin-top: 10px;")
+        main_layout.addWidget(self.data_label)
+
+        # Фильтр строк таблицы (сортировка - щелчком по заголовку колонки, см. SegmentViewModel)
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("ФИЛЬТР:", styleSheet="font-weight: 500;"))
+        self.tier_filter = QComboBox()
+        self.tier_filter.addItem("Все ТИРы", None)
+        for level, label in enumerate(TIER_LABELS, start=1):
+            self.tier_filter.addItem(label, level)
+        self.class_filter = QComboBox()
+        self.class_filter.addItem("Все классы дорог", None)
+        for code, label in enumerate(CLASS_LABELS):
+            self.class_filter.addItem(label, code)
+        self.weather_filter = QComboBox()
+        self.weather_filter.addItem("Любая погода", None)
+        for code, label in enumerate(WEATHER_CONDITIONS):
+            self.weather_filter.addItem(label, code)
+        self.load_filter = QDoubleSpinBox()
+        self.load_filter.setRange(0.0, 1.0)
+        self.load_filter.setSingleStep(0.05)
+        self.load_filter.setDecimals(2)
+        for combo in (self.tier_filter, self.class_filter, self.weather_filter):
+            combo.currentIndexChanged.connect(self._apply_table_filter)
+            filter_layout.addWidget(combo)
+        self.load_filter.valueChanged.connect(self._apply_table_filter)
+        filter_layout.addWidget(QLabel("CurLoad от:"))
+        filter_layout.addWidget(self.load_filter)
+        self.view_count_label = QLabel()
+        filter_layout.addWidget(self.view_count_label)
+        filter_layout.addSpacerItem(QSpacerItem(40, 20, QSizePolicy.Expanding, QSizePolicy.Minimum))
+        main_layout.addLayout(filter_layout)
+
+        self.table_view = QTableView()
+        self._populate_table()
+        self.table_view.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
+        self.table_view.setMinimumHeight(250)
+        main_layout.addWidget(self.table_view)
+
+        # Сводка по ТИРам и классам дорог: число участков и стоимость рекомендованных мероприятий
+        self.summary_label = QLabel()
+        self.summary_label.setWordWrap(True)
+        self.summary_label.setStyleSheet("font-size: 12px; padding: 5px; border: 1px solid #CCC; background-color: #F8F8F8;")
+        main_layout.addWidget(self.summary_label)
+        self._update_summary()
+
+        # --- СЕГМЕНТ 02: ЭЛЕМЕНТЫ УПРАВЛЕНИЯ И ОТЧЕТЫ (УЛУЧШЕННОЕ ОТОБРАЖЕНИЕ КНОПОК) ---
+        control_layout = QHBoxLayout()
+        control_layout.setSpacing(15) # Увеличенный интервал
+        
+        control_layout.addWidget(QLabel("ПОИСК УЧАСТКА:", styleSheet="font-weight: 500;"))
+
+        # Поиск по названию по мере ввода; результаты - в выпадающем списке (см. search.py)
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Название участка (начало или часть)...")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.setMinimumWidth(300)
+        self.search_edit.setStyleSheet("padding: 5px; border: 1px solid #CCC; border-radius: 4px;")
+        self.search_edit.textEdited.connect(self._on_search_edited)
+        self.search_edit.returnPressed.connect(self._on_search_return)
+        self.search_results = QStringListModel(self)
+        self.search_completer = QCompleter(self.search_results, self)
+        self.search_completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.search_completer.setMaxVisibleItems(15)
+        self.search_completer.setWidget(self.search_edit)
+        self.search_completer.activated[QModelIndex].connect(self._on_search_activated)
+        control_layout.addWidget(self.search_edit)
+        
+        control_layout.addSpacerItem(QSpacerItem(20, 20, QSizePolicy.Fixed, QSizePolicy.Minimum)) 
+        
+        # 1. КНОПКА АНАЛИЗА (Основное действие)
+        self.analyze_button = QPushButton("СТРАТЕГИЧЕСКИЙ АНАЛИЗ ИИ")
+        self.analyze_button.setMinimumHeight(40) # Увеличенная высота
+        self.analyze_button.setStyleSheet(
+            """
+            QPushButton {
+                background-color: #6A5ACD; 
+                color: white; 
+                font-weight: bold;
+                border-radius: 6px;
+                padding: 10px 15px;
+                border: none;
+            }
+            QPushButton:hover {
+                background-color: #5548B0;
+            }
+            QPushButton:pressed {
+                background-color: #403680;
+            }
+            """
+        )
+        self.analyze_button.clicked.connect(self.run_analysis)
+        control_layout.addWidget(self.analyze_button)
+        
+        # 2. КНОПКИ ОТЧЕТОВ (Второстепенные действия)
+        
+        control_layout.addSpacerItem(QSpacerItem(30, 20, QSizePolicy.Fixed, QSizePolicy.Minimum)) 
+
+        report_button_style = """
+            QPushButton {
+                background-color: #E0E0E0; 
+                color: #333; 
+                font-weight: 600;
+                border-radius: 4px;
+                padding: 8px 12px;
+                border: 1px solid #C0C0C0;
+            }
+            QPushButton:hover {
+                background-color: #D0D0D0;
+            }
+            QPushButton:disabled {
+                background-color: #F0F0F0;
+                color: #999;
+            }
+        """
+
+        self.pdf_button = QPushButton("PDF Отчет")
+        self.pdf_button.setMinimumHeight(40)
+        self.pdf_button.setStyleSheet(report_button_style)
+        self.pdf_button.clicked.connect(self.generate_pdf_report)
+        control_layout.addWidget(self.pdf_button)
+        
+        self.excel_button = QPushButton("Excel Отчет")
+        self.excel_button.setMinimumHeight(40)
+        self.excel_button.setStyleSheet(report_button_style)
+        self.excel_button.clicked.connect(self.generate_excel_report)
+        control_layout.addWidget(self.excel_button)
+
+        self.portfolio_button = QPushButton("Портфель (бюджет)")
+        self.portfolio_button.setMinimumHeight(40)
+        self.portfolio_button.setStyleSheet(report_button_style)
+        self.portfolio_button.clicked.connect(self.run_portfolio_optimization)
+        control_layout.addWidget(self.portfolio_button)
+
+        self.nearby_button = QPushButton("Участки рядом")
+        self.nearby_button.setMinimumHeight(40)
+        self.nearby_button.setStyleSheet(report_button_style)
+        self.nearby_button.clicked.connect(self.find_nearby_segments)
+        control_layout.addWidget(self.nearby_button)
+
+        self.scenario_button = QPushButton("Сценарии (Монте-Карло)")
+        self.scenario_button.setMinimumHeight(40)
+        self.scenario_button.setStyleSheet(report_button_style)
+        self.scenario_button.clicked.connect(self.run_scenario_analysis)
+        control_layout.addWidget(self.scenario_button)
+
+        self.network_button = QPushButton("Сетевой эффект")
+        self.network_button.setMinimumHeight(40)
+        self.network_button.setStyleSheet(report_button_style)
+        self.network_button.clicked.connect(self.run_network_analysis)
+        control_layout.addWidget(self.network_button)
+        
+        if not reports.pdf_available():
+            self.pdf_button.setEnabled(False)
+            self.pdf_button.setText("PDF (ReportLab/pypdf не найден)")
+        if not reports.excel_available():
+            self.excel_button.setEnabled(False)
+            self.excel_button.setText("Excel (OpenPyxl не найден)")
+
+        control_layout.addSpacerItem(QSpacerItem(40, 20, QSizePolicy.Expanding, QSizePolicy.Minimum))
+        main_layout.addLayout(control_layout)
+
+        # --- СЕГМЕНТ 03: ВЫВОД РЕКОМЕНДАЦИЙ ---
+        recommendation_label = QLabel("СЕГМЕНТ 03: ОПТИМАЛЬНОЕ МЕРОПРИЯТИЕ И ОЦЕНКА ИИ")
+        recommendation_label.setStyleSheet("font-size: 14px; font-weight: bold; margin-top: 10px;")
+        main_layout.addWidget(recommendation_label)
+        
+        self.recommendation_output = QTextEdit()
+        self.recommendation_output.setReadOnly(True)
+        self.recommendation_output.setMinimumHeight(250)
+        main_layout.addWidget(self.recommendation_output)
+
+        self._setup_diagnostics_panel(main_layout)
+
+        self._select_road_segment(0)
+
+    def _setup_diagnostics_panel(self, main_layout):
+        """Сворачиваемая панель замеров стадий обработки (см. diagnostics.py)."""
+        self.diagnostics_toggle = QPushButton("▸ ДИАГНОСТИКА ПРОИЗВОДИТЕЛЬНОСТИ")
+        self.diagnostics_toggle.setCheckable(True)
+        self.diagnostics_toggle.setStyleSheet("text-align: left; border: none; font-weight: bold; color: #555; padding: 4px;")
+        self.diagnostics_toggle.toggled.connect(self._toggle_diagnostics)
+        main_layout.addWidget(self.diagnostics_toggle)
+
+        self.diagnostics_panel = QWidget()
+        panel_layout = QVBoxLayout(self.diagnostics_panel)
+        panel_layout.setContentsMargins(0, 0, 0, 0)
+
+        buttons_layout = QHBoxLayout()
+        self.diagnostics_record = QCheckBox("Запись замеров")
+        self.diagnostics_record.setChecked(diagnostics.is_enabled())
+        self.diagnostics_record.toggled.connect(diagnostics.enable)
+        buttons_layout.addWidget(self.diagnostics_record)
+        save_trace_button = QPushButton("Сохранить трассу...")
+        save_trace_button.clicked.connect(self._save_diagnostics_trace)
+        buttons_layout.addWidget(save_trace_button)
+        reset_button = QPushButton("Сбросить")
+        reset_button.clicked.connect(diagnostics.reset)
+        buttons_layout.addWidget(reset_button)
+        buttons_layout.addSpacerItem(QSpacerItem(40, 20, QSizePolicy.Expanding, QSizePolicy.Minimum))
+        panel_layout.addLayout(buttons_layout)
+
+        self.diagnostics_table = QTableWidget(0, len(self.DIAGNOSTICS_HEADERS))
+        self.diagnostics_table.setHorizontalHeaderLabels(self.DIAGNOSTICS_HEADERS)
+        self.diagnostics_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.diagnostics_table.verticalHeader().hide()
+        self.diagnostics_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.diagnostics_table.setMinimumHeight(160)
+        panel_layout.addWidget(self.diagnostics_table)
+
+        self.diagnostics_panel.hide()
+        main_layout.addWidget(self.diagnostics_panel)
+
+        # Таблица обновляется по таймеру только при раскрытой панели и новых замерах
+        self.diagnostics_timer = QTimer(self)
+        self.diagnostics_timer.setInterval(500)
+        self.diagnostics_timer.timeout.connect(self._refresh_diagnostics)
+
+
+    # --- Фоновая загрузка ---
+
+    def _start_loading(self):
+        """Запускает загрузку данных в фоновом потоке; окно отображается сразу."""
+        self.load_worker = DataLoadWorker(self.load_workers, self.use_cache, self, seed=self.seed, history=self.history)
+        self.load_worker.files_found.connect(self._on_files_found)
+        self.load_worker.file_loaded.connect(self._on_file_loaded)
+        self.load_worker.rows_loaded.connect(self._on_rows_loaded)
+        self.load_worker.progress.connect(self._on_load_progress)
+        self.load_worker.loading_finished.connect(self._on_loading_finished)
+        self.load_worker.start()
+
+    def _cancel_loading(self):
+        """Отмена фоновой загрузки (уже загруженные участки сохраняются)."""
+        if self.load_worker is not None and self.load_worker.isRunning():
+            self.load_worker.requestInterruption()
+            self.cancel_load_button.setEnabled(False)
+            self.load_status_label.setText("Отмена загрузки...")
+
+    def _update_data_label(self):
+        forecast = f", ПРОГНОЗ ПО ИСТОРИИ ЗА {self.history.days} ДН." if self.history is not None else ""
+        self.data_label.setText(
+            f"СЕГМЕНТ 01: ИСХОДНЫЕ И ПРОГНОЗНЫЕ ДАННЫЕ ({len(self.data)} УЧАСТКОВ, СИД СИМУЛЯЦИИ {self.seed}{forecast})"
+        )
+
+    def _on_load_progress(self, files_done, files_total):
+        self.load_progress.setRange(0, files_total)
+        self.load_progress.setValue(files_done)
+        self.load_status_label.setText(f"Загрузка: файл {files_done} из {files_total}")
+
+    def _on_rows_loaded(self, filepath, segments):
+        """Прогрессивное заполнение таблицы и счетчика; первый участок выбирается сразу."""
+        rows = self.file_rows.setdefault(filepath, [len(self.data), 0])
+        rows[1] += len(segments)
+        self._invalidate_network()
+        self.segment_search.invalidate()
+        self._invalidate_scenarios()
+        self._dataset_hash = None
+        with diagnostics.stage('table_append', len(segments)):
+            self.model.append_rows(segments)
+        self._update_data_label()
+        self._update_summary()
+        if self.selected_row < 0:
+            self._select_road_segment(0)
+
+    def _on_files_found(self, signatures):
+        self._pending_signatures.update(signatures)
+
+    def _on_file_loaded(self, filepath, error):
+        self.file_signatures[filepath] = self._pending_signatures.pop(filepath, None)
+
+    def _on_loading_finished(self, errors, cancelled):
+        # После отмены незагруженные файлы считаются неизменными: они не догружаются
+        # при следующем изменении дерева, а только при изменении самих файлов
+        self.file_signatures.update(self._pending_signatures)
+        self._pending_signatures.clear()
+        self._watch_paths()
+        if self._rescan_pending:
+            self._schedule_rescan()
+        self._start_spatial_index(self.load_worker)
+
+        self.load_errors = errors
+        self.load_error_message = errors[-1] if errors else None
+        if not self.data and not self.load_error_message and not cancelled:
+            self.load_error_message = "Предупреждение: Файлы .geojson найдены, но не содержат корректных данных."
+
+        self.load_progress.hide()
+        self.cancel_load_button.hide()
+        if cancelled:
+            self.load_status_label.setText(f"Загрузка отменена. Загружено участков: {len(self.data)}")
+        else:
+            self.load_status_label.hide()
+
+        if self.load_error_message or not self.data:
+            error_color = "#333" if not self.load_error_message or 'Предупреждение' in self.load_error_message else "#FF3333"
+            error_text = self.load_error_message if self.load_error_message else "Нет данных для анализа."
+            if len(self.load_errors) > 1:
+                error_text = "\n".join(self.load_errors)
+            self.error_label.setText(error_text)
+            self.error_label.setStyleSheet(f"font-size: 14px; font-weight: bold; margin-top: 10px; padding: 10px; border: 1px solid {error_color}; color: {error_color};")
+            self.error_label.show()
+
+    # --- Отслеживание изменений файлов и повторная загрузка ---
+
+    def _setup_file_watcher(self):
+        """QFileSystemWatcher по каталогам и файлам .geojson; события объединяются таймером."""
+        self.file_watcher = QFileSystemWatcher(self)
+        self.file_watcher.directoryChanged.connect(self._schedule_rescan)
+        self.file_watcher.fileChanged.connect(self._schedule_rescan)
+        self.rescan_timer = QTimer(self)
+        self.rescan_timer.setSingleShot(True)
+        self.rescan_timer.setInterval(self.RESCAN_DELAY_MS)
+        self.rescan_timer.timeout.connect(self._rescan_files)
+
+    def _watch_paths(self):
+        """
+        Ставит на отслеживание корень данных, каталоги загруженных файлов и сами файлы.
+        Остальное дерево (в т.ч. .git, .venv) не отслеживается; каталоги, где не осталось
+        загруженных файлов, снимаются с отслеживания.
+        """
+        # Файл, замененный переименованием, снимается с отслеживания - добавляем заново
+        files = [path for path in self.file_signatures if os.path.exists(path)]
+        directories = {'.'} | {os.path.dirname(path) or '.' for path in files}
+        watched_directories = set(self.file_watcher.directories())
+        stale = [path for path in watched_directories if path not in directories]
+        if stale:
+            self.file_watcher.removePaths(stale)
+        watched = watched_directories | set(self.file_watcher.files())
+        new_paths = [path for path in sorted(directories) + files if path not in watched]
+        if new_paths:
+            self.file_watcher.addPaths(new_paths)
+
+    def _schedule_rescan(self, path=None):
+        self.rescan_timer.start()
+
+    def _rescan_files(self):
+        """Сравнение дерева .geojson с загруженным: удаление, замена и добавление файлов."""
+        if (self.load_worker is not None and self.load_worker.isRunning()) or \
+                (self.reload_worker is not None and self.reload_worker.isRunning()):
+            self._rescan_pending = True
+            return
+        self._rescan_pending = False
+
+        with diagnostics.stage('rescan') as st:
+            current = {}
+            for filepath in find_geojson_files():
+                try:
+                    current[filepath] = file_signature(filepath)
+                except OSError:
+                    pass
+            st.items = len(current)
+        removed = [filepath for filepath in self.file_signatures if filepath not in current]
+        changed = [filepath for filepath, signature in current.items() if self.file_signatures.get(filepath) != signature]
+        self._reload_stats = {'changed': 0, 'added': 0, 'removed': len(removed), 'rows': 0, 'errors': []}
+
+        for filepath in removed:
+            self._swap_file_rows(filepath, SegmentStore())
+            self.file_rows.pop(filepath, None)
+            self.file_signatures.pop(filepath, None)
+        self._watch_paths()
+
+        if changed:
+            self._start_reload(changed)
+        elif removed:
+            self._on_reload_finished([], False)
+
+    def _start_reload(self, filepaths):
+        """Фоновая повторная загрузка и скоринг только измененных и новых файлов."""
+        self.reload_worker = DataLoadWorker(
+            self.load_workers, self.use_cache, self, filepaths=filepaths, seed=self.seed, history=self.history
+        )
+        self.reload_worker.files_found.connect(self._on_files_found)
+        self.reload_worker.rows_loaded.connect(self._on_reload_rows)
+        self.reload_worker.file_loaded.connect(self._on_reload_file_loaded)
+        self.reload_worker.loading_finished.connect(self._on_reload_finished)
+        self.load_status_label.setText(f"Обновление данных: файлов {len(filepaths)}...")
+        self.load_status_label.show()
+        self.reload_worker.start()
+
+    def _on_reload_rows(self, filepath, segments):
+        self._reload_buffer.setdefault(filepath, SegmentStore()).extend(segments)
+
+    def _on_reload_file_loaded(self, filepath, error):
+        """Файл загружен заново: его участки заменяют прежние (при ошибке прежние сохраняются)."""
+        segments = self._reload_buffer.pop(filepath, SegmentStore())
+        self.file_signatures[filepath] = self._pending_signatures.pop(filepath, None)
+        if error:
+            self._reload_stats['errors'].append(error)
+            return
+        self._reload_stats['changed' if filepath in self.file_rows else 'added'] += 1
+        self._reload_stats['rows'] += len(segments)
+        self._swap_file_rows(filepath, segments)
+
+    def _on_reload_finished(self, errors, cancelled):
+        self._reload_buffer.clear()
+        self._pending_signatures.clear()
+        stats = self._reload_stats
+        self.load_status_label.setText(
+            f"Данные обновлены {datetime.now():%H:%M:%S}: изменено файлов {stats['changed']}, "
+            f"добавлено {stats['added']}, удалено {stats['removed']}; пересчитано участков {stats['rows']}"
+        )
+        self.load_status_label.show()
+        if stats['errors']:
+            self.error_label.setText("\n".join(stats['errors']))
+            self.error_label.setStyleSheet("font-size: 14px; font-weight: bold; margin-top: 10px; padding: 10px; border: 1px solid #FF3333; color: #FF3333;")
+            self.error_label.show()
+        elif self.data:
+            self.error_label.hide()
+        self._watch_paths()
+        if self._rescan_pending:
+            self._schedule_rescan()
+        self._start_spatial_index(self.reload_worker)
+
+    def _swap_file_rows(self, filepath, segments):
+        """
+        Замена участков файла в self.data и модели таблицы на месте.
+        Стоимость пропорциональна числу строк файла (плюс сдвиг колонок в памяти).
+        """
+        with diagnostics.stage('reload_swap', len(segments)):
+            start, count = self.file_rows.setdefault(filepath, [len(self.data), 0])
+
+            self.model.replace_rows(start, count, segments)
+            self._invalidate_network()
+            self.segment_search.invalidate()
+            self._invalidate_scenarios()
+            self._dataset_hash = None
+            self._search_rows = []
+            self.search_results.setStringList([])
+
+            # Строки файлов, расположенных после измененного, сдвигаются
+            delta = len(segments) - count
+            self.file_rows[filepath][1] = len(segments)
+            if delta:
+                after = False
+                for other, rows in self.file_rows.items():
+                    if after:
+                        rows[0] += delta
+                    elif other == filepath:
+                        after = True
+
+            self._update_data_label()
+            self._update_summary()
+            # Выбранный участок мог быть заменен или сдвинут - обновляем ссылку на актуальную запись
+            selected = self.selected_row
+            if selected >= start + count:
+                self._select_road_segment(selected + delta)
+            elif selected >= start:
+                # Строка удаленного участка: выбирается ближайшая оставшаяся
+                self._select_road_segment(max(0, min(selected, start + len(segments) - 1, len(self.data) - 1)))
+
+    def closeEvent(self, event):
+        """Останавливает фоновую загрузку и выгрузку отчета перед закрытием окна."""
+        self.rescan_timer.stop()
+        for worker in (self.load_worker, self.reload_worker, self.report_worker,
+                       self.portfolio_worker, self.scenario_worker, self.network_worker, self.spatial_worker):
+            if worker is not None and worker.isRunning():
+                worker.requestInterruption()
+                worker.wait()
+        super().closeEvent(event)
+
+
+    def _populate_table(self):
+        """Подключение виртуальной модели таблицы к self.data (строки добавляются по мере загрузки)."""
+        with diagnostics.stage('populate_table', len(self.data)):
+            self.model = SegmentTableModel(self.data)
+            # Сортировка и фильтр - прокси-модель над колонками хранилища
+            self.view_model = SegmentViewModel(self.model, self)
+            self.table_view.setModel(self.view_model)
+            # После сброса представления таблицей (выделение восстанавливается поверх него)
+            self.view_model.modelReset.connect(self._on_view_reset)
+            self.view_model.rowsInserted.connect(self._update_view_count)
+            self.view_model.rowsRemoved.connect(self._update_view_count)
+            self.table_view.selectionModel().currentRowChanged.connect(self._on_table_row_changed)
+            self.table_view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+            self.table_view.setSortingEnabled(True)
+            self._update_view_count()
+
+            # Автоматическая настройка ширины столбцов (по видимым строкам, а не по первой 1000 строк
+            # после каждой сортировки и фильтра)
+            self.table_view.horizontalHeader().setResizeContentsPrecision(0)
+            self.table_view.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+            for i in range(1, len(SegmentTableModel.HEADERS)):
+                self.table_view.horizontalHeader().setSectionResizeMode(i, QHeaderView.ResizeToContents)
+
+    def _apply_table_filter(self, *args):
+        min_load = self.load_filter.value()
+        self.view_model.set_filter(
+            tier=self.tier_filter.currentData(),
+            road_class=self.class_filter.currentData(),
+            weather=self.weather_filter.currentData(),
+            min_load=min_load if min_load > 0 else None,
+        )
+
+    def _update_view_count(self, *args):
+        self.view_count_label.setText(f"Показано {self.view_model.rowCount()} из {len(self.data)}")
+
+    def _on_view_reset(self):
+        """После сортировки, фильтра или обновления данных выделяется строка выбранного участка."""
+        self._update_view_count()
+        row = self.view_model.proxy_row(self.selected_row) if self.selected_row >= 0 else -1
+        if row >= 0:
+            self.table_view.selectRow(row)
+
+    def _on_table_row_changed(self, current, previous):
+        if current.isValid():
+            row = self.view_model.source_row(current.row())
+            if row != self.selected_row:
+                self._select_road_segment(row)
+
+    def _update_summary(self):
+        """Строка сводки по ТИРам и классам дорог (self.model.summary обновляется инкрементально)."""
+        summary = self.model.summary
+        costs = summary.costs()
+        tiers = [
+            f"{label.split(':')[0]}: {count} уч., {cost:,.0f} руб."
+            for label, count, cost in zip(TIER_LABELS, summary.counts.sum(axis=1), costs.sum(axis=1))
+        ]
+        classes = [
+            f"{label}: {count} уч., {cost:,.0f} руб."
+            for label, count, cost in zip(CLASS_LABELS, summary.counts.sum(axis=0), costs.sum(axis=0))
+        ]
+        self.summary_label.setText(
+            f"<b>ПО ТИРАМ:</b> {' | '.join(tiers)}<br>"
+            f"<b>ПО КЛАССАМ ДОРОГ:</b> {' | '.join(classes)}<br>"
+            f"<b>ИТОГО:</b> {summary.total()} уч., мероприятия на {costs.sum():,.0f} руб."
+        )
+
+
+    def _select_road_segment(self, index):
+        """Обновляет выбранный участок (строка index в self.data)."""
+        if self.data and index >= 0 and index < len(self.data):
+            self.selected_row = index
+            self.current_selected_data = self.data[index]
+            self.recommendation_output.setHtml(
+                f"""
+                <div style='color: #000; font-size: 13px; padding: 10px; font-family: "Courier New", monospace;'>
+                    <span style='color: #008000;'>&gt;</span> СЕГМЕНТ ВЫБРАН: <strong>{self.current_selected_data.get('ST_NAME', 'Н/Д')}</strong><br> 
+                    <span style='color: #008000;'>&gt;</span> ТЕКУЩАЯ НАГРУЗКА: <span style='color: #0000FF; font-weight: bold;'>{self.current_selected_data.get('CurLoad', 0.0):.2f}</span> | ПРОГНОЗ: <span style='color: #6A5ACD; font-weight: bold;'>{self.current_selected_data.get('PredictiveLoad', 0.0):.2f}</span><br>
+                    <span style='color: #008000;'>&gt;</span> ОЖИДАНИЕ КОМАНДЫ. НАЖМИТЕ КНОПКУ [<span style='color: #6A5ACD; font-weight: bold;'>СТРАТЕГИЧЕСКИЙ АНАЛИЗ ИИ</span>]
+                </div>
+                """
+            )
+        else:
+            self.selected_row = -1
+            self.current_selected_data = None
+            self.recommendation_output.setText("Нет данных для анализа.")
+
+    def _show_segment(self, row):
+        """Выбор участка с выделением и прокруткой таблицы к его строке."""
+        self._select_road_segment(row)
+        # Строка, скрытая фильтром таблицы, только выбирается для анализа
+        view_row = self.view_model.proxy_row(row)
+        if view_row < 0:
+            self.table_view.clearSelection()
+            return
+        self.table_view.selectRow(view_row)
+        self.table_view.scrollTo(self.view_model.index(view_row, 0))
+
+    # --- Поиск участка по названию ---
+
+    def _search_item_text(self, row):
+        """Строка результата: название и признаки, различающие одноименные участки."""
+        item = self.data[row]
+        tier = TIER_LABELS[item['Tier'] - 1].split(':')[0]
+        return f"{item['ST_NAME']}  —  №{row + 1}, {item['RoadClass']}, {tier}, нагрузка {item['CurLoad']:.2f}"
+
+    def _on_search_edited(self, text):
+        """Обновление списка результатов по мере ввода."""
+        self._search_rows = self.segment_search.search(text, self.SEARCH_MAX_ROWS) if text.strip() else []
+        self.search_results.setStringList([self._search_item_text(row) for row in self._search_rows])
+        if self._search_rows:
+            self.search_completer.complete()
+        else:
+            self.search_completer.popup().hide()
+
+    def _on_search_activated(self, index):
+        if 0 <= index.row() < len(self._search_rows):
+            row = self._search_rows[index.row()]
+            self.search_edit.setText(self.data[row]['ST_NAME'])
+            self._show_segment(row)
+
+    def _on_search_return(self):
+        """Enter без выбора в списке - первый (самый релевантный) результат."""
+        if self._search_rows and not self.search_completer.popup().isVisible():
+            self._on_search_activated(self.search_results.index(0))
+
+    def run_analysis(self):
+        """Вызывает "ИИ-модель" для стратегического анализа."""
+        if self.current_selected_data:
+            self.recommendation_output.setText("Идет стратегический анализ...")
+            data = self.current_selected_data
+            spillover = None
+            # После расчета сетевого эффекта в Индекс входит перетекание затора от соседей
+            if self.network_spillover is not None and 0 <= self.selected_row < len(self.network_spillover):
+                spillover = float(self.network_spillover[self.selected_row])
+                data = dict(data, SpilloverLoad=spillover)
+            if self.service is not None:
+                # Тонкий клиент: номер строки действителен, только если набор данных
+                # (имена, сид, колонки) совпадает с данными сервиса
+                if self._dataset_hash is None:
+                    self._dataset_hash = dataset_hash(self.data, self.seed)
+                try:
+                    with diagnostics.stage('service_request', 1):
+                        recommendation_html = self.service.recommendation(
+                            self.selected_row, name=data.get('ST_NAME'), spillover=spillover,
+                            dataset=self._dataset_hash,
+                        )
+                except ServiceError as e:
+                    self.recommendation_output.setText("")
+                    QMessageBox.critical(self, "Ошибка", f"Не удалось получить рекомендацию: {e}")
+                    return
+            else:
+                # Внимание: здесь вызывается новая, развернутая функция get_recommendation
+                with diagnostics.stage('get_recommendation', 1):
+                    recommendation_html = get_recommendation(data)
+            with diagnostics.stage('render_html', 1):
+                self.recommendation_output.setHtml(recommendation_html)
+        else:
+            QMessageBox.warning(self, "Ошибка", "Необходимо выбрать участок для анализа.")
+            
+    def run_portfolio_optimization(self):
+        """Подбор набора мероприятий по всей сети в пределах заданного бюджета (в фоновом потоке)."""
+        if not self.data:
+            QMessageBox.warning(self, "Ошибка", "Нет данных для оптимизации.")
+            return
+        if self.portfolio_worker is not None and self.portfolio_worker.isRunning():
+            QMessageBox.information(self, "Портфель мероприятий", "Подбор портфеля уже выполняется.")
+            return
+        budget, ok = QInputDialog.getInt(
+            self, "Портфель мероприятий", "Общий бюджет (руб.):", 10_000_000, 1000, 2_000_000_000, 100_000
+        )
+        if not ok:
+            return
+
+        self.portfolio_worker = PortfolioWorker(self.data, budget, self)
+        # Оптимизация не прерывается, поэтому окно ожидания без кнопки отмены
+        self.portfolio_progress = QProgressDialog(f"Подбор портфеля для {len(self.data):,} участков...", None, 0, 0, self)
+        self.portfolio_progress.setWindowTitle("Портфель мероприятий")
+        self.portfolio_progress.setMinimumDuration(0)
+        self.portfolio_progress.setAutoClose(False)
+        self.portfolio_progress.setAutoReset(False)
+        self.portfolio_worker.portfolio_finished.connect(self._on_portfolio_finished)
+        self.portfolio_button.setEnabled(False)
+        self.portfolio_worker.start()
+
+    def _on_portfolio_finished(self, result, error):
+        self.portfolio_progress.close()
+        self.portfolio_progress = None
+        self.portfolio_button.setEnabled(True)
+        segments, budget = self.portfolio_worker.segments, self.portfolio_worker.budget
+        if error:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось подобрать портфель мероприятий: {error}")
+            return
+        self._render_portfolio(segments, budget, result)
+
+    def _render_portfolio(self, segments, budget, result):
+        """Сводка портфеля: выбранные мероприятия и прогноз изменения ТИРов."""
+        action_counts = {}
+        for action_index in result['action'].tolist():
+            action_counts[action_index] = action_counts.get(action_index, 0) + 1
+        action_rows = "".join(
+            f"<li>{result['actions'][index][1]['name']} ({result['actions'][index][0]}): <strong>{count}</strong></li>"
+            for index, count in sorted(action_counts.items(), key=lambda pair: -pair[1])
+        )
+        tier_rows = "".join(
+            f"<li>{TIER_LABELS[before - 1].split(':')[0]} &rarr; {TIER_LABELS[after - 1].split(':')[0]}: <strong>{count}</strong></li>"
+            for (before, after), count in sorted(result['tier_changes'].items())
+        )
+        self.recommendation_output.setHtml(
+            f"""
+            <div style="padding: 15px; background-color: #F8F8F8; border-radius: 6px; border: 1px solid #E0E0E0; font-family: 'Arial', sans-serif;">
+                <h2 style="margin: 0 0 10px 0; font-size: 18px; color: #333;">ПОРТФЕЛЬ МЕРОПРИЯТИЙ (БЮДЖЕТ {budget:,} руб.)</h2>
+                <p style="font-size: 14px;">Участков с мероприятиями: <strong>{len(result['segments'])}</strong> из {len(segments)}</p>
+                <p style="font-size: 14px;">Общая стоимость: <strong>{result['total_cost']:,.0f} руб.</strong></p>
+                <p style="font-size: 14px;">Суммарное снижение Индекса Серьезности: <strong>{result['total_severity_reduction']:.1f}</strong>
+                (верхняя оценка: {result['upper_bound']:.1f}, метод: {result['method']})</p>
+                <h3 style="font-size: 16px; color: #444;">Выбранные мероприятия</h3>
+                <ul style="font-size: 14px;">{action_rows}</ul>
+                <h3 style="font-size: 16px; color: #444;">Прогноз изменения ТИРов</h3>
+                <ul style="font-size: 14px;">{tier_rows}</ul>
+            </div>
+            """
+        )
+
+    # --- Сценарный анализ (Монте-Карло) ---
+
+    def _invalidate_scenarios(self):
+        self.scenario_result = None
+        self._scenario_data_changed = True
+
+    def run_scenario_analysis(self):
+        """Вероятности ТИРов и ожидаемый эффект мероприятий по тысячам сценариев (в фоновом потоке)."""
+        if not self.data:
+            QMessageBox.warning(self, "Ошибка", "Нет данных для анализа.")
+            return
+        if self.scenario_worker is not None and self.scenario_worker.isRunning():
+            QMessageBox.information(self, "Сценарии", "Сценарный анализ уже выполняется.")
+            return
+        scenarios, ok = QInputDialog.getInt(
+            self, "Сценарный анализ", "Число сценариев погоды, роста нагрузки и эффекта мероприятий:",
+            DEFAULT_SCENARIOS, 100, 1_000_000, 1000
+        )
+        if not ok:
+            return
+
+        self._scenario_data_changed = False
+        self.scenario_worker = ScenarioWorker(self.data, scenarios, self.seed, self)
+        self.scenario_progress = QProgressDialog(f"Розыгрыш {scenarios} сценариев...", "Отмена", 0, 0, self)
+        self.scenario_progress.setWindowTitle("Сценарии")
+        self.scenario_progress.setMinimumDuration(0)
+        self.scenario_progress.setAutoClose(False)
+        self.scenario_progress.setAutoReset(False)
+        self.scenario_progress.canceled.connect(self.scenario_worker.requestInterruption)
+        self.scenario_worker.progress.connect(self._on_scenario_progress)
+        self.scenario_worker.scenarios_finished.connect(self._on_scenarios_finished)
+        self.scenario_button.setEnabled(False)
+        self.scenario_worker.start()
+
+    def _on_scenario_progress(self, done, total):
+        self.scenario_progress.setRange(0, total)
+        self.scenario_progress.setValue(done)
+
+    def _on_scenarios_finished(self, result, error):
+        self.scenario_progress.close()
+        self.scenario_progress = None
+        self.scenario_button.setEnabled(True)
+        segments = self.scenario_worker.segments
+        if error:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось выполнить сценарный анализ: {error}")
+            return
+        if result is None:
+            QMessageBox.information(self, "Сценарии", "Сценарный анализ отменен.")
+            return
+        # Если данные менялись во время расчета, результат относится только к снимку
+        if not self._scenario_data_changed:
+            self.scenario_result = result
+        self._render_scenarios(segments, result)
+
+    def _render_scenarios(self, segments, result):
+        """Сводка по сети, самые рискованные участки и эффект мероприятий для выбранного участка."""
+        probability = result['tier_probability']
+        expected_counts = probability.sum(axis=0)
+        current_counts = np.bincount(segments.tier, minlength=len(TIER_LABELS) + 1)[1:]
+        tier_rows = "".join(
+            f"<li>{label.split(':')[0]}: ожидается <strong>{expected:,.0f}</strong> (в текущем розыгрыше {current})</li>"
+            for label, expected, current in zip(TIER_LABELS, expected_counts.tolist(), current_counts.tolist())
+        )
+
+        # Самые рискованные участки: вероятность ТИР 1, затем ожидаемый Индекс
+        top = np.lexsort((-result['expected_severity'], -probability[:, 0]))[:self.SCENARIO_TOP_ROWS]
+        risk_rows = "".join(
+            f"<li>{segments[i]['ST_NAME']} (№{i + 1}): P(ТИР 1) = <strong>{probability[i, 0]:.1%}</strong>, "
+            f"ожидаемый Индекс {result['expected_severity'][i]:.1f}</li>"
+            for i in top.tolist()
+        )
+
+        selected_html = ""
+        row = self.selected_row
+        if self.scenario_result is result and 0 <= row < len(segments):
+            tiers = ", ".join(
+                f"{label.split(':')[0]} {p:.1%}" for label, p in zip(TIER_LABELS, probability[row].tolist())
+            )
+            reductions = result['expected_reduction'][row]
+            action_rows = "".join(
+                f"<li>{action['name']} ({action_type}, {action['cost']:,} руб.): снижение Индекса "
+                f"<strong>{reductions[k]:.1f}</strong></li>"
+                for k, (action_type, action) in sorted(enumerate(result['actions']), key=lambda pair: -reductions[pair[0]])
+            )
+            selected_html = f"""
+                <h3 style="font-size: 16px; color: #444;">Выбранный участок: {segments[row]['ST_NAME']} (№{row + 1})</h3>
+                <p style="font-size: 14px;">Вероятности ТИРов: {tiers}; ожидаемый Индекс: <strong>{result['expected_severity'][row]:.1f}</strong></p>
+                <ul style="font-size: 14px;">{action_rows}</ul>
+            """
+
+        self.recommendation_output.setHtml(
+            f"""
+            <div style="padding: 15px; background-color: #F8F8F8; border-radius: 6px; border: 1px solid #E0E0E0; font-family: 'Arial', sans-serif;">
+                <h2 style="margin: 0 0 10px 0; font-size: 18px; color: #333;">СЦЕНАРНЫЙ АНАЛИЗ: {result['scenarios']:,} СЦЕНАРИЕВ, {len(segments):,} УЧАСТКОВ</h2>
+                <h3 style="font-size: 16px; color: #444;">Ожидаемое число участков по ТИРам</h3>
+                <ul style="font-size: 14px;">{tier_rows}</ul>
+                <h3 style="font-size: 16px; color: #444;">Наибольший риск сетевого коллапса</h3>
+                <ul style="font-size: 14px;">{risk_rows}</ul>
+                {selected_html}
+            </div>
+            """
+        )
+
+    # --- Граф дорожной сети и перетекание заторов ---
+
+    def _invalidate_network(self):
+        """Данные изменились: пространственный индекс, граф сети и перетекание строятся заново."""
+        self.spatial_index = None
+        self.road_graph = None
+        self.network_spillover = None
+        # Результат уже запущенного расчета относится к прежним данным
+        self._network_data_changed = True
+        self._spatial_data_changed = True
+
+    def run_network_analysis(self):
+        """Перетекание заторов по графу смежности участков и пересчет ТИРов с его учетом (в фоновом потоке)."""
+        if not self.data:
+            QMessageBox.warning(self, "Ошибка", "Нет данных для анализа.")
+            return
+        if self.network_worker is not None and self.network_worker.isRunning():
+            QMessageBox.information(self, "Сетевой эффект", "Расчет сетевого эффекта уже выполняется.")
+            return
+
+        self._network_data_changed = False
+        self.network_worker = NetworkWorker(self.data, self.road_graph, self)
+        self.network_progress = QProgressDialog(f"Граф сети и перетекание для {len(self.data):,} участков...", None, 0, 0, self)
+        self.network_progress.setWindowTitle("Сетевой эффект")
+        self.network_progress.setMinimumDuration(0)
+        self.network_progress.setAutoClose(False)
+        self.network_progress.setAutoReset(False)
+        self.network_worker.network_finished.connect(self._on_network_finished)
+        self.network_button.setEnabled(False)
+        self.network_worker.start()
+
+    def _on_network_finished(self, result, error):
+        self.network_progress.close()
+        self.network_progress = None
+        self.network_button.setEnabled(True)
+        segments = self.network_worker.segments
+        if error:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось рассчитать сетевой эффект: {error}")
+            return
+        # Если данные менялись во время расчета, граф и перетекание относятся только к снимку
+        if not self._network_data_changed:
+            self.road_graph = result['graph']
+            self.network_spillover = result.get('spillover')
+        if not result['graph'].edge_count:
+            QMessageBox.warning(self, "Ошибка", "У загруженных участков нет общих концевых точек.")
+            return
+        self._render_network(segments, result)
+
+    def _render_network(self, segments, result):
+        """Сводка перетекания: ТИРы без учета сети и с учетом, участки с наибольшей добавкой."""
+        graph, spillover, iterations, scores = result['graph'], result['spillover'], result['iterations'], result['scores']
+        before_counts = np.bincount(segments.tier, minlength=len(TIER_LABELS) + 1)[1:]
+        after_counts = np.bincount(scores['tier'], minlength=len(TIER_LABELS) + 1)[1:]
+        tier_rows = "".join(
+            f"<li>{label.split(':')[0]}: {before} &rarr; <strong>{after}</strong></li>"
+            for label, before, after in zip(TIER_LABELS, before_counts.tolist(), after_counts.tolist())
+        )
+        escalated = int(np.count_nonzero((scores['tier'] == 1) & (segments.tier != 1)))
+        top = np.argsort(-spillover, kind='stable')[:self.NETWORK_TOP_ROWS]
+        top_rows = "".join(
+            f"<li>{segments[i]['ST_NAME']} (№{i + 1}): +<strong>{spillover[i]:.3f}</strong> к нагрузке, "
+            f"{TIER_LABELS[segments.tier[i] - 1].split(':')[0]} &rarr; {TIER_LABELS[scores['tier'][i] - 1].split(':')[0]}</li>"
+            for i in top.tolist() if spillover[i] > 0
+        )
+        self.recommendation_output.setHtml(
+            f"""
+            <div style="padding: 15px; background-color: #F8F8F8; border-radius: 6px; border: 1px solid #E0E0E0; font-family: 'Arial', sans-serif;">
+                <h2 style="margin: 0 0 10px 0; font-size: 18px; color: #333;">СЕТЕВОЙ ЭФФЕКТ: {len(graph):,} УЧАСТКОВ, {graph.edge_count:,} СВЯЗЕЙ</h2>
+                <p style="font-size: 14px;">Участков, получивших нагрузку от соседей: <strong>{int(np.count_nonzero(spillover > 0)):,}</strong>
+                (итераций до сходимости: {iterations})</p>
+                <p style="font-size: 14px;">Новых участков в ТИР 1 из-за перетекания: <strong>{escalated:,}</strong></p>
+                <h3 style="font-size: 16px; color: #444;">Число участков по ТИРам (без учета сети &rarr; с учетом)</h3>
+                <ul style="font-size: 14px;">{tier_rows}</ul>
+                <h3 style="font-size: 16px; color: #444;">Наибольшее перетекание затора</h3>
+                <ul style="font-size: 14px;">{top_rows}</ul>
+                <p style="font-size: 13px;">Стратегический анализ выбранного участка учитывает перетекание (до изменения данных).</p>
+            </div>
+            """
+        )
+
+    # --- Пространственный поиск участков ---
+
+    def _spatial_index_key(self):
+        """Ключ набора данных для сохраненного индекса: файлы, их размер/mtime и строки."""
+        parts = [[filepath, self.file_signatures.get(filepath), rows] for filepath, rows in self.file_rows.items()]
+        return hashlib.sha1(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def _start_spatial_index(self, finished=None):
+        """
+        Фоновая загрузка или построение индекса по текущим данным. Пока идет загрузка
+        файлов или уже строится индекс, не запускается: по их завершении индекс
+        строится по итоговым данным. finished - поток, о завершении которого только что
+        пришел сигнал (сигнал отправляется из run, поток может еще считаться запущенным).
+        """
+        if not self.data or self.spatial_index is not None:
+            return
+        for worker in (self.load_worker, self.reload_worker, self.spatial_worker):
+            if worker is not None and worker is not finished and worker.isRunning():
+                return
+        path = os.path.join(cache_dir_for(), self.SPATIAL_INDEX_NAME) if self.use_cache else None
+        self._spatial_data_changed = False
+        self.spatial_worker = SpatialIndexWorker(self.data, self._spatial_index_key(), path, self)
+        self.spatial_worker.index_finished.connect(self._on_spatial_index_finished)
+        self.spatial_worker.start()
+
+    def _on_spatial_index_finished(self, index, error):
+        if error:
+            if self._pending_nearby is not None:
+                self._pending_nearby = None
+                QMessageBox.critical(self, "Ошибка", f"Не удалось построить пространственный индекс: {error}")
+            return
+        if self._spatial_data_changed:
+            # Индекс построен по прежним данным - строится заново по текущим
+            self._start_spatial_index(self.spatial_worker)
+            return
+        # Данные не менялись с момента снимка: индекс читает геометрию из self.data, снимок освобождается
+        index.segments = self.data
+        self.spatial_index = index
+        if self._pending_nearby is not None:
+            query, self._pending_nearby = self._pending_nearby, None
+            self._show_nearby_segments(*query)
+
+    def find_nearby_segments(self):
+        """Ближайший к точке участок и участки в радиусе (по пространственному индексу)."""
+        if not self.data:
+            QMessageBox.warning(self, "Ошибка", "Нет данных для поиска.")
+            return
+        default = ""
+        selected = self.selected_row
+        if 0 <= selected < len(self.data):
+            vertices = self.data.vertices(selected)
+            if len(vertices):
+                default = f"{vertices[0][0]:.6f}, {vertices[0][1]:.6f}, {self.NEARBY_RADIUS_M}"
+        text, ok = QInputDialog.getText(self, "Участки рядом", "Долгота, широта и радиус поиска (м):", text=default)
+        if not ok:
+            return
+        try:
+            values = [float(value) for value in text.replace(';', ',').split(',')]
+            lon, lat = values[:2]
+            radius = values[2] if len(values) > 2 else self.NEARBY_RADIUS_M
+        except ValueError:
+            QMessageBox.warning(self, "Ошибка", "Введите координаты в формате: долгота, широта[, радиус в метрах].")
+            return
+
+        if self.spatial_index is None:
+            # Запрос выполняется, как только индекс будет готов
+            self._pending_nearby = (lon, lat, radius)
+            self.recommendation_output.setHtml(
+                "<p style='font-size: 14px;'>Построение пространственного индекса... "
+                "Участки рядом будут показаны по его готовности.</p>"
+            )
+            self._start_spatial_index()
+            return
+        self._show_nearby_segments(lon, lat, radius)
+
+    def _show_nearby_segments(self, lon, lat, radius):
+        index = self.spatial_index
+        with diagnostics.stage('spatial_query'):
+            nearest_ids, nearest_distances = index.nearest(lon, lat)
+            ids, distances = index.query_radius(lon, lat, radius)
+        if not len(nearest_ids):
+            QMessageBox.warning(self, "Ошибка", "У загруженных участков нет геометрии.")
+            return
+
+        # Ближайший участок выбирается в списке и в таблице
+        row = int(nearest_ids[0])
+        self._show_segment(row)
+
+        nearest = self.data[row]
+        rows = "".join(
+            f"<li>{self.data[i].get('ST_NAME', 'Н/Д')} ({TIER_LABELS[self.data[i]['Tier'] - 1].split(':')[0]}): "
+            f"<strong>{d:.0f} м</strong></li>"
+            for i, d in zip(ids[:self.NEARBY_MAX_ROWS].tolist(), distances[:self.NEARBY_MAX_ROWS].tolist())
+        )
+        more = f"<p style='font-size: 13px;'>... и еще {len(ids) - self.NEARBY_MAX_ROWS}</p>" if len(ids) > self.NEARBY_MAX_ROWS else ""
+        self.recommendation_output.setHtml(
+            f"""
+            <div style="padding: 15px; background-color: #F8F8F8; border-radius: 6px; border: 1px solid #E0E0E0; font-family: 'Arial', sans-serif;">
+                <h2 style="margin: 0 0 10px 0; font-size: 18px; color: #333;">УЧАСТКИ РЯДОМ: {lon:.6f}, {lat:.6f}</h2>
+                <p style="font-size: 14px;">Ближайший участок: <strong>{nearest.get('ST_NAME', 'Н/Д')}</strong> ({nearest_distances[0]:.0f} м)</p>
+                <h3 style="font-size: 16px; color: #444;">В радиусе {radius:.0f} м: {len(ids)}</h3>
+                <ul style="font-size: 14px;">{rows}</ul>
+                {more}
+            </div>
+            """
+        )
+
+    # --- Генерация отчетов (pdf/excel) ---
+
+    def generate_pdf_report(self):
+        """Генерирует PDF-отчет со всеми данными (части рендерятся в пуле процессов)."""
+        if not self.data:
+            QMessageBox.warning(self, "Ошибка", "Нет данных для отчета.")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Сохранить PDF-отчет", "traffic_report.pdf", "PDF (*.pdf)")
+        if not path:
+            return
+        if not path.lower().endswith('.pdf'):
+            path += '.pdf'
+        self._start_report_export(partial(reports.export_pdf, seed=self.seed), path, "Формирование PDF-отчета...")
+
+
+    def generate_excel_report(self):
+        """Генерирует Excel-отчет со всеми данными (в фоновом потоке)."""
+        if not self.data:
+            QMessageBox.warning(self, "Ошибка", "Нет данных для отчета.")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Сохранить Excel-отчет", "traffic_report.xlsx", "Excel (*.xlsx)")
+        if not path:
+            return
+        if not path.lower().endswith('.xlsx'):
+            path += '.xlsx'
+        self._start_report_export(partial(reports.export_excel, seed=self.seed), path, "Выгрузка Excel-отчета...")
+
+
+    # --- Фоновая генерация отчетов ---
+
+    def _start_report_export(self, export, path, title):
+        """Запуск выгрузки отчета в фоновом потоке с окном прогресса и отменой."""
+        if self.report_worker is not None and self.report_worker.isRunning():
+            QMessageBox.information(self, "Отчет", "Отчет уже формируется.")
+            return
+
+        self.report_worker = ReportExportWorker(export, path, self.data, self)
+        self.report_progress = QProgressDialog(title, "Отмена", 0, len(self.report_worker.segments), self)
+        self.report_progress.setWindowTitle("Отчет")
+        self.report_progress.setMinimumDuration(0)
+        self.report_progress.setAutoClose(False)
+        self.report_progress.setAutoReset(False)
+        self.report_progress.canceled.connect(self.report_worker.requestInterruption)
+        self.report_worker.progress.connect(self._on_report_progress)
+        self.report_worker.export_finished.connect(self._on_report_finished)
+        self.pdf_button.setEnabled(False)
+        self.excel_button.setEnabled(False)
+        self.report_worker.start()
+
+    def _on_report_progress(self, done, total):
+        self.report_progress.setValue(done)
+        if done == total:
+            self.report_progress.setLabelText("Сохранение файла...")
+
+    def _on_report_finished(self, path, cancelled, error):
+        self.report_progress.close()
+        self.report_progress = None
+        self.pdf_button.setEnabled(reports.pdf_available())
+        self.excel_button.setEnabled(reports.excel_available())
+        if error:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось сформировать отчет {path}: {error}")
+        elif cancelled:
+            QMessageBox.information(self, "Отчет", "Формирование отчета отменено.")
+        else:
+            QMessageBox.information(self, "Отчет", f"Отчет сохранен: {path}")
+
+    # --- Панель диагностики ---
+
+    def _toggle_diagnostics(self, expanded):
+        self.diagnostics_panel.setVisible(expanded)
+        self.diagnostics_toggle.setText(("▾" if expanded else "▸") + " ДИАГНОСТИКА ПРОИЗВОДИТЕЛЬНОСТИ")
+        if expanded:
+            self._refresh_diagnostics()
+            self.diagnostics_timer.start()
+        else:
+            self.diagnostics_timer.stop()
+
+    def _refresh_diagnostics(self):
+        """Сводка замеров по стадиям (перестраивается только при новых замерах)."""
+        if diagnostics.version() == self._diagnostics_version:
+            return
+        self._diagnostics_version = diagnostics.version()
+        stages = diagnostics.summary()
+        self.diagnostics_table.setRowCount(len(stages))
+        for row, stats in enumerate(stages):
+            cells = [
+                stats['stage'],
+                str(stats['calls']),
+                f"{stats['seconds']:.3f}",
+                f"{stats['max_seconds']:.3f}",
+                str(stats['items']),
+                f"{stats['per_second']:,.0f}".replace(',', ' ') if stats['per_second'] else "-",
+                f"{stats['peak_rss_mb']:.0f}" if stats['peak_rss_mb'] is not None else "-",
+            ]
+            for column, text in enumerate(cells):
+                item = QTableWidgetItem(text)
+                if column:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.diagnostics_table.setItem(row, column, item)
+
+    def _save_diagnostics_trace(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Сохранить трассу", "kait_trace.json", "JSON (*.json)")
+        if not path:
+            return
+        try:
+            diagnostics.dump_trace(path)
+        except OSError as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить трассу {path}: {e}")
+
+
+def run_gui(argv, load_workers=0, use_cache=True, trace_path=None, seed=SIMULATION_SEED, history=None,
+            service_url=None):
+    """
+    Запуск графического интерфейса; возвращает код завершения приложения.
+    trace_path - файл трассы замеров стадий, сохраняемый при выходе;
+    history - история нагрузки для прогноза PredictiveLoad (history.LoadHistory);
+    service_url - адрес сервиса анализа (service.py), если GUI работает как его клиент.
+    """
+    app = QApplication(argv)
+    app.setStyle("Fusion")
+    
+    main_window = TrafficAnalyzerApp(
+        load_workers=load_workers, use_cache=use_cache, seed=seed, history=history, service_url=service_url
+    )
+    main_window.show()
+    exit_code = app.exec_()
+    if trace_path:
+        diagnostics.dump_trace(trace_path)
+    return exit_code
@@ -0,0 +1,303 @@
+import datetime
+import json
+import os
+
+import numpy as np
+
+import diagnostics
+
+# --- История нагрузки участков (временные ряды) ---
+# Почасовые снимки CurLoad хранятся в каталоге истории как матрица "участок x час"
+# только на дописывание. На диске строки идут по часам (loads.f32, float32,
+# [часы, участки]): новый день дописывается в конец файла, прежние дни не
+# переписываются. Чтение - через memory-map, окно по времени - непрерывный срез.
+#
+# При добавлении дня сразу считаются агрегаты (тоже только дописываются):
+#   - daily.f32: средняя нагрузка участка в часы пик за день [дни, участки];
+#     пропуски (NaN) заменяются значением предыдущего дня участка;
+#   - prefix_sum.f64, prefix_wsum.f64: префиксные суммы y(d) и d * y(d) по дням
+#     [дни + 1, участки].
+# По префиксным суммам среднее и тренд (наклон МНК) за любое окно дней считаются
+# за O(участков) без чтения почасовых данных, прогноз PredictiveLoad - для всей
+# сети одним векторным расчетом.
+#
+# Столбцы матрицы - участки файлов GeoJSON в порядке manifest['files'] (ключ файла
+# loader.simulation_key и число участков); строки снимка дня идут в том же порядке.
+
+MANIFEST_NAME = 'manifest.json'
+HISTORY_FORMAT_VERSION = 1
+HOURS_PER_DAY = 24
+# Часы пик (утро и вечер), по которым считается дневная нагрузка
+PEAK_HOURS = (7, 8, 9, 17, 18, 19)
+# Окно тренда и горизонт прогноза PredictiveLoad (дни)
+FORECAST_WINDOW_DAYS = 28
+FORECAST_HORIZON_DAYS = 7
+# Меньше стольких дней наблюдений - прогноза нет (остается симуляция роста нагрузки)
+MIN_FORECAST_DAYS = 7
+
+_LOADS, _DAILY, _PREFIX_SUM, _PREFIX_WSUM = 'loads.f32', 'daily.f32', 'prefix_sum.f64', 'prefix_wsum.f64'
+_FIRST_DAY = 'first_day.npy'
+_DTYPES = {_LOADS: np.float32, _DAILY: np.float32, _PREFIX_SUM: np.float64, _PREFIX_WSUM: np.float64}
+
+
+def _replace_file(path, write):
+    """Атомарная запись небольшого файла: во временный файл и os.replace."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def _as_date(day):
+    if isinstance(day, datetime.date):
+        return day
+    return datetime.date.fromisoformat(str(day))
+
+
+class LoadHistory:
+    """Каталог истории нагрузки: почасовые снимки и агрегаты по дням (memory-map)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._maps = {}
+        self._forecast = None
+        self._read_manifest()
+
+    @classmethod
+    def create(cls, path, files, start_day):
+        """
+        Пустая история для участков файлов files [(ключ файла, число участков), ...],
+        первый день - start_day (datetime.date или 'YYYY-MM-DD').
+        """
+        files = [[key, int(count)] for key, count in files]
+        size = sum(count for _, count in files)
+        os.makedirs(path, exist_ok=True)
+        for name in (_LOADS, _DAILY):
+            open(os.path.join(path, name), 'wb').close()
+        # Префиксные суммы начинаются с нулевой строки
+        for name in (_PREFIX_SUM, _PREFIX_WSUM):
+            _replace_file(os.path.join(path, name), np.zeros(size, dtype=np.float64).tofile)
+        _replace_file(os.path.join(path, _FIRST_DAY), lambda f: np.save(f, np.full(size, -1, dtype=np.int32)))
+        manifest = {
+            'version': HISTORY_FORMAT_VERSION,
+            'start_day': _as_date(start_day).isoformat(),
+            'days': 0,
+            'peak_hours': list(PEAK_HOURS),
+            'files': files,
+        }
+        _replace_file(
+            os.path.join(path, MANIFEST_NAME),
+            lambda f: f.write(json.dumps(manifest, ensure_ascii=False).encode('utf-8')),
+        )
+        return cls(path)
+
+    def _read_manifest(self):
+        with open(os.path.join(self.path, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') != HISTORY_FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия истории нагрузки: {manifest.get('version')}")
+        self.start_day = _as_date(manifest['start_day'])
+        self.days = manifest['days']
+        self.peak_hours = tuple(manifest['peak_hours'])
+        self.files = manifest['files']
+        self._columns = {}
+        offset = 0
+        for key, count in self.files:
+            self._columns[key] = (offset, count)
+            offset += count
+        self.size = offset
+        self._maps = {}
+        self._forecast = None
+
+    def refresh(self):
+        """Перечитать манифест, если историю дописал другой процесс (агрегаты и прогноз сбрасываются)."""
+        days = self.days
+        self._read_manifest()
+        return self.days != days
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def hours(self):
+        return self.days * HOURS_PER_DAY
+
+    @property
+    def end_day(self):
+        """Следующий день после последнего записанного."""
+        return self.start_day + datetime.timedelta(days=self.days)
+
+    def columns_of(self, key, count):
+        """Столбцы участков файла key (slice) или None, если файла нет или число участков другое."""
+        columns = self._columns.get(key)
+        if columns is None or columns[1] != count:
+            return None
+        return slice(columns[0], columns[0] + count)
+
+    def _array(self, name, rows):
+        """Файл истории как массив [rows, участки] (memory-map только для чтения)."""
+        array = self._maps.get(name)
+        if array is None or len(array) != rows:
+            if not rows or not self.size:
+                array = np.zeros((rows, self.size), dtype=_DTYPES[name])
+            else:
+                array = np.memmap(os.path.join(self.path, name), dtype=_DTYPES[name], mode='r', shape=(rows, self.size))
+            self._maps[name] = array
+        return array
+
+    # --- Чтение ---
+
+    def window(self, first_hour=0, last_hour=None, columns=slice(None)):
+        """Почасовая нагрузка [часы, участки] за часы [first_hour, last_hour) от начала истории."""
+        return self._array(_LOADS, self.hours)[first_hour:last_hour, columns]
+
+    def segment_series(self, column, first_hour=0, last_hour=None):
+        """Почасовой ряд нагрузки одного участка (столбец column)."""
+        return np.array(self.window(first_hour, last_hour, column))
+
+    def daily_peak(self, first_day=0, last_day=None, columns=slice(None)):
+        """Средняя нагрузка в часы пик [дни, участки] за дни [first_day, last_day)."""
+        return self._array(_DAILY, self.days)[first_day:last_day, columns]
+
+    def first_day(self):
+        """Номер первого дня с наблюдениями для каждого участка (-1 - наблюдений нет)."""
+        return np.load(os.path.join(self.path, _FIRST_DAY))
+
+    def rolling(self, window_days=FORECAST_WINDOW_DAYS, end_day=None):
+        """
+        Скользящие агрегаты дневной нагрузки в часы пик за последние window_days дней
+        до end_day (номер дня, по умолчанию - конец истории) для всех участков:
+            'peak_mean' - среднее; 'trend' - наклон МНК (изменение нагрузки за день);
+            'days'      - число дней в окне (окно начинается не раньше первого наблюдения).
+        """
+        end_day = self.days if end_day is None else min(end_day, self.days)
+        columns = np.arange(self.size)
+        first_day = self.first_day()
+        start = np.clip(np.maximum(end_day - window_days, first_day), 0, end_day)
+        width = np.where(first_day >= 0, end_day - start, 0)
+
+        prefix_sum = self._array(_PREFIX_SUM, self.days + 1)
+        prefix_wsum = self._array(_PREFIX_WSUM, self.days + 1)
+        sum_y = prefix_sum[end_day] - prefix_sum[start, columns]
+        # Сумма t * y с локальным временем окна t = d - start
+        sum_ty = prefix_wsum[end_day] - prefix_wsum[start, columns] - start * sum_y
+        w = width.astype(np.float64)
+        sum_t = w * (w - 1) / 2
+        sum_tt = (w - 1) * w * (2 * w - 1) / 6
+        denominator = w * sum_tt - sum_t * sum_t
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(width > 0, sum_y / w, np.nan)
+            trend = np.where(denominator > 0, (w * sum_ty - sum_t * sum_y) / denominator, 0.0)
+        return {'peak_mean': mean, 'trend': trend, 'days': width}
+
+    def forecast(self, horizon_days=FORECAST_HORIZON_DAYS, window_days=FORECAST_WINDOW_DAYS,
+                 min_days=MIN_FORECAST_DAYS):
+        """
+        Прогноз нагрузки в часы пик через horizon_days дней после конца истории для
+        всей сети: линейный тренд за окно window_days, ограниченный диапазоном [0, 1].
+        NaN - у участка меньше min_days дней наблюдений. Результат кэшируется до
+        следующего добавления дня.
+        """
+        key = (self.days, horizon_days, window_days, min_days)
+        if self._forecast is not None and self._forecast[0] == key:
+            return self._forecast[1]
+        with diagnostics.stage('history_forecast', self.size):
+            aggregates = self.rolling(window_days)
+            width = aggregates['days']
+            # Значение линии тренда: центр окна (width - 1) / 2, прогноз - horizon_days после последнего дня
+            forecast = aggregates['peak_mean'] + aggregates['trend'] * ((width - 1) / 2 + horizon_days)
+            forecast = np.where(width >= min_days, np.clip(forecast, 0.0, 1.0), np.nan)
+        self._forecast = (key, forecast)
+        return forecast
+
+    def forecast_for(self, key, count):
+        """Прогноз для участков файла key (count участков) или None, если файла нет в истории."""
+        columns = self.columns_of(key, count)
+        if columns is None:
+            return None
+        return self.forecast()[columns]
+
+    # --- Дописывание ---
+
+    def append_day(self, loads, day=None):
+        """
+        Добавить день почасовых снимков: loads - массив [участки, 24] (NaN - нет данных).
+        day - дата дня (по умолчанию следующий после последнего); пропущенные дни
+        заполняются пропусками. Прежние дни не переписываются.
+        """
+        loads = np.asarray(loads, dtype=np.float32)
+        if loads.shape != (self.size, HOURS_PER_DAY):
+            raise ValueError(f"Снимок дня должен иметь форму ({self.size}, {HOURS_PER_DAY}), получено {loads.shape}")
+        day = self.end_day if day is None else _as_date(day)
+        if day < self.end_day:
+            raise ValueError(f"День {day} уже есть в истории (история только дописывается, следующий день - {self.end_day})")
+        with diagnostics.stage('history_append', self.size) as st:
+            gap = (day - self.end_day).days
+            for _ in range(gap):
+                self._append(np.full((HOURS_PER_DAY, self.size), np.nan, dtype=np.float32))
+            self._append(np.ascontiguousarray(loads.T))
+            st.items = self.size * (gap + 1)
+
+    def _append_rows(self, name, rows, values):
+        """Дописать строку к файлу истории (хвост после незавершенной записи отрезается)."""
+        row_bytes = self.size * np.dtype(_DTYPES[name]).itemsize
+        with open(os.path.join(self.path, name), 'r+b') as f:
+            f.truncate(rows * row_bytes)
+            f.seek(rows * row_bytes)
+            f.write(np.ascontiguousarray(values, dtype=_DTYPES[name]).tobytes())
+
+    def _append(self, hourly):
+        """Один день [24, участки]: почасовые данные, дневная нагрузка в часы пик и префиксные суммы."""
+        day = self.days
+        peak = hourly[list(self.peak_hours)]
+        observed = ~np.isnan(peak)
+        counts = observed.sum(axis=0)
+        totals = np.where(observed, peak, 0).sum(axis=0, dtype=np.float64)
+        daily = np.full(self.size, np.nan)
+        np.divide(totals, counts, out=daily, where=counts > 0)
+
+        first_day = self.first_day()
+        if day:
+            # Пропуск - значение предыдущего дня (до первого наблюдения остается NaN)
+            daily = np.where(np.isnan(daily), self.daily_peak(day - 1, day)[0], daily)
+        first_day[(first_day < 0) & ~np.isnan(daily)] = day
+        values = np.nan_to_num(daily)
+
+        self._append_rows(_LOADS, day * HOURS_PER_DAY, hourly)
+        self._append_rows(_DAILY, day, daily[None])
+        for name, increment in ((_PREFIX_SUM, values), (_PREFIX_WSUM, day * values)):
+            last = self._array(name, day + 1)[day]
+            self._append_rows(name, day + 1, (last + increment)[None])
+        _replace_file(os.path.join(self.path, _FIRST_DAY), lambda f: np.save(f, first_day))
+
+        # Манифест записывается последним: до него новый день не виден читателям
+        manifest_path = os.path.join(self.path, MANIFEST_NAME)
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        manifest['days'] = day + 1
+        _replace_file(manifest_path, lambda f: f.write(json.dumps(manifest, ensure_ascii=False).encode('utf-8')))
+        self.days = day + 1
+        self._forecast = None
+
+
+def ingest_day(history_path, snapshot_path, data_dir='.', day=None, use_cache=True):
+    """
+    Добавить в историю history_path день почасовых снимков из файла .npy
+    (массив [участки, 24], участки - в порядке файлов истории). Если истории еще нет,
+    она создается по файлам .geojson каталога data_dir. Возвращает LoadHistory.
+    """
+    if os.path.exists(os.path.join(history_path, MANIFEST_NAME)):
+        history = LoadHistory(history_path)
+    else:
+        from cache import SegmentCache, cache_dir_for
+        from loader import find_geojson_files, load_files, simulation_key
+
+        files = []
+        cache = SegmentCache(cache_dir_for(data_dir)) if use_cache else None
+        for filepath, segments, error in load_files(find_geojson_files(data_dir), cache=cache):
+            if error:
+                raise ValueError(error)
+            files.append((simulation_key(filepath, data_dir), len(segments)))
+        history = LoadHistory.create(history_path, files, day or datetime.date.today())
+    history.append_day(np.load(snapshot_path, mmap_mode='r'), day)
+    return history
@@ -0,0 +1,369 @@
+import glob
+import json
+import multiprocessing
+import os
+import re
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import diagnostics
+from cache import file_signature
+from model import calculate_lanes, road_class_code, score_batch, weather_code
+from segments import PART_BREAK, SegmentStore
+
+# --- Потоковая загрузка GeoJSON ---
+# Файл читается блоками, а объекты массива 'features' разбираются по одному,
+# поэтому в памяти не держится все дерево документа.
+
+REQUIRED_FIELDS = ['ST_NAME', 'Width', 'CurLoad', 'Control', 'CrossRoad']
+READ_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+# Ошибка разбора не дальше стольких символов от конца буфера может означать обрезанное
+# значение (литерал, число, escape-последовательность) - тогда файл дочитывается
+_TRUNCATED_TAIL = 16
+
+
+class _JsonStream:
+    """Буфер поверх текстового файла для пошагового разбора JSON-значений."""
+
+    def __init__(self, f, chunk_size=READ_CHUNK_SIZE):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, min_size=0):
+        """Отбрасывает разобранную часть буфера и дочитывает файл."""
+        if self._eof:
+            return False
+        if self._pos:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        chunk = self._f.read(max(self._chunk_size, min_size))
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf += chunk
+        return True
+
+    def peek(self):
+        """Следующий значимый символ (пробелы пропускаются) или '' в конце файла."""
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self._buf, self._pos)
+        self._pos += 1
+
+    def value(self):
+        """Разбирает очередное JSON-значение целиком."""
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError as e:
+                # Синтаксическая ошибка внутри буфера - сразу, без чтения остатка файла
+                if len(self._buf) - e.pos > _TRUNCATED_TAIL and not e.msg.startswith('Unterminated string'):
+                    raise
+                # Значение не поместилось в буфер: читаем блок не меньше уже накопленного
+                if self._fill(len(self._buf) - self._pos):
+                    continue
+                raise
+            # Число на границе буфера могло быть обрезано - дочитываем и разбираем заново
+            if end == len(self._buf) and self._fill():
+                continue
+            self._pos = end
+            return obj
+
+
+def iter_geojson_features(f, chunk_size=READ_CHUNK_SIZE):
+    """
+    Генератор объектов из массива 'features' верхнего уровня GeoJSON-документа.
+    Некорректный JSON приводит к json.JSONDecodeError, как и у json.load.
+    """
+    stream = _JsonStream(f, chunk_size)
+
+    if stream.peek() != '{':
+        # Документ не является объектом: проверяем синтаксис, объектов нет
+        stream.value()
+    else:
+        stream.expect('{')
+        features_seen = False
+        if stream.peek() == '}':
+            stream.expect('}')
+        else:
+            while True:
+                key = stream.value()
+                if not isinstance(key, str):
+                    raise json.JSONDecodeError("Expecting property name", '', 0)
+                stream.expect(':')
+
+                if key == 'features' and not features_seen and stream.peek() == '[':
+                    features_seen = True
+                    stream.expect('[')
+                    if stream.peek() == ']':
+                        stream.expect(']')
+                    else:
+                        while True:
+                            yield stream.value()
+                            if stream.peek() == ',':
+                                stream.expect(',')
+                                continue
+                            stream.expect(']')
+                            break
+                else:
+                    stream.value()
+
+                if stream.peek() == ',':
+                    stream.expect(',')
+                    continue
+                stream.expect('}')
+                break
+
+    if stream.peek() != '':
+        raise json.JSONDecodeError("Extra data", '', 0)
+
+
+def geometry_vertices(geometry):
+    """
+    Вершины линии участка [(долгота, широта), ...] из геометрии GeoJSON
+    (LineString, MultiLineString или Point). Части MultiLineString разделяются
+    вершиной (nan, nan). Для отсутствующей или некорректной геометрии - [].
+    """
+    if not isinstance(geometry, dict):
+        return []
+    kind = geometry.get('type')
+    coordinates = geometry.get('coordinates')
+    if kind == 'LineString':
+        parts = [coordinates]
+    elif kind == 'MultiLineString':
+        parts = coordinates
+    elif kind == 'Point':
+        parts = [[coordinates]]
+    else:
+        return []
+
+    vertices = []
+    try:
+        for part in parts:
+            if vertices:
+                vertices.append(PART_BREAK)
+            for point in part:
+                vertices.append((float(point[0]), float(point[1])))
+    except (TypeError, ValueError, IndexError, KeyError):
+        return []
+    return vertices
+
+
+def build_segment_record(feature):
+    """
+    Проверяет обязательные поля объекта и строит запись участка
+    (вместе с вершинами геометрии в поле 'Geometry').
+    Возвращает None, если объект не содержит нужных данных.
+    """
+    if not isinstance(feature, dict):
+        return None
+    properties = feature.get('properties')
+    if not isinstance(properties, dict):
+        return None
+    if not all(field in properties for field in REQUIRED_FIELDS):
+        return None
+
+    item = {
+        'ST_NAME': properties['ST_NAME'],
+        'Width': properties['Width'],
+        'CurLoad': properties['CurLoad'],
+        'Control': properties['Control'],
+        'CrossRoad': properties['CrossRoad'],
+    }
+    item['Lanes'] = calculate_lanes(item.get('Width'))
+    item['Geometry'] = geometry_vertices(feature.get('geometry'))
+    return item
+
+
+def iter_segment_records(filepath):
+    """Генератор проверенных записей участков из одного .geojson файла."""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for feature in iter_geojson_features(f):
+            record = build_segment_record(feature)
+            if record is not None:
+                yield record
+
+
+# --- Загрузка набора файлов (последовательно или в пуле процессов) ---
+
+def find_geojson_files(root='.'):
+    """Рекурсивный поиск .geojson; сортировка задает детерминированный порядок участков."""
+    with diagnostics.stage('discovery') as st:
+        if root == '.':
+            paths = sorted(glob.glob('**/*.geojson', recursive=True))
+        else:
+            paths = sorted(glob.glob(os.path.join(root, '**', '*.geojson'), recursive=True))
+        st.items = len(paths)
+    return paths
+
+
+def load_file_records(filepath):
+    """
+    Разбирает один файл целиком. Возвращает (filepath, segments, error_message),
+    где segments - колоночное хранилище участков файла (segments.SegmentStore);
+    при ошибке участки файла не возвращаются, как и при последовательной загрузке.
+    """
+    try:
+        return filepath, SegmentStore.from_records(iter_segment_records(filepath)), None
+    except json.JSONDecodeError:
+        return filepath, SegmentStore(), f"Ошибка: Некорректный формат JSON в файле: {filepath}"
+    except Exception as e:
+        return filepath, SegmentStore(), f"Ошибка при чтении файла {filepath}: {e}"
+
+
+def _parse_files(filepaths, workers):
+    """Генератор результатов load_file_records в порядке filepaths."""
+    if workers > 1 and len(filepaths) > 1:
+        # spawn вместо fork: процесс GUI многопоточный (Qt), fork в нем небезопасен
+        context = multiprocessing.get_context('spawn')
+        pool = ProcessPoolExecutor(max_workers=min(workers, len(filepaths)), mp_context=context)
+        try:
+            # map сохраняет порядок файлов независимо от порядка завершения задач
+            results = pool.map(load_file_records, filepaths)
+            for _ in filepaths:
+                # Замеряется ожидание результата: сам разбор идет в процессах пула
+                with diagnostics.stage('parse_pool') as st:
+                    result = next(results)
+                    st.items = len(result[1])
+                yield result
+        finally:
+            # При досрочном закрытии генератора (отмена загрузки) не ждем оставшиеся файлы
+            pool.shutdown(wait=False, cancel_futures=True)
+    else:
+        for filepath in filepaths:
+            with diagnostics.stage('parse') as st:
+                result = load_file_records(filepath)
+                st.items = len(result[1])
+            yield result
+
+
+def load_files(filepaths, workers=0, cache=None, evict_stale=True):
+    """
+    Генератор результатов load_file_records в порядке filepaths.
+    При workers > 1 файлы разбираются в пуле процессов. Если передан cache
+    (cache.SegmentCache), неизмененные файлы читаются из него, а разобранные
+    заново - сохраняются в него. evict_stale=False - filepaths лишь часть набора
+    (повторная загрузка измененных файлов): записи остальных файлов не удаляются.
+    """
+    if cache is None:
+        yield from _parse_files(filepaths, workers)
+        return
+
+    if evict_stale:
+        cache.evict_stale(filepaths)
+    to_parse = [filepath for filepath in filepaths if not cache.is_fresh(filepath)]
+    # Размер/mtime снимаются до разбора: изменение файла во время чтения не попадет в кэш
+    signatures = {}
+    for filepath in to_parse:
+        try:
+            signatures[filepath] = file_signature(filepath)
+        except OSError:
+            signatures[filepath] = None
+
+    parsed = _parse_files(to_parse, workers)
+    pending = set(to_parse)
+    try:
+        for filepath in filepaths:
+            if filepath not in pending:
+                with diagnostics.stage('cache_load') as st:
+                    segments = cache.load(filepath)
+                    st.items = len(segments) if segments is not None else 0
+                if segments is not None:
+                    yield filepath, segments, None
+                    continue
+                # Запись исчезла или повреждена - разбираем файл здесь же
+                try:
+                    signatures[filepath] = file_signature(filepath)
+                except OSError:
+                    signatures[filepath] = None
+                with diagnostics.stage('parse') as st:
+                    result = load_file_records(filepath)
+                    st.items = len(result[1])
+            else:
+                result = next(parsed)
+            filepath, segments, error = result
+            if error is None and signatures.get(filepath) is not None:
+                with diagnostics.stage('cache_store', len(segments)):
+                    cache.store(filepath, segments, signatures[filepath])
+            yield result
+    finally:
+        parsed.close()
+        cache.flush()
+
+
+# --- Симуляция дополнительных факторов ---
+# Отдельная стадия после загрузки: значения всего файла вытягиваются одним пакетом
+# из генератора NumPy. Поток генератора определяется сидом и путем файла
+# относительно каталога данных, поэтому результат воспроизводим побитно и не
+# зависит от порядка и параллельности загрузки, кэша и повторной загрузки файлов.
+
+WEATHER_SIMULATION = ['Normal', 'Normal', 'Normal', 'Rain/Fog', 'Snow/Ice']
+ROAD_CLASS_SIMULATION = ['Магистральная', 'Магистральная', 'Районная', 'Районная', 'Местная']
+# Диапазон роста прогнозной нагрузки относительно текущей (CurLoad + 2..15%)
+LOAD_GROWTH_RANGE = (0.02, 0.15)
+SIMULATION_SEED = 42
+
+# Коды значений симуляции в хранилище участков (segments.SegmentStore)
+_WEATHER_SIMULATION_CODES = np.array([weather_code(w) for w in WEATHER_SIMULATION], dtype=np.int8)
+_ROAD_CLASS_SIMULATION_CODES = np.array([road_class_code(c) for c in ROAD_CLASS_SIMULATION], dtype=np.int8)
+
+
+def simulation_key(filepath, root='.'):
+    """Ключ потока симуляции файла: путь относительно каталога данных с разделителем '/'."""
+    return os.path.relpath(filepath, root).replace(os.sep, '/')
+
+
+def simulate_segments(segments, seed=SIMULATION_SEED, key='', history=None):
+    """
+    Симуляция полей участков 'WeatherImpact', 'RoadClass', 'PredictiveLoad'
+    одним пакетом из генератора NumPy, заданного сидом и ключом файла.
+    segments - хранилище участков (segments.SegmentStore), колонки заполняются на месте.
+    history - история нагрузки (history.LoadHistory): у участков файла с достаточной
+    историей PredictiveLoad берется из прогноза по тренду, а не из симуляции.
+    """
+    with diagnostics.stage('simulation', len(segments)):
+        rng = np.random.default_rng([seed, zlib.crc32(key.encode('utf-8'))])
+        n = len(segments)
+        # !!! СИМУЛЯЦИЯ ПОГОДЫ !!!
+        weather = rng.integers(0, len(WEATHER_SIMULATION), n)
+        # !!! СИМУЛЯЦИЯ КЛАССА ДОРОГИ !!!
+        road_class = rng.integers(0, len(ROAD_CLASS_SIMULATION), n)
+        # !!! СИМУЛЯЦИЯ ПРОГНОЗНОЙ НАГРУЗКИ !!!
+        growth = rng.uniform(*LOAD_GROWTH_RANGE, n)
+
+        segments.weather[:] = _WEATHER_SIMULATION_CODES[weather]
+        segments.road_class[:] = _ROAD_CLASS_SIMULATION_CODES[road_class]
+        segments.pred_load[:] = np.minimum(1.0, segments.cur_load * (1 + growth))
+        forecast = history.forecast_for(key, n) if history is not None else None
+        if forecast is not None:
+            known = ~np.isnan(forecast)
+            segments.pred_load[known] = forecast[known]
+    return segments
+
+
+def score_segments(segments):
+    """
+    Пакетный скоринг порции участков после simulate_segments (колонки severity, tier).
+    Возвращает (segments, scores), где scores - результат model.score_batch.
+    """
+    with diagnostics.stage('scoring', len(segments)):
+        scores = score_batch(**segments.score_columns())
+        segments.severity[:] = scores['severity']
+        segments.tier[:] = scores['tier']
+    return segments, scores
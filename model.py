@@ -0,0 +1,484 @@
+from math import floor
+from types import MappingProxyType
+
+import numpy as np
+
+def freeze_action_library(library):
+    """
+    Неизменяемая копия библиотеки мероприятий: {тип: (мероприятие, ...)}, типы и
+    мероприятия - read-only отображения. Изменить библиотеку можно только заменой
+    через set_action_library (по ней перестраивается индекс get_action_index).
+    """
+    return MappingProxyType({
+        action_type: tuple(MappingProxyType(dict(action)) for action in actions)
+        for action_type, actions in library.items()
+    })
+
+
+# --- ГЛОБАЛЬНАЯ БИБЛИОТЕКА МЕРОПРИЯТИЙ (Action Library) ---
+# Каждое мероприятие имеет симулированную стоимость и эффект (снижение CurLoad).
+# Библиотека неизменяема (freeze_action_library); замена - set_action_library.
+ACTION_LIBRARY = freeze_action_library({
+    # Minor: Тир 4 - Тир 3
+    'Minor': [
+        {'name': "Оптимизация фаз светофора", 'cost': 5000, 'effect_reduction': 0.1},
+        {'name': "Перенастройка навигации в час пик", 'cost': 1000, 'effect_reduction': 0.05},
+        {'name': "Установка дополнительных знаков приоритета", 'cost': 3000, 'effect_reduction': 0.08},
+    ],
+    # Medium: Тир 3 - Тир 2
+    'Medium': [
+        {'name': "Внедрение адаптивного управления светофорами", 'cost': 25000, 'effect_reduction': 0.15},
+        {'name': "Организация реверсивной полосы (пилот)", 'cost': 40000, 'effect_reduction': 0.2},
+        {'name': "Запрет левого поворота на перекрестке", 'cost': 8000, 'effect_reduction': 0.12},
+    ],
+    # Major: Тир 2 - Тир 1
+    'Major': [
+        {'name': "Капитальная реконструкция перекрестка/развязки", 'cost': 500000, 'effect_reduction': 0.4},
+        {'name': "Строительство дополнительного съезда/дублера", 'cost': 1000000, 'effect_reduction': 0.5},
+        {'name': "Проект расширения дороги на 1 полосу", 'cost': 750000, 'effect_reduction': 0.35},
+    ]
+})
+
+# --- СПРАВОЧНИКИ МОДЕЛИ ---
+# Порядок значений задает целочисленные коды, используемые пакетным скорингом
+ROAD_CLASSES = ('Магистральная', 'Районная', 'Местная')
+WEATHER_CONDITIONS = ('Normal', 'Rain/Fog', 'Snow/Ice')
+
+TIER_LABELS = (
+    "ТИР 1: КРИТИЧЕСКИЙ (СЕТЕВОЙ КРАХ)",
+    "ТИР 2: ВЫСОКИЙ ПРИОРИТЕТ",
+    "ТИР 3: СРЕДНИЙ ПРИОРИТЕТ",
+    "ТИР 4: ПЛАНОМЕРНЫЙ КОНТРОЛЬ",
+)
+
+_WEATHER_CODES = {name: code for code, name in enumerate(WEATHER_CONDITIONS)}
+_CLASS_CODES = {name: code for code, name in enumerate(ROAD_CLASSES)}
+# Код len(ROAD_CLASSES) зарезервирован для неизвестного класса ('Н/Д')
+UNKNOWN_CLASS_CODE = len(ROAD_CLASSES)
+_TIER_LEVELS = {label: level for level, label in enumerate(TIER_LABELS, start=1)}
+
+# Версия модели скоринга (ИИ v3.0): входит в ключ кэша ответов сервиса анализа
+MODEL_VERSION = '3.0'
+
+# Мероприятие-заглушка, если в библиотеке нет подходящих вариантов
+NO_ACTION = {'name': "Нет доступных мероприятий", 'cost': 0, 'effect_reduction': 0}
+
+# Пороги Индекса Серьезности для ТИР 1, ТИР 2 и ТИР 3 (строго больше)
+TIER_THRESHOLDS = (130, 100, 70)
+SEVERITY_CAP = 180
+
+# --- 1. Улучшенная Модель Рекомендаций (ИИ v3.0) ---
+
+def weather_code(weather):
+    """Целочисленный код погодных условий (неизвестные значения считаются 'Normal')."""
+    return _WEATHER_CODES.get(weather, 0)
+
+def road_class_code(road_class):
+    """Целочисленный код функционального класса дороги."""
+    return _CLASS_CODES.get(road_class, UNKNOWN_CLASS_CODE)
+
+def calculate_lanes(width_m):
+    """Рассчитывает количество полос, исходя из ширины 3 метра на полосу."""
+    if width_m is None or width_m <= 0:
+        return 1
+    return max(1, floor(width_m / 3))
+
+def get_functional_class_weight(road_class):
+    """Весовой множитель ИИ в зависимости от функционального класса дороги."""
+    if road_class == 'Магистральная':
+        return 1.3  # Высокий приоритет: усиливаем серьезность на 30%
+    elif road_class == 'Районная':
+        return 1.15 # Средний приоритет: усиление
+    elif road_class == 'Местная':
+        return 0.9  # Низкий приоритет: снижаем ложные тревоги
+    return 1.0
+
+def get_weather_multiplier(weather):
+    """Мультипликатор серьезности в зависимости от погодных условий."""
+    if weather == 'Rain/Fog':
+        return 1.15
+    elif weather == 'Snow/Ice':
+        return 1.30
+    return 1.0
+
+def get_tier_level(severity_score):
+    """Номер ТИРа (1-4) по Индексу Серьезности."""
+    for tier_level, threshold in enumerate(TIER_THRESHOLDS, start=1):
+        if severity_score > threshold:
+            return tier_level
+    return len(TIER_LABELS)
+
+def _choose_action(library, tier_level, road_class):
+    """
+    ИИ v3.0: Выбирает наиболее эффективное по стоимости/эффекту мероприятие
+    для заданного уровня проблемы (номер Тира 1-4) по библиотеке library.
+    """
+    if tier_level == 1:
+        action_type = 'Major'
+    elif tier_level == 2:
+        action_type = 'Medium'
+    elif tier_level == 3:
+        action_type = 'Minor'
+    else: # ТИР 4
+        # Для планового контроля предлагаем самое дешевое
+        if library.get('Minor'):
+            return library['Minor'][0]
+        return NO_ACTION
+
+    # Копия списка: библиотека не должна изменяться при выборе
+    candidates = list(library.get(action_type, []))
+    if not candidates:
+        return NO_ACTION
+
+    # Стратегия выбора: максимизация (Эффект / Стоимость)
+    best_action = None
+    max_utility = -1
+
+    # Дополнительная корректировка выбора для Магистральных дорог
+    if road_class == 'Магистральная' and action_type in ['Medium', 'Minor']:
+        # На магистралях предпочитаем действия с высоким эффектом
+        candidates.extend(library.get('Medium', []))
+
+    for action in candidates:
+        # Избегаем деления на ноль, если стоимость 0 (хотя ее не должно быть)
+        cost = action['cost'] if action['cost'] > 0 else 1
+        utility = action['effect_reduction'] / cost
+
+        if utility > max_utility:
+            max_utility = utility
+            best_action = action
+
+    # Если на Тир 1 не найдено Major, берем самое дорогое Medium
+    if not best_action and action_type == 'Major' and library.get('Medium'):
+        return library['Medium'][-1] # Возвращаем самое дорогое Medium
+    elif not best_action:
+        return candidates[0] # Возвращаем первый в списке для Minor/Medium
+
+    return best_action
+
+
+def compile_action_index(library):
+    """
+    Компилирует библиотеку мероприятий в неизменяемый индекс:
+    (actions, table), где table[ТИР, код класса] - позиция лучшего мероприятия в actions.
+    Мероприятия копируются в read-only отображения, таблица - read-only массив.
+    Индекс внутренний: наружу (select_optimal_action, score_batch) мероприятия
+    отдаются обычными dict-копиями.
+    """
+    actions = []
+    table = np.zeros((len(TIER_LABELS) + 1, UNKNOWN_CLASS_CODE + 1), dtype=np.int16)
+    for tier_level in range(1, len(TIER_LABELS) + 1):
+        for class_code, road_class in enumerate(ROAD_CLASSES + ('Н/Д',)):
+            action = MappingProxyType(dict(_choose_action(library, tier_level, road_class)))
+            if action not in actions:
+                actions.append(action)
+            table[tier_level, class_code] = actions.index(action)
+    table.setflags(write=False)
+    return tuple(actions), table
+
+
+_action_index = None
+_action_index_library = None
+
+
+def get_action_index():
+    """
+    Индекс мероприятий; перестраивается только при замене ACTION_LIBRARY (через
+    set_action_library). Библиотека неизменяема, поэтому сравнения по идентичности достаточно.
+    """
+    global _action_index, _action_index_library
+    if _action_index is None or _action_index_library is not ACTION_LIBRARY:
+        _action_index = compile_action_index(ACTION_LIBRARY)
+        _action_index_library = ACTION_LIBRARY
+    return _action_index
+
+
+def set_action_library(library):
+    """
+    Заменяет библиотеку мероприятий ({тип: [мероприятие, ...]}) ее неизменяемой копией
+    и перестраивает индекс. Единственный способ изменить ACTION_LIBRARY: последующие
+    изменения переданного library на модель не влияют.
+    """
+    global ACTION_LIBRARY
+    ACTION_LIBRARY = freeze_action_library(library)
+    return get_action_index()
+
+
+def select_optimal_action(tier_level, road_class):
+    """
+    ИИ v3.0: Выбирает наиболее эффективное по стоимости/эффекту мероприятие
+    для заданного уровня проблемы (Тира). Поиск O(1) по предвычисленному индексу.
+    Возвращает копию мероприятия (dict), изменение которой не затрагивает индекс.
+    """
+    actions, table = get_action_index()
+    return dict(actions[table[_TIER_LEVELS.get(tier_level, len(TIER_LABELS)), road_class_code(road_class)]])
+
+
+def score_segment(data):
+    """
+    Расчет Индекса Серьезности, ТИРа и оптимального мероприятия для одного участка
+    (без формирования HTML). SpilloverLoad - необязательная добавка к нагрузке от
+    перегруженных соседей по дорожной сети (network.RoadGraph.spillover).
+    """
+    cur_load = data.get('CurLoad', 0.0)
+    pred_load = data.get('PredictiveLoad', cur_load) # Прогноз
+    spillover = data.get('SpilloverLoad', 0.0)
+    lanes = calculate_lanes(data.get('Width', 0))
+    is_controlled = data.get('Control') == '1'
+    is_crossroad = data.get('CrossRoad') == '1'
+    weather = data.get('WeatherImpact', 'Normal')
+    road_class = data.get('RoadClass', 'Н/Д')
+
+    # 1. Базовый скоринг (учитываем более высокую из нагрузок и перетекание от соседей)
+    base_severity_score = (max(cur_load, pred_load) + spillover) * 100
+
+    if is_crossroad: base_severity_score += 15
+    if is_controlled: base_severity_score += 5
+    if lanes <= 2: base_severity_score += 10
+
+    # 2. Мультипликаторы Погоды и Иерархии Дороги
+    weather_multiplier = get_weather_multiplier(weather)
+    class_weight = get_functional_class_weight(road_class)
+
+    # Финальный Индекс Серьезности
+    severity_score = base_severity_score * weather_multiplier * class_weight
+    severity_score = min(severity_score, SEVERITY_CAP)
+
+    tier_level = get_tier_level(severity_score)
+    tier = TIER_LABELS[tier_level - 1]
+
+    return {
+        'cur_load': cur_load,
+        'pred_load': pred_load,
+        'spillover': spillover,
+        'lanes': lanes,
+        'is_controlled': is_controlled,
+        'is_crossroad': is_crossroad,
+        'weather': weather,
+        'road_class': road_class,
+        'weather_multiplier': weather_multiplier,
+        'class_weight': class_weight,
+        'severity': severity_score,
+        'tier_level': tier_level,
+        'tier': tier,
+        'action': select_optimal_action(tier, road_class),
+    }
+
+
+def get_recommendation(data):
+    """
+    Улучшенная ИИ-модель v3.0: генерирует развернутые и понятные рекомендации.
+    """
+    score = score_segment(data)
+    cur_load = score['cur_load']
+    pred_load = score['pred_load']
+    spillover = score['spillover']
+    lanes = score['lanes']
+    is_controlled = score['is_controlled']
+    is_crossroad = score['is_crossroad']
+    weather = score['weather']
+    road_class = score['road_class']
+    class_weight = score['class_weight']
+    severity_score = score['severity']
+    tier = score['tier']
+    optimal_action = score['action']
+
+    # --- ОПИСАНИЕ ФАКТОРОВ ---
+
+    weather_color_highlight = "#000000"
+    weather_description = "отсутствует (нормальные условия)."
+    if weather == 'Rain/Fog':
+        weather_color_highlight = "#1E90FF"
+        weather_description = "повышенное (дождь/туман), что увеличивает риск аварий и снижает скорость."
+    elif weather == 'Snow/Ice':
+        weather_color_highlight = "#DC143C"
+        weather_description = "критическое (снег/гололед), что создает серьезную угрозу для пропускной способности."
+
+    class_color_highlight = "#3CB371"
+    class_description = f"«{road_class}» (Вес: x{class_weight:.2f}). Это означает, что любое ухудшение здесь имеет высокий сетевой эффект."
+    if road_class == 'Местная':
+        class_description = f"«{road_class}» (Вес: x{class_weight:.2f}). Проблема локализована, что позволяет сосредоточиться на точечных решениях."
+
+    # --- ОПРЕДЕЛЕНИЕ ЦВЕТОВ ТИРА ---
+
+    status_color = ""
+    load_color_code = ""
+    problem_summary = ""
+
+    if score['tier_level'] == 1:
+        status_color = "#CC0000"  # Dark Red
+        load_color_code = "#FFCCCC"
+        problem_summary = "Данный участок находится в **критическом состоянии**. Фактическая или прогнозируемая нагрузка (более 1.0) превышает пропускную способность, создавая риск полного **сетевого коллапса** (глобального затора) в ближайшее время. Требуется срочное капитальное вмешательство."
+    elif score['tier_level'] == 2:
+        status_color = "#FF8800"  # Orange
+        load_color_code = "#FFE0B2"
+        problem_summary = "Участок имеет **высокий приоритет**. Текущая нагрузка вызывает **регулярные и длительные заторы** в часы пик. Без мер по улучшению прогнозируемый рост нагрузки (до CurLoad={pred_load:.2f}) приведет к переходу в Тир 1. Требуется значимое организационное или небольшое строительное мероприятие."
+    elif score['tier_level'] == 3:
+        status_color = "#009900"  # Dark Green
+        load_color_code = "#CCFFCC"
+        problem_summary = "Проблема **среднего уровня**. Нагрузка находится на грани, и в неблагоприятных условиях (например, в плохую погоду) может быстро перейти в Тир 2. Рекомендуется плановое улучшение организации движения для создания запаса прочности."
+    else:
+        status_color = "#0066CC"  # Dark Blue
+        load_color_code = "#CCEEFF"
+        problem_summary = "Участок находится в **пределах нормы**. Нагрузка низкая, однако система рекомендует внедрить минимальные оптимизационные меры (Тир 4) в рамках планового контроля для повышения эффективности использования существующей сети."
+
+    spillover_line = ""
+    if spillover > 0:
+        spillover_line = f"""
+            <p style="margin: 5px 0 0 0; font-size: 14px;">Перетекание затора от соседних участков: <strong>+{spillover:.3f}</strong></p>"""
+
+    # --- ФОРМИРОВАНИЕ РАЗВЕРНУТОГО HTML-ВЫВОДА ---
+
+    html_output = f"""
+    <div style="padding: 15px; background-color: #F8F8F8; border-radius: 6px; border: 1px solid #E0E0E0; font-family: 'Arial', sans-serif;">
+
+        <h2 style="margin: 0 0 10px 0; font-size: 18px; color: #333;">АНАЛИЗ УЧАСТКА: {data.get('ST_NAME', 'Н/Д')}</h2>
+
+        <!-- БЛОК 1: СУММАРНАЯ ОЦЕНКА И ТИР -->
+        <div style="margin-bottom: 20px; padding: 15px; background-color: {load_color_code}; color: #333; border-radius: 4px; border-left: 5px solid {status_color};">
+            <h3 style="margin: 0; font-size: 18px; color: {status_color};">&#9679; ТИР ПРОБЛЕМЫ: {tier}</h3>
+            <p style="margin: 5px 0 0 0; font-size: 14px;">Индекс Серьезности (ИИ): <strong>{severity_score:.1f}</strong></p>
+            <p style="margin: 5px 0 0 0; font-size: 14px;">Нагрузка (Cur/Pred): <strong>{cur_load:.2f} / {pred_load:.2f}</strong></p>{spillover_line}
+            <hr style="border: none; border-top: 1px dashed #CCC; margin: 10px 0;">
+            <p style="margin: 0; font-size: 14px; line-height: 1.5;">
+                <span style='font-weight: bold;'>Общая ситуация:</span> {problem_summary}
+            </p>
+        </div>
+
+        <!-- БЛОК 2: ДЕТАЛИЗАЦИЯ ФАКТОРОВ -->
+        <h3 style="font-size: 16px; color: #444; border-bottom: 1px solid #EEE; padding-bottom: 5px;">&#x1F50D; Ключевые Факторы, Усиливающие Проблему</h3>
+        <ul style="list-style: none; padding-left: 0; margin-top: 10px;">
+            <li style="margin-bottom: 8px; font-size: 14px;">
+                <span style="color: #6A5ACD; font-weight: bold;">1. Иерархия Дороги:</span>
+                {class_description}
+            </li>
+            <li style="margin-bottom: 8px; font-size: 14px;">
+                <span style="color: #6A5ACD; font-weight: bold;">2. Погодные Условия:</span>
+                Множитель серьезности <span style="color: {weather_color_highlight}; font-weight: bold;">{weather}</span> ({weather_description}).
+            </li>
+            <li style="margin-bottom: 8px; font-size: 14px;">
+                <span style="color: #6A5ACD; font-weight: bold;">3. Структурные Особенности:</span>
+                Это {'перекресток' if is_crossroad else 'обычный участок'} с {lanes} полосами, {'регулируемый' if is_controlled else 'нерегулируемый'} светофором.
+            </li>
+        </ul>
+
+        <!-- БЛОК 3: СТРАТЕГИЧЕСКАЯ РЕКОМЕНДАЦИЯ -->
+        <div style="margin-top: 20px; padding: 15px; background-color: #E8F5E9; border-radius: 4px; border: 1px solid #A5D6A7;">
+            <h3 style="font-size: 17px; color: #1B5E20; margin: 0 0 10px 0;">&#x1F4DD; ОПТИМАЛЬНАЯ СТРАТЕГИЯ (ИИ-ВЫБОР)</h3>
+            <p style="font-size: 15px; line-height: 1.6; color: #333; margin-bottom: 10px;">
+                <span style='font-weight: bold; color: #1B5E20;'>МЕРОПРИЯТИЕ: {optimal_action['name']}</span>
+            </p>
+            <ul style="list-style: disc; padding-left: 20px; font-size: 14px;">
+                <li><span style='font-weight: bold;'>Тип меры:</span> {tier.split(':')[0].split(' ')[-1].upper()} (Направлен на решение Тира {tier.split(':')[0].split(' ')[-1]} и выше).</li>
+                <li><span style='font-weight: bold;'>Прогнозируемый Эффект:</span> Снижение текущей нагрузки (CurLoad) до **{optimal_action['effect_reduction']*100:.0f}%**.</li>
+            </ul>
+        </div>
+    </div>
+    """
+
+    return html_output
+
+
+# --- 1.1 Пакетный (векторный) скоринг всей сети ---
+
+
+# Мультипликаторы берутся из тех же функций, что и в скалярной модели
+_WEATHER_MULTIPLIERS = np.array([get_weather_multiplier(w) for w in WEATHER_CONDITIONS], dtype=np.float64)
+_CLASS_WEIGHTS = np.array(
+    [get_functional_class_weight(c) for c in ROAD_CLASSES] + [get_functional_class_weight('Н/Д')],
+    dtype=np.float64,
+)
+
+
+def segment_columns(records):
+    """Раскладывает список участков (dict) в колонки NumPy для score_batch."""
+    n = len(records)
+    width = np.fromiter(
+        (np.nan if r.get('Width', 0) is None else r.get('Width', 0) for r in records),
+        dtype=np.float64, count=n,
+    )
+    cur_load = np.fromiter((r.get('CurLoad', 0.0) for r in records), dtype=np.float64, count=n)
+    pred_load = np.fromiter(
+        (r.get('PredictiveLoad', r.get('CurLoad', 0.0)) for r in records), dtype=np.float64, count=n
+    )
+    return {
+        'cur_load': cur_load,
+        'pred_load': pred_load,
+        'width': width,
+        'control': np.fromiter((r.get('Control') == '1' for r in records), dtype=bool, count=n),
+        'crossroad': np.fromiter((r.get('CrossRoad') == '1' for r in records), dtype=bool, count=n),
+        'weather': np.fromiter(
+            (weather_code(r.get('WeatherImpact', 'Normal')) for r in records), dtype=np.int8, count=n
+        ),
+        'road_class': np.fromiter(
+            (road_class_code(r.get('RoadClass', 'Н/Д')) for r in records), dtype=np.int8, count=n
+        ),
+    }
+
+
+def lanes_batch(width):
+    """Векторный аналог calculate_lanes (NaN соответствует отсутствующей ширине)."""
+    width = np.asarray(width, dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        valid = width > 0
+        lanes = np.maximum(1, np.floor(np.where(valid, width, 0) / 3))
+    return np.where(valid, lanes, 1).astype(np.int64)
+
+
+def weather_multiplier_batch(weather):
+    """Векторный аналог get_weather_multiplier по кодам погоды."""
+    return _WEATHER_MULTIPLIERS[np.asarray(weather, dtype=np.intp)]
+
+
+def class_weight_batch(road_class):
+    """Векторный аналог get_functional_class_weight по кодам класса дороги."""
+    return _CLASS_WEIGHTS[np.asarray(road_class, dtype=np.intp)]
+
+
+def score_batch(cur_load, pred_load, width, control, crossroad, weather, road_class, spillover=None):
+    """
+    Векторный скоринг всей сети за один проход: Индекс Серьезности, полосы,
+    ТИР (1-4) и выбранное мероприятие для каждого участка.
+    Дает те же значения, что score_segment/get_recommendation. spillover -
+    необязательная добавка к нагрузке от соседей (колонка SpilloverLoad).
+    """
+    cur_load = np.asarray(cur_load, dtype=np.float64)
+    pred_load = np.asarray(pred_load, dtype=np.float64)
+    lanes = lanes_batch(width)
+
+    # Порядок операций совпадает со скалярной моделью (побитовое совпадение)
+    severity = np.maximum(cur_load, pred_load)
+    if spillover is not None:
+        severity = severity + np.asarray(spillover, dtype=np.float64)
+    severity = severity * 100
+    severity = severity + np.where(np.asarray(crossroad, dtype=bool), 15.0, 0.0)
+    severity = severity + np.where(np.asarray(control, dtype=bool), 5.0, 0.0)
+    severity = severity + np.where(lanes <= 2, 10.0, 0.0)
+    severity = severity * _WEATHER_MULTIPLIERS[np.asarray(weather, dtype=np.intp)]
+    road_class = np.asarray(road_class, dtype=np.intp)
+    severity = severity * _CLASS_WEIGHTS[road_class]
+    severity = np.minimum(severity, SEVERITY_CAP)
+
+    tier = np.full(severity.shape, len(TIER_LABELS), dtype=np.int8)
+    for threshold in TIER_THRESHOLDS:
+        tier -= severity > threshold
+
+    actions, table = get_action_index()
+    action = table[tier, road_class]
+    costs = np.array([a['cost'] for a in actions], dtype=np.float64)
+    effects = np.array([a['effect_reduction'] for a in actions], dtype=np.float64)
+
+    return {
+        'severity': severity,
+        'lanes': lanes,
+        'tier': tier,
+        'action': action,
+        'actions': [dict(a) for a in actions],
+        'cost': costs[action],
+        'effect_reduction': effects[action],
+    }
+
+
+def score_records(records):
+    """Пакетный скоринг списка участков (self.data)."""
+    return score_batch(**segment_columns(records))
@@ -0,0 +1,144 @@
+import math
+
+import numpy as np
+
+import diagnostics
+from segments import ragged_index
+
+# --- Граф дорожной сети и распространение заторов ---
+# Вершины графа - участки хранилища (segments.SegmentStore), ребро соединяет два
+# участка с общей концевой точкой линии (начало или конец LineString или части
+# MultiLineString). Концы совпадают, если попадают в одну ячейку сетки с шагом
+# ENDPOINT_TOLERANCE_M метров. Смежность хранится разреженной симметричной
+# матрицей в формате CSR (indptr, indices) на массивах NumPy.
+#
+# Перетекание заторов: перегруженный участок (пиковая нагрузка выше
+# SPILLOVER_THRESHOLD) отдает долю SPILLOVER_SHARE превышения соседям поровну.
+# Эффективная нагрузка - неподвижная точка
+#     L = L0 + A * D^-1 * share * max(0, L - threshold),
+# где A - матрица смежности, D - степени вершин. При share < 1 отображение
+# сжимающее, итерации (по одному умножению разреженной матрицы на вектор)
+# сходятся геометрически.
+
+METERS_PER_DEGREE = 6_371_008.8 * math.pi / 180
+ENDPOINT_TOLERANCE_M = 0.5
+# Пиковая нагрузка (доля пропускной способности), выше которой затор перетекает к соседям
+SPILLOVER_THRESHOLD = 0.9
+# Доля превышения, передаваемая соседям
+SPILLOVER_SHARE = 0.5
+MAX_ITERATIONS = 200
+# Не больше стольких концов в одной точке соединяются попарно (защита от вырожденных
+# данных, например множества объектов Point с одинаковыми координатами)
+MAX_JUNCTION_ENDS = 32
+CONVERGENCE_TOLERANCE = 1e-6
+
+
+def _segment_endpoints(segments):
+    """Концевые точки линий: (номера участков, координаты (K, 2)) для всех частей."""
+    starts, counts = segments.vertex_start, segments.vertex_count
+    coords = segments.coords[ragged_index(starts, counts)]
+    owner = np.repeat(np.arange(len(segments), dtype=np.int64), counts)
+    valid = ~np.isnan(coords[:, 0])
+    # Начало части: первая вершина участка или вершина после разделителя (nan, nan)
+    first = np.ones(len(coords), dtype=bool)
+    first[1:] = (owner[1:] != owner[:-1]) | ~valid[:-1]
+    last = np.ones(len(coords), dtype=bool)
+    last[:-1] = (owner[1:] != owner[:-1]) | ~valid[1:]
+    ends = valid & (first | last)
+    return owner[ends], coords[ends]
+
+
+class RoadGraph:
+    """Граф смежности участков (CSR): соседи участка i - indices[indptr[i]:indptr[i + 1]]."""
+
+    def __init__(self, indptr, indices):
+        self.indptr = indptr
+        self.indices = indices
+        self.degree = np.diff(indptr).astype(np.int64)
+        # Номер строки для каждого ненулевого элемента (умножение через bincount)
+        self._rows = np.repeat(np.arange(len(self.degree), dtype=np.int32), self.degree)
+
+    def __len__(self):
+        return len(self.degree)
+
+    @property
+    def edge_count(self):
+        return len(self.indices) // 2
+
+    @classmethod
+    def from_edges(cls, n, first, second):
+        """Граф из пар (first[k], second[k]); петли и повторы ребер отбрасываются."""
+        first = np.asarray(first, dtype=np.int64)
+        second = np.asarray(second, dtype=np.int64)
+        keep = first != second
+        rows = np.concatenate((first[keep], second[keep]))
+        cols = np.concatenate((second[keep], first[keep]))
+        keys = np.unique(rows * n + cols)
+        rows, cols = keys // n, keys % n
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+        return cls(indptr, cols.astype(np.int32))
+
+    @classmethod
+    def build(cls, segments, tolerance_m=ENDPOINT_TOLERANCE_M):
+        """Граф по общим концевым точкам линий участков хранилища."""
+        with diagnostics.stage('road_graph', len(segments)) as st:
+            owner, points = _segment_endpoints(segments)
+            if not len(points):
+                return cls.from_edges(len(segments), [], [])
+            # Шаг сетки в градусах: по долготе с поправкой на широту центра сети
+            lat0 = math.radians(float(np.mean(points[:, 1])))
+            step_lat = tolerance_m / METERS_PER_DEGREE
+            step_lon = step_lat / max(math.cos(lat0), 1e-6)
+            cells = np.floor(points / (step_lon, step_lat)).astype(np.int64)
+            cells -= cells.min(axis=0)
+            keys = cells[:, 0] * (int(cells[:, 1].max()) + 1) + cells[:, 1]
+
+            # Участки с одинаковым ключом конца попарно смежны: сдвиги внутри групп
+            order = np.argsort(keys, kind='stable')
+            keys, owner = keys[order], owner[order]
+            first, second = [], []
+            shift = 1
+            while shift < min(len(keys), MAX_JUNCTION_ENDS):
+                same = np.flatnonzero(keys[shift:] == keys[:-shift])
+                if not len(same):
+                    break
+                first.append(owner[same])
+                second.append(owner[same + shift])
+                shift += 1
+            graph = cls.from_edges(
+                len(segments),
+                np.concatenate(first) if first else [],
+                np.concatenate(second) if second else [],
+            )
+            st.items = graph.edge_count
+        return graph
+
+    def matvec(self, values):
+        """Сумма значений по соседям каждого участка (A @ values)."""
+        return np.bincount(self._rows, weights=values[self.indices], minlength=len(self))
+
+    def spillover(self, load, threshold=SPILLOVER_THRESHOLD, share=SPILLOVER_SHARE,
+                  max_iterations=MAX_ITERATIONS, tolerance=CONVERGENCE_TOLERANCE):
+        """
+        Итеративное перетекание заторов. load - пиковая нагрузка участков max(CurLoad,
+        PredictiveLoad). Возвращает (добавка к нагрузке от соседей, число итераций).
+        Участки без соседей не отдают и не получают нагрузку.
+        """
+        if not 0 <= share < 1:
+            raise ValueError("share должен быть в диапазоне [0, 1)")
+        load = np.asarray(load, dtype=np.float64)
+        with diagnostics.stage('spillover', len(self.indices)) as st:
+            # Доля превышения на каждого соседа
+            weight = np.where(self.degree > 0, share / np.maximum(self.degree, 1), 0.0)
+            effective = load.copy()
+            iterations = 0
+            for iterations in range(1, max_iterations + 1):
+                outflow = np.maximum(effective - threshold, 0.0) * weight
+                updated = load + self.matvec(outflow)
+                change = np.max(np.abs(updated - effective)) if len(updated) else 0.0
+                effective = updated
+                if change < tolerance:
+                    break
+            st.items = len(self.indices) * iterations
+        return effective - load, iterations
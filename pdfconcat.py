@@ -0,0 +1,171 @@
+import hashlib
+import io
+import os
+from array import array
+
+from pypdf import PdfReader
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject, StreamObject
+
+# --- Потоковая склейка PDF-частей отчета ---
+# Части отчета рендерятся reportlab в отдельных процессах и склеиваются здесь.
+# Часть разбирается pypdf (любые таблицы xref, потоки объектов, наследуемые
+# атрибуты страниц), ее объекты с перенумерованными ссылками сразу дописываются
+# в итоговый файл, после чего часть освобождается. В памяти остаются только
+# смещения объектов (для таблицы xref) и номера страниц - по несколько байт на
+# объект, независимо от содержимого частей.
+#
+# Одинаковые объекты (кроме страниц и их содержимого) объединяются по хэшу SHA-1
+# их записи с уже перенумерованными ссылками: шрифт, его описание и таблица
+# ширин, встроенные в каждую часть, хранятся в документе один раз и
+# переиспользуются следующими частями.
+
+PDF_HEADER = b'%PDF-1.7\n%\xe2\xe3\xcf\xd3\n'
+# Номера объектов каталога и корня дерева страниц (записываются в close)
+_CATALOG_ID, _PAGES_ID = 1, 2
+
+
+class PdfConcatenator:
+    """
+    Последовательная склейка PDF-частей в один документ:
+
+        concat = PdfConcatenator(path)
+        concat.append_file(part_path)   # для каждой части по порядку
+        concat.close()                  # дерево страниц, xref и trailer
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'wb')
+        self._file.write(PDF_HEADER)
+        # Смещения объектов в файле по номерам (0 - свободный объект, номера 1 и 2 зарезервированы)
+        self._offsets = array('q', [0, 0, 0])
+        self._pages = array('q')
+        self._shared = {}
+        self._info_id = None
+        # Состояние текущей части: номер объекта части -> номер в документе
+        self._reader = None
+        self._ids = {}
+        self._in_progress = set()
+
+    def append_file(self, part_path):
+        """Дописывает страницы PDF-части в конец документа."""
+        with PdfReader(part_path) as reader:
+            self._reader = reader
+            self._ids = {}
+            try:
+                for page in reader.pages:
+                    self._pages.append(self._emit(page.indirect_reference, page=True))
+                info = reader.trailer.get('/Info')
+                if self._info_id is None and isinstance(info, IndirectObject):
+                    self._info_id = self._emit(info)
+            finally:
+                self._reader = None
+                self._ids = {}
+                self._in_progress.clear()
+
+    def _allocate(self):
+        self._offsets.append(0)
+        return len(self._offsets) - 1
+
+    def _emit(self, reference, page=False, share=True):
+        """
+        Номер объекта части в документе; объект (и все, на что он ссылается) записывается
+        при первом обращении. share=False - объект заведомо уникален (содержимое страницы)
+        и не запоминается для объединения.
+        """
+        key = (reference.idnum, reference.generation)
+        new_id = self._ids.get(key)
+        if new_id is not None:
+            return new_id
+        if key in self._in_progress:
+            # Циклическая ссылка: номер выдается заранее, такой объект не объединяется с другими
+            new_id = self._ids[key] = self._allocate()
+            return new_id
+
+        self._in_progress.add(key)
+        obj = self._reader.get_object(reference)
+        if page:
+            body = DictionaryObject({
+                name: self._remap(value, name != '/Contents') for name, value in obj.items() if name != '/Parent'
+            })
+            body[NameObject('/Parent')] = IndirectObject(_PAGES_ID, 0, None)
+            data = _serialize(body)
+        elif isinstance(obj, StreamObject):
+            # Данные потока переносятся закодированными (_data), /Length считается заново
+            body = DictionaryObject({
+                name: self._remap(value) for name, value in obj.items() if name != '/Length'
+            })
+            data = _serialize(body, obj._data)
+        else:
+            data = _serialize(self._remap(obj))
+        self._in_progress.discard(key)
+
+        new_id = self._ids.get(key)
+        digest = None
+        if new_id is None and share and not page:
+            digest = hashlib.sha1(data).digest()
+            new_id = self._shared.get(digest)
+            if new_id is not None:
+                self._ids[key] = new_id
+                return new_id
+        if new_id is None:
+            new_id = self._ids[key] = self._allocate()
+        if digest is not None:
+            self._shared[digest] = new_id
+        self._write_object(new_id, data)
+        return new_id
+
+    def _remap(self, value, share=True):
+        """Копия значения со ссылками, перенумерованными в номера документа."""
+        if isinstance(value, IndirectObject):
+            return IndirectObject(self._emit(value, share=share), 0, None)
+        if isinstance(value, DictionaryObject):
+            return DictionaryObject({name: self._remap(item, share) for name, item in value.items()})
+        if isinstance(value, ArrayObject):
+            return ArrayObject(self._remap(item, share) for item in value)
+        return value
+
+    def _write_object(self, object_id, data):
+        self._offsets[object_id] = self._file.tell()
+        self._file.write(b'%d 0 obj\n' % object_id)
+        self._file.write(data)
+        self._file.write(b'\nendobj\n')
+
+    def close(self):
+        """Дописывает каталог, дерево страниц, таблицу xref и закрывает файл self.path."""
+        kids = b' '.join(b'%d 0 R' % page_id for page_id in self._pages)
+        self._write_object(_PAGES_ID, b'<< /Type /Pages /Kids [ %s ] /Count %d >>' % (kids, len(self._pages)))
+        self._write_object(_CATALOG_ID, b'<< /Type /Catalog /Pages %d 0 R >>' % _PAGES_ID)
+
+        xref_offset = self._file.tell()
+        size = len(self._offsets)
+        self._file.write(b'xref\n0 %d\n0000000000 65535 f \n' % size)
+        for start in range(1, size, 4096):
+            self._file.write(b''.join(
+                b'%010d 00000 n \n' % offset for offset in self._offsets[start:start + 4096]
+            ))
+        info = b' /Info %d 0 R' % self._info_id if self._info_id is not None else b''
+        self._file.write(b'trailer\n<< /Size %d /Root %d 0 R%s >>\nstartxref\n%d\n%%%%EOF\n'
+                         % (size, _CATALOG_ID, info, xref_offset))
+        self._file.close()
+
+    def abort(self):
+        """Отбрасывает недописанный документ и его файл."""
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def _serialize(value, stream_data=None):
+    """Запись объекта PDF (без 'N 0 obj'); stream_data - данные потока как есть (закодированные)."""
+    buffer = io.BytesIO()
+    if stream_data is not None:
+        value[NameObject('/Length')] = NumberObject(len(stream_data))
+    value.write_to_stream(buffer)
+    if stream_data is not None:
+        buffer.write(b'\nstream\n')
+        buffer.write(stream_data)
+        buffer.write(b'\nendstream')
+    return buffer.getvalue()
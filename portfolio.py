@@ -0,0 +1,218 @@
+from math import gcd
+
+import numpy as np
+
+import model
+
+# --- Оптимизация портфеля мероприятий при ограниченном бюджете ---
+# Задача: выбрать для участков сети не более одного мероприятия на участок так,
+# чтобы суммарное снижение Индекса Серьезности было максимальным, а суммарная
+# стоимость не превышала бюджет (многовариантный рюкзак).
+#
+#   'greedy' - LP-релаксация: выпуклые оболочки вариантов каждого участка и жадный
+#              выбор приращений по убыванию эффективности (масштабируется на 100k+).
+#   'exact'  - динамическое программирование по бюджету (шаг - НОД стоимостей).
+#   'auto'   - 'exact', если таблица DP помещается в EXACT_CELL_LIMIT, иначе 'greedy'.
+
+EXACT_CELL_LIMIT = 20_000_000
+
+
+def library_actions():
+    """Плоский список мероприятий библиотеки: [(тип, мероприятие), ...] (мероприятия - dict-копии)."""
+    return [
+        (action_type, dict(action))
+        for action_type, actions in model.ACTION_LIBRARY.items()
+        for action in actions
+    ]
+
+
+def action_gains(columns, actions):
+    """
+    Снижение Индекса Серьезности и ТИР после каждого мероприятия для всех участков.
+    Мероприятие снижает текущую и прогнозную нагрузку на effect_reduction.
+    Возвращает (base_scores, gains[N, K], tiers_after[N, K]).
+    """
+    base = model.score_batch(**columns)
+    n = len(base['severity'])
+    gains = np.empty((n, len(actions)), dtype=np.float64)
+    tiers_after = np.empty((n, len(actions)), dtype=np.int8)
+    for k, action in enumerate(actions):
+        factor = 1.0 - action['effect_reduction']
+        projected = model.score_batch(**dict(
+            columns,
+            cur_load=columns['cur_load'] * factor,
+            pred_load=columns['pred_load'] * factor,
+        ))
+        gains[:, k] = base['severity'] - projected['severity']
+        tiers_after[:, k] = projected['tier']
+    return base, gains, tiers_after
+
+
+def _cost_unit(costs):
+    """Шаг бюджета для DP - наибольший общий делитель стоимостей."""
+    unit = 0
+    for cost in costs:
+        unit = gcd(unit, int(cost))
+    return unit or 1
+
+
+def _hull_increments(gains, costs):
+    """
+    Верхние выпуклые оболочки вариантов (стоимость, эффект) по каждому участку.
+    Возвращает приращения: строка, вариант, d_стоимость, d_эффект, эффективность.
+    """
+    n, k = gains.shape
+    cur_cost = np.zeros(n)
+    cur_gain = np.zeros(n)
+    active = np.ones(n, dtype=bool)
+    rows, options, d_costs, d_gains, slopes = [], [], [], [], []
+
+    for _ in range(k):
+        idx = np.flatnonzero(active)
+        if idx.size == 0:
+            break
+        d_cost = costs[None, :] - cur_cost[idx, None]
+        d_gain = gains[idx] - cur_gain[idx, None]
+        valid = (d_cost > 0) & (d_gain > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = np.where(valid, d_gain / np.where(d_cost > 0, d_cost, 1), -np.inf)
+        best = np.argmax(slope, axis=1)
+        best_slope = slope[np.arange(idx.size), best]
+        found = np.isfinite(best_slope)
+        active[idx[~found]] = False
+        idx, best, best_slope = idx[found], best[found], best_slope[found]
+        if idx.size == 0:
+            break
+
+        rows.append(idx)
+        options.append(best)
+        d_costs.append(costs[best] - cur_cost[idx])
+        d_gains.append(gains[idx, best] - cur_gain[idx])
+        slopes.append(best_slope)
+        cur_cost[idx] = costs[best]
+        cur_gain[idx] = gains[idx, best]
+
+    if not rows:
+        empty = np.empty(0)
+        return empty.astype(np.intp), empty.astype(np.intp), empty, empty, empty
+    return (np.concatenate(rows), np.concatenate(options), np.concatenate(d_costs),
+            np.concatenate(d_gains), np.concatenate(slopes))
+
+
+def _solve_greedy(gains, costs, budget):
+    """Жадное решение по LP-релаксации; возвращает (выбор по участкам, верхняя оценка)."""
+    choice = np.full(gains.shape[0], -1, dtype=np.intp)
+    rows, options, d_costs, d_gains, slopes = _hull_increments(gains, costs)
+    if rows.size == 0:
+        return choice, 0.0
+
+    # Внутри участка эффективность приращений убывает, поэтому порядок шагов сохраняется
+    order = np.lexsort((np.arange(rows.size), -slopes))
+    rows, options, d_costs, d_gains = rows[order], options[order], d_costs[order], d_gains[order]
+
+    spent = np.cumsum(d_costs)
+    prefix = int(np.searchsorted(spent, budget, side='right'))
+    # Итог участка - его последний вошедший шаг (явно, без опоры на порядок записи дубликатов)
+    last = np.full(gains.shape[0], -1, dtype=np.intp)
+    np.maximum.at(last, rows[:prefix], np.arange(prefix))
+    taken = np.flatnonzero(last >= 0)
+    choice[taken] = options[last[taken]]
+    remaining = budget - (spent[prefix - 1] if prefix else 0.0)
+
+    # Верхняя оценка LP: целая часть + дробная доля первого не поместившегося приращения
+    upper_bound = float(d_gains[:prefix].sum())
+    if prefix < rows.size:
+        upper_bound += float(d_gains[prefix] * remaining / d_costs[prefix])
+
+    # Добор остатка бюджета: пропуск шага участка блокирует его следующие шаги
+    blocked = set()
+    for i in range(prefix, rows.size):
+        row = rows[i]
+        if row in blocked:
+            continue
+        if d_costs[i] <= remaining:
+            choice[row] = options[i]
+            remaining -= d_costs[i]
+        else:
+            blocked.add(row)
+    return choice, upper_bound
+
+
+def _solve_exact(gains, costs, budget):
+    """Точное решение методом динамического программирования по бюджету."""
+    n, k = gains.shape
+    choice = np.full(n, -1, dtype=np.intp)
+    unit = _cost_unit(costs)
+    capacity = int(budget // unit)
+    steps = (costs // unit).astype(np.intp)
+
+    candidates = np.flatnonzero((gains > 0).any(axis=1))
+    best = np.zeros(capacity + 1)
+    picks = np.zeros((candidates.size, capacity + 1), dtype=np.int16)
+    for i, row in enumerate(candidates):
+        previous = best.copy()
+        for option in range(k):
+            gain, step = gains[row, option], steps[option]
+            if gain <= 0 or step > capacity:
+                continue
+            candidate = previous[:capacity + 1 - step] + gain
+            improved = np.flatnonzero(candidate > best[step:])
+            best[step + improved] = candidate[improved]
+            picks[i, step + improved] = option + 1
+
+    # Восстановление выбора с конца
+    b = capacity
+    for i in range(candidates.size - 1, -1, -1):
+        option = picks[i, b] - 1
+        if option >= 0:
+            choice[candidates[i]] = option
+            b -= steps[option]
+    return choice, float(best[capacity])
+
+
+def optimize_portfolio(columns, budget, method='auto'):
+    """
+    Оптимальный по бюджету набор мероприятий для всей сети.
+
+    columns - колонки участков (см. model.segment_columns), budget - общий бюджет.
+    Возвращает dict: индексы участков и выбранные мероприятия, общую стоимость,
+    суммарное снижение серьезности и прогноз изменения ТИРов.
+    """
+    actions_with_types = library_actions()
+    actions = [action for _, action in actions_with_types]
+    costs = np.array([action['cost'] for action in actions], dtype=np.float64)
+    base, gains, tiers_after = action_gains(columns, actions)
+
+    if method == 'auto':
+        cells = len(gains) * (int(budget // _cost_unit(costs)) + 1)
+        method = 'exact' if cells <= EXACT_CELL_LIMIT else 'greedy'
+    if method == 'greedy':
+        choice, upper_bound = _solve_greedy(gains, costs, budget)
+    elif method == 'exact':
+        choice, upper_bound = _solve_exact(gains, costs, budget)
+    else:
+        raise ValueError(f"Неизвестный метод оптимизации: {method}")
+
+    segments = np.flatnonzero(choice >= 0)
+    chosen = choice[segments]
+    tier_before = base['tier'][segments]
+    tier_after = tiers_after[segments, chosen]
+
+    tier_changes = {}
+    for before, after in zip(tier_before.tolist(), tier_after.tolist()):
+        tier_changes[(before, after)] = tier_changes.get((before, after), 0) + 1
+
+    return {
+        'method': method,
+        'segments': segments,
+        'action': chosen,
+        'actions': actions_with_types,
+        'cost': costs[chosen],
+        'severity_reduction': gains[segments, chosen],
+        'total_cost': float(costs[chosen].sum()),
+        'total_severity_reduction': float(gains[segments, chosen].sum()),
+        'upper_bound': upper_bound,
+        'tier_before': tier_before,
+        'tier_after': tier_after,
+        'tier_changes': tier_changes,
+    }
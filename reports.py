@@ -0,0 +1,474 @@
+import collections
+import datetime
+import importlib.util
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import diagnostics
+from model import ROAD_CLASSES, TIER_LABELS, score_batch
+
+# --- Отчеты (PDF / Excel) ---
+# Библиотеки отчетов импортируются лениво, при первой генерации отчета:
+# запуск GUI и пакетного режима не тратит время на reportlab/openpyxl/pypdf.
+
+_reportlab_ready = False
+_pdf_font = 'Helvetica'
+
+
+def pdf_available():
+    """Установлены ли reportlab и pypdf (склейка частей) - проверка без импорта."""
+    return all(importlib.util.find_spec(name) is not None for name in ('reportlab', 'pypdf'))
+
+
+def excel_available():
+    """Установлен ли openpyxl (проверка без импорта)."""
+    return importlib.util.find_spec('openpyxl') is not None
+
+
+def load_reportlab():
+    """
+    Однократный импорт reportlab и регистрация шрифта с кириллицей.
+    Возвращает имя шрифта для отчетов (Helvetica, если DejaVuSans не найден).
+    """
+    global _reportlab_ready, _pdf_font
+    if not _reportlab_ready:
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        try:
+            # Убедитесь, что шрифт DejavuSans.ttf доступен в окружении для кириллицы
+            pdfmetrics.registerFont(TTFont('DejaVuSans', 'DejaVuSans.ttf'))
+            _pdf_font = 'DejaVuSans'
+        except Exception:
+            pass
+        _reportlab_ready = True
+    return _pdf_font
+
+
+def load_openpyxl():
+    """Импорт openpyxl при первом обращении."""
+    import openpyxl
+    return openpyxl
+
+
+# --- Строки отчета ---
+
+REPORT_HEADERS = [
+    "Участок",
+    "Класс Дороги",
+    "CurLoad (Текущая)",
+    "PredLoad (Прогноз)",
+    "Ширина (м)",
+    "Полос",
+    "Перекресток",
+    "Светофор",
+    "Погода",
+    "Индекс Серьезности",
+    "ТИР",
+    "Мероприятие",
+    "Стоимость (руб.)",
+]
+
+REPORT_CHUNK_SIZE = 10000
+# Поля хранилища участков в первых столбцах отчета
+_REPORT_FIELDS = (
+    'ST_NAME', 'RoadClass', 'CurLoad', 'PredictiveLoad', 'Width', 'Lanes', 'CrossRoad', 'Control', 'WeatherImpact',
+)
+
+
+def iter_report_chunks(segments, chunk_size=REPORT_CHUNK_SIZE, scores=None):
+    """
+    Генератор порций строк отчета (списки кортежей в порядке REPORT_HEADERS)
+    из хранилища участков (segments.SegmentStore). Мероприятие и стоимость
+    определяются пакетным скорингом порции или берутся из готового скоринга
+    всех участков (scores).
+    """
+    flags = {'1': 'ДА', '0': 'Нет'}
+    for start in range(0, len(segments), chunk_size):
+        chunk = segments[start:start + chunk_size]
+        if scores is None:
+            chunk_scores = score_batch(**chunk.score_columns())
+        else:
+            chunk_scores = {key: scores[key][start:start + chunk_size] for key in ('severity', 'tier', 'action')}
+            chunk_scores['actions'] = scores['actions']
+        actions = chunk_scores['actions']
+        fields = [chunk.field_values(field) for field in _REPORT_FIELDS]
+        yield [
+            (
+                name,
+                road_class,
+                round(cur_load, 2),
+                round(pred_load, 2),
+                width,
+                lanes,
+                flags[crossroad],
+                flags[control],
+                weather,
+                round(severity, 2),
+                TIER_LABELS[tier - 1],
+                actions[action_index]['name'],
+                actions[action_index]['cost'],
+            )
+            for (name, road_class, cur_load, pred_load, width, lanes, crossroad, control, weather,
+                 severity, tier, action_index) in zip(
+                *fields, chunk_scores['severity'].tolist(), chunk_scores['tier'].tolist(),
+                chunk_scores['action'].tolist(),
+            )
+        ]
+
+
+# --- Excel: потоковая запись (write-only) ---
+
+# Предел строк листа Excel; при превышении участки продолжаются на следующем листе
+EXCEL_MAX_ROWS = 1_048_576
+EXCEL_COLUMN_WIDTHS = [40, 16, 12, 12, 10, 8, 12, 10, 12, 12, 36, 48, 16]
+
+
+def _add_excel_sheet(workbook, number):
+    from openpyxl.utils import get_column_letter
+    sheet = workbook.create_sheet("Участки" if number == 1 else f"Участки ({number})")
+    for column, width in enumerate(EXCEL_COLUMN_WIDTHS, start=1):
+        sheet.column_dimensions[get_column_letter(column)].width = width
+    sheet.freeze_panes = 'A2'
+    sheet.append(REPORT_HEADERS)
+    return sheet
+
+
+def _discard_workbook(workbook):
+    """Закрывает листы write-only книги и удаляет их временные файлы."""
+    for sheet in workbook.worksheets:
+        try:
+            if not sheet.closed:
+                sheet.close()
+            sheet._writer.cleanup()
+        except (AttributeError, OSError, ValueError):
+            pass
+
+
+def _add_excel_info_sheet(workbook, total, seed):
+    sheet = workbook.create_sheet("Сведения")
+    sheet.column_dimensions['A'].width = 28
+    sheet.column_dimensions['B'].width = 24
+    sheet.append(["Сформирован", f"{datetime.datetime.now():%d.%m.%Y %H:%M}"])
+    sheet.append(["Участков", total])
+    sheet.append(["Сид симуляции", seed if seed is not None else "Н/Д"])
+
+
+def export_excel(path, segments, progress=None, is_cancelled=None, seed=None):
+    """
+    Выгрузка всех участков в .xlsx в режиме write-only: строки сразу пишутся
+    во временный файл листа, поэтому память не растет с числом участков.
+    seed - сид симуляции, записывается на лист "Сведения".
+
+    progress(done, total) вызывается после каждой порции, is_cancelled() -
+    проверка отмены. Возвращает False, если выгрузка отменена (файл не создается).
+    """
+    with diagnostics.stage('report_excel', len(segments)):
+        openpyxl = load_openpyxl()
+        workbook = openpyxl.Workbook(write_only=True)
+        total = len(segments)
+        sheet_number = 1
+        sheet = _add_excel_sheet(workbook, sheet_number)
+        sheet_rows = 1
+        done = 0
+
+        try:
+            _add_excel_info_sheet(workbook, total, seed)
+            for rows in iter_report_chunks(segments):
+                if is_cancelled is not None and is_cancelled():
+                    _discard_workbook(workbook)
+                    return False
+                for row in rows:
+                    if sheet_rows == EXCEL_MAX_ROWS:
+                        sheet_number += 1
+                        sheet = _add_excel_sheet(workbook, sheet_number)
+                        sheet_rows = 1
+                    sheet.append(row)
+                    sheet_rows += 1
+                done += len(rows)
+                if progress is not None:
+                    progress(done, total)
+
+            # Запись во временный файл: при ошибке не остается поврежденного отчета
+            tmp_path = path + '.tmp'
+            try:
+                workbook.save(tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        except BaseException:
+            _discard_workbook(workbook)
+            raise
+        return True
+
+
+# --- PDF: постраничный рендеринг частей в пуле процессов ---
+# Таблица рисуется напрямую на canvas (без Table/SimpleDocTemplate, чья разметка
+# всей таблицы медленна и требует много памяти). Участки делятся на части по
+# PDF_PAGES_PER_PART страниц; части рендерятся параллельно во временные файлы
+# и по порядку, по мере готовности, дописываются в итоговый документ (pdfconcat.py).
+
+# Символы, которым шрифт отчета назначает коды заранее и в одном порядке в каждой
+# части: подмножества встроенного шрифта (TrueType) у частей совпадают побайтно и
+# при склейке хранятся в документе один раз. Символ вне набора добавляет своей
+# части отдельное подмножество шрифта.
+PDF_GLYPHS = (
+    ''.join(chr(code) for code in range(32, 127))
+    + ''.join(chr(code) for code in range(ord('А'), ord('я') + 1))
+    + 'Ёё№…«»—–'
+)
+
+PDF_ROWS_PER_PAGE = 40
+PDF_PAGES_PER_PART = 50
+PDF_FONT_SIZE = 7
+PDF_ROW_HEIGHT = 11.5
+PDF_MARGIN = 24
+
+# (заголовок, ширина колонки, индекс поля в строке отчета или None для номера строки)
+PDF_COLUMNS = [
+    ("№", 38, None),
+    ("Участок", 190, 0),
+    ("Класс", 70, 1),
+    ("CurLoad", 42, 2),
+    ("PredLoad", 44, 3),
+    ("Индекс", 44, 9),
+    ("ТИР", 34, 10),
+    ("Мероприятие", 268, 11),
+    ("Стоимость", 60, 12),
+]
+
+
+def _pdf_cell(row, row_number, field, width):
+    if field is None:
+        text = str(row_number)
+    elif field == 10:
+        text = row[field].split(':')[0]
+    elif field == 12:
+        text = f"{row[field]:,}".replace(',', ' ')
+    else:
+        text = str(row[field])
+    # Усечение по числу символов: измерение ширины строки дорого на сотнях тысяч ячеек
+    max_chars = int(width / (PDF_FONT_SIZE * 0.55))
+    return text if len(text) <= max_chars else text[:max_chars - 1] + '…'
+
+
+def _reserve_pdf_glyphs(c, font):
+    """Назначает кодам шрифта символы PDF_GLYPHS до рисования (одинаково во всех частях)."""
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    face = pdfmetrics.getFont(font)
+    if isinstance(face, TTFont):
+        face.splitString(PDF_GLYPHS, c._doc)
+
+
+def _draw_pdf_footer(c, font, page_width, page_number, total_pages):
+    c.setFont(font, PDF_FONT_SIZE)
+    c.drawRightString(page_width - PDF_MARGIN, PDF_MARGIN / 2, f"Стр. {page_number} из {total_pages}")
+
+
+def _render_pdf_part(path, rows, first_row, first_page, total_pages):
+    """Рендеринг части таблицы участков (выполняется в процессе пула). Возвращает (path, число строк)."""
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.pdfgen import canvas
+
+    font = load_reportlab()
+    page_width, page_height = landscape(A4)
+    c = canvas.Canvas(path, pagesize=(page_width, page_height))
+    _reserve_pdf_glyphs(c, font)
+    for page_start in range(0, len(rows), PDF_ROWS_PER_PAGE):
+        y = page_height - PDF_MARGIN - PDF_ROW_HEIGHT
+        c.setFillGray(0.85)
+        c.rect(PDF_MARGIN, y - 3, page_width - 2 * PDF_MARGIN, PDF_ROW_HEIGHT, stroke=0, fill=1)
+        c.setFillGray(0)
+        c.setFont(font, PDF_FONT_SIZE + 1)
+        x = PDF_MARGIN + 2
+        for title, width, _ in PDF_COLUMNS:
+            c.drawString(x, y, title)
+            x += width
+
+        c.setFont(font, PDF_FONT_SIZE)
+        for offset, row in enumerate(rows[page_start:page_start + PDF_ROWS_PER_PAGE]):
+            y -= PDF_ROW_HEIGHT
+            x = PDF_MARGIN + 2
+            row_number = first_row + page_start + offset + 1
+            for _, width, field in PDF_COLUMNS:
+                c.drawString(x, y, _pdf_cell(row, row_number, field, width))
+                x += width
+
+        _draw_pdf_footer(c, font, page_width, first_page + page_start // PDF_ROWS_PER_PAGE, total_pages)
+        c.showPage()
+    c.save()
+    return path, len(rows)
+
+
+def pdf_tier_summary(columns, scores):
+    """Сводка по ТИРам: число участков, средний индекс, стоимость мероприятий, участки по классам."""
+    tiers = scores['tier'].astype(np.intp)
+    levels = len(TIER_LABELS) + 1
+    counts = np.bincount(tiers, minlength=levels)[1:]
+    severity = np.bincount(tiers, weights=scores['severity'], minlength=levels)[1:]
+    cost = np.bincount(tiers, weights=scores['cost'], minlength=levels)[1:]
+    class_names = ROAD_CLASSES + ('Н/Д',)
+    by_class = np.zeros((len(TIER_LABELS), len(class_names)), dtype=np.int64)
+    np.add.at(by_class, (tiers - 1, columns['road_class'].astype(np.intp)), 1)
+    return [
+        {
+            'label': label,
+            'count': int(counts[i]),
+            'mean_severity': float(severity[i] / counts[i]) if counts[i] else 0.0,
+            'cost': float(cost[i]),
+            'by_class': dict(zip(class_names, by_class[i].tolist())),
+        }
+        for i, label in enumerate(TIER_LABELS)
+    ]
+
+
+def _render_pdf_cover(path, summary, total, total_pages, seed=None):
+    """Титульная страница: сводка по ТИРам и классам дорог."""
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.pdfgen import canvas
+
+    font = load_reportlab()
+    page_width, page_height = landscape(A4)
+    c = canvas.Canvas(path, pagesize=(page_width, page_height))
+    _reserve_pdf_glyphs(c, font)
+    y = page_height - PDF_MARGIN - 20
+    c.setFont(font, 16)
+    c.drawString(PDF_MARGIN, y, "ОТЧЕТ ПО УЧАСТКАМ УДС: ТИРЫ И РЕКОМЕНДАЦИИ")
+    y -= 22
+    c.setFont(font, 10)
+    c.drawString(
+        PDF_MARGIN, y,
+        f"Сформирован: {datetime.datetime.now():%d.%m.%Y %H:%M}    Участков: {total}    "
+        f"Сид симуляции: {seed if seed is not None else 'Н/Д'}",
+    )
+
+    class_names = list(summary[0]['by_class']) if summary else []
+    headers = ["ТИР", "Участков", "Доля", "Ср. индекс", "Стоимость мероприятий (руб.)"] + class_names
+    widths = [230, 60, 50, 65, 160] + [75] * len(class_names)
+    y -= 36
+    c.setFont(font, 9)
+    x = PDF_MARGIN
+    for header, width in zip(headers, widths):
+        c.drawString(x, y, header)
+        x += width
+    c.line(PDF_MARGIN, y - 4, PDF_MARGIN + sum(widths), y - 4)
+    for tier in summary:
+        y -= 18
+        cells = [
+            tier['label'],
+            str(tier['count']),
+            f"{tier['count'] / total:.1%}" if total else "0%",
+            f"{tier['mean_severity']:.1f}",
+            f"{tier['cost']:,.0f}".replace(',', ' '),
+        ] + [str(tier['by_class'][name]) for name in class_names]
+        x = PDF_MARGIN
+        for cell, width in zip(cells, widths):
+            c.drawString(x, y, cell)
+            x += width
+    y -= 18
+    c.line(PDF_MARGIN, y + 12, PDF_MARGIN + sum(widths), y + 12)
+    c.drawString(PDF_MARGIN, y, "Итого")
+    c.drawString(PDF_MARGIN + widths[0], y, str(total))
+    total_cost = sum(tier['cost'] for tier in summary)
+    c.drawString(PDF_MARGIN + sum(widths[:4]), y, f"{total_cost:,.0f}".replace(',', ' '))
+
+    _draw_pdf_footer(c, font, page_width, 1, total_pages)
+    c.showPage()
+    c.save()
+
+
+def _render_pdf_parts(tasks, workers):
+    """
+    Генератор результатов _render_pdf_part в порядке задач. В пуле одновременно
+    не больше 2 * workers частей, а PdfConcatenator дописывает каждую часть в файл
+    сразу, поэтому память на рендеринг и склейку не растет с числом страниц. С размером
+    отчета растут только столбцы оценок score_batch и смещения объектов для xref
+    (8 байт на объект PDF).
+    """
+    if workers > 1:
+        # spawn вместо fork: процесс GUI многопоточный (Qt), fork в нем небезопасен
+        context = multiprocessing.get_context('spawn')
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        pending = collections.deque()
+        try:
+            for task in tasks:
+                pending.append(pool.submit(_render_pdf_part, *task))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+    else:
+        for task in tasks:
+            yield _render_pdf_part(*task)
+
+
+def export_pdf(path, segments, progress=None, is_cancelled=None, workers=None, seed=None):
+    """
+    PDF-отчет по всем участкам: титульная сводка по ТИРам и постраничная таблица
+    с ТИРом и рекомендованным мероприятием. Части таблицы рендерятся в пуле
+    из workers процессов (по умолчанию - по числу ядер; 0/1 - в текущем процессе).
+    seed - сид симуляции, указывается на титульной странице.
+
+    progress(done, total) вызывается после каждой склеенной части, is_cancelled() -
+    проверка отмены. Возвращает False, если формирование отменено (файл не создается).
+    """
+    from pdfconcat import PdfConcatenator
+
+    with diagnostics.stage('report_pdf', len(segments)):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        total = len(segments)
+        columns = segments.score_columns()
+        scores = score_batch(**columns)
+        table_pages = -(-total // PDF_ROWS_PER_PAGE)
+        total_pages = 1 + table_pages
+        part_size = PDF_ROWS_PER_PAGE * PDF_PAGES_PER_PART
+        workers = min(workers, -(-total // part_size))
+
+        tmp_dir = tempfile.mkdtemp(prefix='kait_pdf_')
+        tmp_path = path + '.tmp'
+        document = PdfConcatenator(tmp_path)
+        completed = False
+        try:
+            cover_path = os.path.join(tmp_dir, 'cover.pdf')
+            with diagnostics.stage('pdf_cover'):
+                _render_pdf_cover(cover_path, pdf_tier_summary(columns, scores), total, total_pages, seed)
+                document.append_file(cover_path)
+
+            tasks = (
+                (os.path.join(tmp_dir, f'part_{index:05d}.pdf'), rows, index * part_size,
+                 2 + index * PDF_PAGES_PER_PART, total_pages)
+                for index, rows in enumerate(iter_report_chunks(segments, part_size, scores))
+            )
+            parts = _render_pdf_parts(tasks, workers)
+            done = 0
+            try:
+                for part_path, rows in parts:
+                    if is_cancelled is not None and is_cancelled():
+                        return False
+                    with diagnostics.stage('pdf_merge', rows):
+                        document.append_file(part_path)
+                    os.remove(part_path)
+                    done += rows
+                    if progress is not None:
+                        progress(done, total)
+            finally:
+                parts.close()
+
+            document.close()
+            os.replace(tmp_path, path)
+            completed = True
+            return True
+        finally:
+            if not completed:
+                document.abort()
+            shutil.rmtree(tmp_dir, ignore_errors=True)
@@ -0,0 +1,206 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import diagnostics
+import model
+from loader import LOAD_GROWTH_RANGE, SIMULATION_SEED, WEATHER_SIMULATION
+from portfolio import library_actions
+
+# --- Сценарный анализ "что если" (Монте-Карло) ---
+# В основной модели у каждого участка одна случайная погода и один рост прогнозной
+# нагрузки, поэтому ТИР - это один розыгрыш, а не оценка риска. Здесь для всей сети
+# разыгрываются тысячи сценариев:
+#
+#   - погода: как в loader.simulate_segments (равновероятно из WEATHER_SIMULATION);
+#   - рост нагрузки: PredictiveLoad = min(1, CurLoad * (1 + U(growth_range)));
+#   - эффект мероприятия: effect_reduction * U(1 - effect_spread, 1 + effect_spread),
+#     один множитель на участок и сценарий для всех мероприятий (общие случайные
+#     числа - сравнение мероприятий между собой не зашумлено).
+#
+# Индекс Серьезности и ТИР считаются по правилам score_segment/get_recommendation
+# (векторно: множители и пороги ТИР из model), класс дороги и структура участка
+# фиксированы. Участки делятся на блоки по SEGMENT_BLOCK, сценарии - на порции по
+# SCENARIO_BLOCK; поток генератора задается сидом и номерами блока и порции,
+# поэтому результат не зависит от числа процессов пула.
+#
+# Результат по каждому участку: вероятности ТИР 1-4 без мероприятий, ожидаемый
+# Индекс Серьезности и ожидаемое снижение Индекса для каждого мероприятия библиотеки.
+
+SEGMENT_BLOCK = 4096
+SCENARIO_BLOCK = 256
+DEFAULT_SCENARIOS = 10_000
+EFFECT_SPREAD = 0.5
+
+_WEATHER_SCENARIO_CODES = np.array([model.weather_code(w) for w in WEATHER_SIMULATION], dtype=np.int8)
+
+
+def scenario_columns(segments):
+    """
+    Неизменные в сценариях колонки участков (segments.SegmentStore): текущая нагрузка,
+    структурные баллы (перекресток, светофор, не больше 2 полос) и вес класса дороги.
+    """
+    columns = segments.score_columns()
+    lanes = model.lanes_batch(columns['width'])
+    structural = (
+        np.where(columns['crossroad'], 15.0, 0.0)
+        + np.where(columns['control'], 5.0, 0.0)
+        + np.where(lanes <= 2, 10.0, 0.0)
+    )
+    return {
+        'cur_load': np.array(columns['cur_load'], dtype=np.float64),
+        'structural': structural,
+        'class_weight': model.class_weight_batch(columns['road_class']),
+    }
+
+
+def _simulate_block(block, cur_load, structural, class_weight, effects, scenarios, seed, growth_range, effect_spread):
+    """
+    Сценарии для одного блока участков. Возвращает (block, число попаданий в ТИР 1-4 [n, 4],
+    сумма Индекса Серьезности [n], сумма снижения Индекса по мероприятиям [n, K]).
+    Промежуточные массивы [сценарии, участки] - float32, суммы - float64.
+    """
+    n = len(cur_load)
+    cur_load = cur_load.astype(np.float32)
+    structural = structural.astype(np.float32)
+    class_weight = class_weight.astype(np.float32)
+    weather_multipliers = model.weather_multiplier_batch(_WEATHER_SCENARIO_CODES).astype(np.float32)
+    tier_counts = np.zeros((n, len(model.TIER_LABELS)), dtype=np.int64)
+    severity_sum = np.zeros(n)
+    reduction_sum = np.zeros((n, len(effects)))
+    for first in range(0, scenarios, SCENARIO_BLOCK):
+        size = min(SCENARIO_BLOCK, scenarios - first)
+        rng = np.random.default_rng([seed, block, first // SCENARIO_BLOCK])
+        weather = rng.integers(0, len(_WEATHER_SCENARIO_CODES), (size, n), dtype=np.int8)
+        growth = rng.random((size, n), dtype=np.float32)
+        growth *= growth_range[1] - growth_range[0]
+        growth += 1 + growth_range[0]
+        effect_scale = rng.random((size, n), dtype=np.float32)
+        effect_scale *= 2 * effect_spread
+        effect_scale += 1 - effect_spread
+
+        # Пиковая нагрузка max(CurLoad, PredictiveLoad) * 100 и множитель погоды и класса
+        peak = np.minimum(growth * cur_load, 1.0, out=growth)
+        np.maximum(peak, cur_load, out=peak)
+        peak *= 100
+        multiplier = weather_multipliers[weather]
+        multiplier *= class_weight
+        uncapped = (peak + structural) * multiplier
+        severity = np.minimum(uncapped, model.SEVERITY_CAP)
+
+        # ТИР по порогам get_tier_level: число сценариев выше каждого порога
+        above = [np.count_nonzero(severity > threshold, axis=0) for threshold in model.TIER_THRESHOLDS]
+        tier_counts[:, 0] += above[0]
+        for level in range(1, len(above)):
+            tier_counts[:, level] += above[level] - above[level - 1]
+        tier_counts[:, -1] += size - above[-1]
+        severity_sum += severity.sum(axis=0, dtype=np.float64)
+
+        # Мероприятие снижает текущую и прогнозную нагрузку (как в portfolio.action_gains):
+        # Индекс без ограничения SEVERITY_CAP падает на d = peak * multiplier * эффект.
+        # Если Индекс не упирался в ограничение, снижение равно d, иначе - max(0, d - превышение).
+        peak *= multiplier
+        capped = uncapped > model.SEVERITY_CAP
+        capped_rows, capped_cols = np.nonzero(capped)
+        capped_load = peak[capped_rows, capped_cols]
+        capped_scale = effect_scale[capped_rows, capped_cols]
+        capped_excess = uncapped[capped_rows, capped_cols] - model.SEVERITY_CAP
+        peak[capped] = 0
+        scaled_sum = (peak * effect_scale).sum(axis=0, dtype=np.float64)
+        for k, effect in enumerate(effects):
+            if effect * (1 + effect_spread) <= 1:
+                reduction_sum[:, k] += effect * scaled_sum
+            else:
+                # Эффект больше 100% нагрузки не снижает Индекс ниже структурных баллов
+                reduction_sum[:, k] += (peak * np.minimum(1.0, effect * effect_scale)).sum(axis=0, dtype=np.float64)
+            if len(capped_cols):
+                drop = capped_load * np.minimum(1.0, effect * capped_scale) - capped_excess
+                reduction_sum[:, k] += np.bincount(capped_cols, weights=np.maximum(drop, 0), minlength=n)
+    return block, tier_counts, severity_sum, reduction_sum
+
+
+def _block_results(tasks, workers):
+    """Генератор результатов _simulate_block в порядке завершения (в пуле - не больше 2 * workers задач)."""
+    if workers > 1:
+        # spawn вместо fork: процесс GUI многопоточный (Qt), fork в нем небезопасен
+        context = multiprocessing.get_context('spawn')
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        pending = []
+        try:
+            for task in tasks:
+                pending.append(pool.submit(_simulate_block, *task))
+                if len(pending) >= 2 * workers:
+                    yield pending.pop(0).result()
+            while pending:
+                yield pending.pop(0).result()
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+    else:
+        for task in tasks:
+            yield _simulate_block(*task)
+
+
+def run_scenarios(segments, scenarios=DEFAULT_SCENARIOS, seed=SIMULATION_SEED, workers=None,
+                  growth_range=LOAD_GROWTH_RANGE, effect_spread=EFFECT_SPREAD, progress=None, is_cancelled=None):
+    """
+    Монте-Карло по всем участкам (segments.SegmentStore): scenarios сценариев погоды,
+    роста нагрузки и эффекта мероприятий. Блоки участков считаются в пуле из workers
+    процессов (по умолчанию - по числу ядер; 0/1 - в текущем процессе).
+
+    progress(done, total) вызывается после каждого блока участков, is_cancelled() -
+    проверка отмены (тогда возвращается None). Результат:
+        'tier_probability'   - [N, 4] вероятность ТИР 1-4 без мероприятий;
+        'expected_severity'  - [N] ожидаемый Индекс Серьезности;
+        'expected_reduction' - [N, K] ожидаемое снижение Индекса от каждого мероприятия;
+        'actions'            - K мероприятий библиотеки [(тип, мероприятие), ...];
+        'scenarios', 'seed'  - параметры прогона.
+    """
+    if not 0 <= effect_spread <= 1:
+        raise ValueError("effect_spread должен быть в диапазоне [0, 1]")
+    with diagnostics.stage('scenarios', len(segments) * scenarios):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        actions = library_actions()
+        effects = np.array([action['effect_reduction'] for _, action in actions], dtype=np.float64)
+        columns = scenario_columns(segments)
+        n = len(segments)
+        blocks = -(-n // SEGMENT_BLOCK)
+        workers = min(workers, blocks)
+
+        tier_counts = np.zeros((n, len(model.TIER_LABELS)), dtype=np.int64)
+        severity_sum = np.zeros(n)
+        reduction_sum = np.zeros((n, len(actions)))
+        tasks = (
+            (
+                block,
+                *(columns[name][block * SEGMENT_BLOCK:(block + 1) * SEGMENT_BLOCK]
+                  for name in ('cur_load', 'structural', 'class_weight')),
+                effects, scenarios, seed, growth_range, effect_spread,
+            )
+            for block in range(blocks)
+        )
+        results = _block_results(tasks, workers)
+        try:
+            for done, (block, counts, severities, reductions) in enumerate(results, start=1):
+                rows = slice(block * SEGMENT_BLOCK, block * SEGMENT_BLOCK + len(severities))
+                tier_counts[rows] = counts
+                severity_sum[rows] = severities
+                reduction_sum[rows] = reductions
+                if progress is not None:
+                    progress(done, blocks)
+                if is_cancelled is not None and is_cancelled():
+                    return None
+        finally:
+            results.close()
+
+        total = max(scenarios, 1)
+        return {
+            'tier_probability': tier_counts / total,
+            'expected_severity': severity_sum / total,
+            'expected_reduction': reduction_sum / total,
+            'actions': actions,
+            'scenarios': scenarios,
+            'seed': seed,
+        }
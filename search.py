@@ -0,0 +1,246 @@
+import bisect
+import operator
+
+import numpy as np
+
+import diagnostics
+
+# --- Поиск участков по названию (ST_NAME) ---
+# Индекс строится по таблице интернированных имен хранилища (segments.SegmentStore),
+# а не по строкам: у улицы из сотен участков одно имя. Имена нормализуются
+# (casefold, 'ё' -> 'е', схлопывание пробелов), поэтому поиск не зависит от
+# регистра, в том числе для кириллицы.
+#
+#   - префикс имени: двоичный поиск по отсортированному списку имен;
+#   - начало слова и подстрока: списки имен по биграммам (CSR по 65536
+#     биграммам однобайтовой кодировки cp1251) с отметкой "с начала слова";
+#     кандидаты - пересечение списков всех биграмм запроса, они проверяются по
+#     нормализованному имени. Запрос из одного символа ищется только в начале слов.
+#
+# Ранжирование: точное совпадение, префикс имени, начало слова, подстрока;
+# внутри группы - более короткие имена, затем по алфавиту.
+
+# Кодировка для биграмм: кириллица, латиница и цифры - по одному байту на символ
+_BYTE_ENCODING = 'cp1251'
+# Не больше стольких кандидатов проверяется по строке имени за запрос (ограничение задержки)
+MAX_VERIFIED_CANDIDATES = 5000
+# Байты cp1251, соответствующие буквам и цифрам (граница слова - любой другой символ)
+_WORD_BYTES = np.array([bytes([code]).decode(_BYTE_ENCODING, 'replace').isalnum() for code in range(256)])
+
+
+def normalize_name(text):
+    """Нормализованное имя для поиска: без учета регистра и различия е/ё."""
+    return ' '.join(str(text).casefold().replace('ё', 'е').split())
+
+
+def _encode(text):
+    return np.frombuffer(text.encode(_BYTE_ENCODING, 'replace'), dtype=np.uint8)
+
+
+def _bigram_keys(codes):
+    return (codes[:-1].astype(np.uint16) << 8) | codes[1:]
+
+
+def _unique_sorted(values):
+    """Значения отсортированного массива без повторов."""
+    if not len(values):
+        return values
+    return values[np.concatenate(([True], values[1:] != values[:-1]))]
+
+
+def _contains(sorted_values, values):
+    """Маска values, присутствующих в отсортированном массиве sorted_values."""
+    if not len(sorted_values):
+        return np.zeros(len(values), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_values, values), len(sorted_values) - 1)
+    return sorted_values[positions] == values
+
+
+def _matches_word_start(name, query, position):
+    """Есть ли вхождение query (начиная с position) с начала слова: перед ним не буква и не цифра."""
+    while position != -1:
+        if position == 0 or not name[position - 1].isalnum():
+            return True
+        position = name.find(query, position + 1)
+    return False
+
+
+class NameSearchIndex:
+    """Индекс поиска по списку имен; результаты - номера имен в списке."""
+
+    def __init__(self, names):
+        with diagnostics.stage('search_index', len(names)):
+            self.size = len(names)
+            self.normalized = list(map(normalize_name, names))
+            order = sorted(range(self.size), key=self.normalized.__getitem__)
+            self._sorted_names = list(operator.itemgetter(*order)(self.normalized)) if self.size > 1 else list(self.normalized)
+            self._sorted_ids = np.array(order, dtype=np.int64)
+            # Ранг имени для выдачи: сначала короткие, при равной длине - по алфавиту
+            self._rank = np.empty(self.size, dtype=np.int64)
+            self._rank[order] = np.arange(self.size)
+            self._rank += np.fromiter(map(len, self.normalized), dtype=np.int64, count=self.size) << 32
+
+            # Биграммы имен: позиции с начала следующего имени (после '\n') отбрасываются;
+            # биграмма (последний символ, '\n') остается - по ней однобуквенный запрос
+            # находит слово из одного символа в конце имени ('1-я')
+            lengths = self._rank >> 32
+            codes = _encode(''.join(name + '\n' for name in self.normalized))
+            keys = _bigram_keys(codes)
+            owner = np.repeat(np.arange(self.size, dtype=np.int32), lengths + 1)[:len(keys)]
+            # Биграмма с начала слова: перед ней не буква и не цифра (или начало имени)
+            word_start = np.ones(len(keys), dtype=bool)
+            word_start[1:] = ~_WORD_BYTES[codes[:-2]]
+            separators = codes == ord('\n')
+            inside = ~separators[:-1]
+            keys, owner, word_start = keys[inside], owner[inside], word_start[inside]
+            # Устойчивая сортировка 16-битных ключей: внутри биграммы имена идут по возрастанию
+            order = np.argsort(keys, kind='stable')
+            self._postings = owner[order]
+            self._word_start = word_start[order]
+            self._ptr = np.zeros(65537, dtype=np.int64)
+            np.cumsum(np.bincount(keys, minlength=65536), out=self._ptr[1:])
+
+    def _prefix_matches(self, query, alive, limit):
+        """Имена, начинающиеся с query: диапазон отсортированного списка, лучшие limit по рангу."""
+        start = bisect.bisect_left(self._sorted_names, query)
+        end = bisect.bisect_left(self._sorted_names, query + '\U0010ffff', start)
+        ids = self._sorted_ids[start:end]
+        if alive is not None:
+            ids = ids[alive[ids]]
+        ranks = self._rank[ids]
+        if len(ids) > limit:
+            best = np.argpartition(ranks, limit - 1)[:limit]
+            ids, ranks = ids[best], ranks[best]
+        return ids[np.argsort(ranks)].tolist()
+
+    def _contains(self, postings, values):
+        """Маска values, встречающихся в списке имен postings (отсортированном, с повторами)."""
+        if len(values) * 16 < len(postings):
+            return _contains(postings, values)
+        # Длинный список: отметки в таблице по всем именам дешевле двоичного поиска
+        present = np.zeros(self.size, dtype=bool)
+        present[postings] = True
+        return present[values]
+
+    def _word_start_names(self, first, last):
+        """Имена, где биграмма из диапазона ключей [first, last) стоит в начале слова."""
+        lo, hi = self._ptr[first], self._ptr[last]
+        names = self._postings[lo:hi][self._word_start[lo:hi]]
+        # Для диапазона из нескольких биграмм списки имен нужно слить
+        return _unique_sorted(np.sort(names) if last - first > 1 else names)
+
+    def _substring_matches(self, query, exclude, alive, limit):
+        """Имена с query не в начале: сначала совпадения с начала слова, затем остальные."""
+        codes = _encode(query)
+        if len(codes) == 1:
+            # Один символ: только начала слов (все биграммы, начинающиеся с этого символа)
+            first = int(codes[0]) << 8
+            candidates = word_names = self._word_start_names(first, first + 256)
+        else:
+            keys = np.unique(_bigram_keys(codes)).astype(np.int64)
+            keys = keys[np.argsort(self._ptr[keys + 1] - self._ptr[keys])]
+            # Кандидаты - имена, содержащие все биграммы запроса (от самого редкого списка)
+            candidates = _unique_sorted(self._postings[self._ptr[keys[0]]:self._ptr[keys[0] + 1]])
+            for key in keys[1:]:
+                if not len(candidates):
+                    break
+                candidates = candidates[self._contains(self._postings[self._ptr[key]:self._ptr[key + 1]], candidates)]
+            first = (int(codes[0]) << 8) | int(codes[1])
+            word_names = self._word_start_names(first, first + 1)
+        if alive is not None:
+            candidates = candidates[alive[candidates]]
+
+        # Проверка по строке имени идет в порядке ранга (короче, затем по алфавиту) до limit совпадений
+        flagged = self._contains(word_names, candidates)
+        word_start, inner = self._verify(query, candidates[flagged], exclude, limit, word_start=True)
+        if len(word_start) < limit and len(query) > 1:
+            inner += self._verify(query, candidates[~flagged], exclude, limit)[1]
+            inner.sort(key=self._rank.__getitem__)
+        return (word_start + inner)[:limit]
+
+    def _verify(self, query, candidates, exclude, limit, word_start=False):
+        """Кандидаты, действительно содержащие query: (с начала слова, внутри слова) по рангу."""
+        ranks = self._rank[candidates]
+        if len(candidates) > MAX_VERIFIED_CANDIDATES:
+            best = np.argpartition(ranks, MAX_VERIFIED_CANDIDATES - 1)[:MAX_VERIFIED_CANDIDATES]
+            candidates, ranks = candidates[best], ranks[best]
+        candidates = candidates[np.argsort(ranks)]
+        starts, inner = [], []
+        for name_id in candidates.tolist():
+            if name_id in exclude:
+                continue
+            name = self.normalized[name_id]
+            position = name.find(query)
+            if position == -1:
+                continue
+            if word_start and _matches_word_start(name, query, position):
+                starts.append(name_id)
+                if len(starts) >= limit:
+                    break
+            elif len(inner) < limit:
+                inner.append(name_id)
+                if not word_start and len(inner) >= limit:
+                    break
+        return starts, inner
+
+    def search(self, query, limit=50, alive=None):
+        """
+        Номера имен, подходящих под query, по убыванию релевантности (не больше limit).
+        alive - необязательная маска имен; имена с False пропускаются до отбора limit.
+        """
+        query = normalize_name(query)
+        if not query or not self.size or limit <= 0:
+            return []
+        if alive is not None:
+            alive = np.asarray(alive, dtype=bool)
+        matches = self._prefix_matches(query, alive, limit)
+        if len(matches) < limit:
+            matches += self._substring_matches(query, set(matches), alive, limit - len(matches))
+        return matches
+
+
+class SegmentSearch:
+    """
+    Поиск строк хранилища участков по названию. Индекс имен перестраивается,
+    только когда в таблице имен появились новые имена; соответствие имя -> строки
+    обновляется после изменения строк (invalidate).
+    """
+
+    def __init__(self, segments):
+        self.segments = segments
+        self._names_index = None
+        self._rows_ptr = None
+        self._rows = None
+        self._alive = None
+
+    def invalidate(self):
+        """Строки хранилища изменились: соответствие имя -> строки строится заново."""
+        self._rows_ptr = None
+        self._rows = None
+        self._alive = None
+
+    def prepare(self):
+        """Построение индекса заранее (иначе он строится при первом запросе)."""
+        names = self.segments.names
+        if self._names_index is None or self._names_index.size != len(names):
+            self._names_index = NameSearchIndex(names)
+        if self._rows is None or len(self._rows_ptr) != len(names) + 1:
+            codes = self.segments.name
+            self._rows = np.argsort(codes, kind='stable')
+            self._rows_ptr = np.zeros(len(names) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(codes, minlength=len(names)), out=self._rows_ptr[1:])
+            # Имена без строк (остались в таблице после замены участков)
+            self._alive = self._rows_ptr[1:] > self._rows_ptr[:-1]
+
+    def search(self, query, limit=50):
+        """Номера строк участков, подходящих под query (по релевантности имени, затем по порядку строк)."""
+        with diagnostics.stage('search_query') as st:
+            self.prepare()
+            rows = []
+            # Имена без строк отсекаются индексом до отбора limit
+            for name_id in self._names_index.search(query, limit, self._alive):
+                rows.extend(self._rows[self._rows_ptr[name_id]:self._rows_ptr[name_id + 1]][:limit - len(rows)].tolist())
+                if len(rows) >= limit:
+                    break
+            st.items = len(rows)
+        return rows
@@ -0,0 +1,455 @@
+from collections.abc import Mapping
+
+import numpy as np
+
+from model import (
+    ROAD_CLASSES, TIER_LABELS, UNKNOWN_CLASS_CODE, WEATHER_CONDITIONS, get_action_index, lanes_batch, road_class_code,
+    weather_code,
+)
+
+# --- Колоночное хранилище участков ---
+# Вместо словаря на участок поля хранятся в типизированных массивах NumPy:
+# нагрузки и ширина - float64, класс дороги, погода и флаги - однобайтовые коды,
+# имена улиц - коды в общей таблице интернированных строк. Участок занимает
+# около 60 байт против нескольких сотен у dict. Пакетные операции (симуляция,
+# скоринг, отчеты) работают с колонками напрямую; для GUI и get_recommendation
+# store[i] возвращает представление строки с интерфейсом dict (get, []).
+#
+# Геометрия участков (вершины линии, долгота/широта) хранится в общем массиве
+# координат: строка ссылается на диапазон вершин (vertex_start, vertex_count).
+# Части MultiLineString разделяются вершиной (nan, nan).
+
+# Тип исходного значения Width: восстанавливается без изменений (None/int/float)
+WIDTH_NONE, WIDTH_INT, WIDTH_FLOAT = 0, 1, 2
+
+# Подписи кодов класса дороги (последний - неизвестный класс)
+CLASS_LABELS = ROAD_CLASSES + ('Н/Д',)
+_FLAGS = ('0', '1')
+
+COLUMNS = {
+    'name': np.int32,
+    'width': np.float64,
+    'width_kind': np.int8,
+    'cur_load': np.float64,
+    'pred_load': np.float64,
+    'lanes': np.int32,
+    'control': np.bool_,
+    'crossroad': np.bool_,
+    'weather': np.int8,
+    'road_class': np.int8,
+    'severity': np.float64,
+    'tier': np.int8,
+    'vertex_start': np.int64,
+    'vertex_count': np.int32,
+}
+
+# Минимальная емкость при росте хранилища
+_MIN_CAPACITY = 1024
+
+# Разделитель частей MultiLineString в массиве координат
+PART_BREAK = (np.nan, np.nan)
+
+
+def ragged_index(starts, counts):
+    """Индексы элементов диапазонов [start, start + count) подряд одним массивом."""
+    counts = np.asarray(counts, dtype=np.int64)
+    total = int(counts.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.cumsum(counts) - counts
+    return np.repeat(np.asarray(starts, dtype=np.int64) - offsets, counts) + np.arange(total, dtype=np.int64)
+
+
+def _width_value(width, kind):
+    if kind == WIDTH_NONE:
+        return None
+    return int(width) if kind == WIDTH_INT else float(width)
+
+
+# Поля записи участка (как в dict загрузчика) -> значение i-й строки хранилища
+_ROW_FIELDS = {
+    'ST_NAME': lambda s, i: s.names[s._arrays['name'][i]],
+    'RoadClass': lambda s, i: CLASS_LABELS[s._arrays['road_class'][i]],
+    'CurLoad': lambda s, i: float(s._arrays['cur_load'][i]),
+    'PredictiveLoad': lambda s, i: float(s._arrays['pred_load'][i]),
+    'Width': lambda s, i: _width_value(s._arrays['width'][i], s._arrays['width_kind'][i]),
+    'Lanes': lambda s, i: int(s._arrays['lanes'][i]),
+    'CrossRoad': lambda s, i: _FLAGS[int(s._arrays['crossroad'][i])],
+    'Control': lambda s, i: _FLAGS[int(s._arrays['control'][i])],
+    'WeatherImpact': lambda s, i: WEATHER_CONDITIONS[s._arrays['weather'][i]],
+    'Severity': lambda s, i: float(s._arrays['severity'][i]),
+    'Tier': lambda s, i: int(s._arrays['tier'][i]),
+}
+FIELDS = tuple(_ROW_FIELDS)
+
+
+class SegmentRow(Mapping):
+    """Представление одной строки хранилища с интерфейсом dict (только чтение)."""
+    __slots__ = ('_store', '_index')
+
+    def __init__(self, store, index):
+        self._store = store
+        self._index = index
+
+    def __getitem__(self, key):
+        getter = _ROW_FIELDS.get(key)
+        if getter is None:
+            raise KeyError(key)
+        return getter(self._store, self._index)
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __repr__(self):
+        return f"SegmentRow({dict(self)!r})"
+
+
+class SegmentStore:
+    """
+    Колоночное хранилище участков. Колонки (см. COLUMNS) доступны как атрибуты
+    (store.cur_load и т.д.) - это представления массивов длиной len(store),
+    запись в них меняет хранилище. Строки добавляются порциями (extend) и
+    заменяются диапазонами (replace) без перестроения всего хранилища.
+    """
+
+    def __init__(self, capacity=0, name_table=None):
+        self._size = 0
+        self._arrays = {column: np.empty(capacity, dtype=dtype) for column, dtype in COLUMNS.items()}
+        # Координаты вершин: занято _vertex_size строк, из них _live_vertices
+        # принадлежат текущим строкам (остальные - от замененных строк)
+        self._coords = np.empty((0, 2), dtype=np.float64)
+        self._vertex_size = 0
+        self._live_vertices = 0
+        # Таблица имен улиц: код -> имя и имя -> код. Срезы и копии разделяют
+        # таблицу с исходным хранилищем
+        if name_table is None:
+            name_table = ([], {})
+        self.names, self._name_codes = name_table
+
+    # --- Построение ---
+
+    @classmethod
+    def from_records(cls, records):
+        """Хранилище из записей участков (dict); отсутствующие поля - значения по умолчанию."""
+        store = cls()
+        names, widths, width_kinds, cur_load, pred_load = [], [], [], [], []
+        control, crossroad, weather, road_class, severity, tier = [], [], [], [], [], []
+        coords, vertex_start, vertex_count = [], [], []
+        for item in records:
+            names.append(store.intern(item['ST_NAME']))
+            vertices = item.get('Geometry') or ()
+            vertex_start.append(len(coords))
+            vertex_count.append(len(vertices))
+            coords.extend(vertices)
+            width = item.get('Width')
+            if width is None:
+                widths.append(np.nan)
+                width_kinds.append(WIDTH_NONE)
+            else:
+                widths.append(width)
+                width_kinds.append(WIDTH_INT if isinstance(width, int) else WIDTH_FLOAT)
+            cur_load.append(item['CurLoad'])
+            pred_load.append(item.get('PredictiveLoad', item['CurLoad']))
+            control.append(item.get('Control') == '1')
+            crossroad.append(item.get('CrossRoad') == '1')
+            weather.append(weather_code(item.get('WeatherImpact', 'Normal')))
+            road_class.append(road_class_code(item.get('RoadClass', 'Н/Д')))
+            severity.append(item.get('Severity', 0.0))
+            tier.append(item.get('Tier', len(TIER_LABELS)))
+        width = np.array(widths, dtype=np.float64)
+        store._set_columns(
+            name=names, width=width, width_kind=width_kinds, cur_load=cur_load, pred_load=pred_load,
+            lanes=lanes_batch(width), control=control, crossroad=crossroad, weather=weather,
+            road_class=road_class, severity=severity, tier=tier,
+            vertex_start=vertex_start, vertex_count=vertex_count,
+        )
+        store._set_coords(np.array(coords, dtype=np.float64).reshape(-1, 2))
+        return store
+
+    @classmethod
+    def from_arrays(cls, names, name, cur_load, coords=None, **columns):
+        """
+        Хранилище из готовых колонок (например, из дискового кэша): names - таблица
+        имен, name - коды строк, coords - координаты вершин, на которые ссылаются
+        vertex_start/vertex_count. Отсутствующие колонки заполняются по умолчанию.
+        Колонки нужного типа принимаются без копирования (в том числе memory-map
+        только для чтения); такая колонка копируется при первом изменении строк.
+        """
+        store = cls()
+        for value in names:
+            store.intern(value)
+        n = len(name)
+        width = columns.get('width', np.full(n, np.nan))
+        defaults = {
+            'width': width,
+            'width_kind': np.where(np.isnan(width), WIDTH_NONE, WIDTH_FLOAT),
+            # Заполняется симуляцией на месте - своя копия, а не ссылка на cur_load
+            'pred_load': np.array(cur_load, dtype=np.float64),
+            'lanes': lanes_batch(width),
+            'control': np.zeros(n, dtype=bool),
+            'crossroad': np.zeros(n, dtype=bool),
+            'weather': np.zeros(n, dtype=np.int8),
+            'road_class': np.full(n, UNKNOWN_CLASS_CODE, dtype=np.int8),
+            'severity': np.zeros(n),
+            'tier': np.full(n, len(TIER_LABELS), dtype=np.int8),
+            'vertex_start': np.zeros(n, dtype=np.int64),
+            'vertex_count': np.zeros(n, dtype=np.int32),
+        }
+        defaults.update(columns)
+        store._set_columns(copy=False, name=name, cur_load=cur_load, **defaults)
+        store._set_coords(np.empty((0, 2)) if coords is None else coords, copy=False)
+        return store
+
+    def _set_columns(self, copy=True, **columns):
+        convert = np.array if copy else np.asarray
+        self._arrays = {column: convert(columns[column], dtype=dtype) for column, dtype in COLUMNS.items()}
+        sizes = {len(values) for values in self._arrays.values()}
+        if len(sizes) != 1:
+            raise ValueError("колонки хранилища разной длины")
+        self._size = sizes.pop()
+
+    def _set_coords(self, coords, copy=True):
+        self._coords = (np.array if copy else np.asarray)(coords, dtype=np.float64).reshape(-1, 2)
+        self._vertex_size = len(self._coords)
+        self._live_vertices = int(self.vertex_count.sum())
+        if len(self.vertex_count) and (self.vertex_start + self.vertex_count).max() > self._vertex_size:
+            raise ValueError("диапазон вершин вне массива координат")
+
+    def intern(self, name):
+        """Код имени улицы в таблице хранилища (новое имя добавляется в таблицу)."""
+        name = str(name)
+        code = self._name_codes.get(name)
+        if code is None:
+            code = self._name_codes[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+    # --- Доступ к строкам и колонкам ---
+
+    def __len__(self):
+        return self._size
+
+    def __getattr__(self, name):
+        if not name.startswith('_') and name in COLUMNS:
+            return self._arrays[name][:self._size]
+        raise AttributeError(name)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._size)
+            if step != 1:
+                raise ValueError("срезы хранилища поддерживаются только с шагом 1")
+            part = SegmentStore(name_table=(self.names, self._name_codes))
+            part._size = max(0, stop - start)
+            part._arrays = {column: values[start:max(start, stop)].copy() for column, values in self._arrays.items()}
+            # Вершины среза копируются подряд, ссылки строк пересчитываются
+            counts = part._arrays['vertex_count']
+            part._coords = self._coords[ragged_index(part._arrays['vertex_start'], counts)]
+            part._arrays['vertex_start'] = np.cumsum(counts, dtype=np.int64) - counts
+            part._vertex_size = part._live_vertices = len(part._coords)
+            return part
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("индекс участка вне диапазона")
+        return SegmentRow(self, index)
+
+    def __iter__(self):
+        for index in range(self._size):
+            yield SegmentRow(self, index)
+
+    def __getstate__(self):
+        # В процесс-получатель передаются только заполненные строки и их вершины
+        source = self if self._vertex_size == self._live_vertices else self[:]
+        return {
+            'names': source.names,
+            'arrays': {column: values[:source._size] for column, values in source._arrays.items()},
+            'coords': source.coords,
+        }
+
+    def __setstate__(self, state):
+        self.names = state['names']
+        self._name_codes = {name: code for code, name in enumerate(self.names)}
+        self._arrays = state['arrays']
+        self._size = len(self._arrays['name'])
+        self._set_coords(state['coords'])
+
+    @property
+    def coords(self):
+        """Занятая часть массива координат вершин (N, 2): долгота, широта."""
+        return self._coords[:self._vertex_size]
+
+    def vertices(self, index):
+        """Вершины линии участка (K, 2); части MultiLineString разделены (nan, nan)."""
+        start = self._arrays['vertex_start'][index]
+        return self._coords[start:start + self._arrays['vertex_count'][index]]
+
+    def copy(self):
+        """Снимок хранилища: колонки копируются, таблица имен общая (только растет)."""
+        return self[:]
+
+    def field_values(self, field):
+        """Значения поля записи участка (ST_NAME, Width, ...) всех строк списком Python."""
+        a = {column: values[:self._size] for column, values in self._arrays.items()}
+        if field == 'ST_NAME':
+            names = self.names
+            return [names[code] for code in a['name'].tolist()]
+        if field == 'RoadClass':
+            return [CLASS_LABELS[code] for code in a['road_class'].tolist()]
+        if field == 'WeatherImpact':
+            return [WEATHER_CONDITIONS[code] for code in a['weather'].tolist()]
+        if field in ('Control', 'CrossRoad'):
+            return [_FLAGS[flag] for flag in a[field.lower()].tolist()]
+        if field == 'Width':
+            return [
+                None if kind == WIDTH_NONE else int(width) if kind == WIDTH_INT else width
+                for width, kind in zip(a['width'].tolist(), a['width_kind'].tolist())
+            ]
+        column = {
+            'CurLoad': 'cur_load', 'PredictiveLoad': 'pred_load', 'Lanes': 'lanes',
+            'Severity': 'severity', 'Tier': 'tier',
+        }.get(field)
+        if column is None:
+            raise KeyError(field)
+        return a[column].tolist()
+
+    def score_columns(self):
+        """Колонки для model.score_batch (представления без копирования)."""
+        return {
+            'cur_load': self.cur_load,
+            'pred_load': self.pred_load,
+            'width': self.width,
+            'control': self.control,
+            'crossroad': self.crossroad,
+            'weather': self.weather,
+            'road_class': self.road_class,
+        }
+
+    def nbytes(self):
+        """Память заполненных строк колонок и их вершин (без таблицы имен), байт."""
+        return sum(values[:self._size].nbytes for values in self._arrays.values()) + self.coords.nbytes
+
+    # --- Изменение ---
+
+    def _make_writable(self):
+        """Копирует колонки, принятые только для чтения (memory-map кэша), перед изменением на месте."""
+        for column, values in self._arrays.items():
+            if not values.flags.writeable:
+                self._arrays[column] = values.copy()
+        if not self._coords.flags.writeable:
+            self._coords = self._coords.copy()
+
+    def _reserve(self, extra):
+        need = self._size + extra
+        capacity = len(self._arrays['name'])
+        if need <= capacity:
+            return
+        capacity = max(need, capacity * 2, _MIN_CAPACITY)
+        for column, values in self._arrays.items():
+            grown = np.empty(capacity, dtype=values.dtype)
+            grown[:self._size] = values[:self._size]
+            self._arrays[column] = grown
+
+    def _reserve_vertices(self, extra):
+        need = self._vertex_size + extra
+        if need <= len(self._coords):
+            return
+        grown = np.empty((max(need, len(self._coords) * 2, _MIN_CAPACITY), 2), dtype=np.float64)
+        grown[:self._vertex_size] = self._coords[:self._vertex_size]
+        self._coords = grown
+
+    def _compact_vertices(self):
+        """Удаляет вершины замененных строк, когда они занимают больше половины массива."""
+        if self._vertex_size - self._live_vertices <= max(self._live_vertices, _MIN_CAPACITY):
+            return
+        starts = self._arrays['vertex_start'][:self._size]
+        counts = self._arrays['vertex_count'][:self._size]
+        self._coords = self._coords[ragged_index(starts, counts)]
+        starts[:] = np.cumsum(counts, dtype=np.int64) - counts
+        self._vertex_size = len(self._coords)
+
+    def _name_codes_of(self, other):
+        """Коды имен строк other в таблице этого хранилища."""
+        codes = other.name
+        if other.names is self.names or not len(codes):
+            return codes
+        # Интернируются только имена, встречающиеся в other (срез может делить большую таблицу)
+        used, inverse = np.unique(codes, return_inverse=True)
+        mapping = np.array([self.intern(other.names[code]) for code in used.tolist()], dtype=np.int32)
+        return mapping[inverse]
+
+    def extend(self, other):
+        """Добавляет строки хранилища other в конец."""
+        self.replace(self._size, 0, other)
+
+    def replace(self, start, count, other):
+        """
+        Замена строк [start, start + count) строками other. При разном числе строк
+        хвост хранилища сдвигается в памяти (без перестроения колонок).
+        """
+        if not 0 <= start <= start + count <= self._size:
+            raise IndexError("диапазон замены вне хранилища")
+        size = len(other)
+        delta = size - count
+        names = self._name_codes_of(other)
+        self._make_writable()
+
+        # Вершины новых строк дописываются в конец массива координат
+        other_counts = other._arrays['vertex_count'][:size]
+        other_vertices = other._coords[ragged_index(other._arrays['vertex_start'][:size], other_counts)]
+        self._reserve_vertices(len(other_vertices))
+        vertex_base = self._vertex_size
+        self._coords[vertex_base:vertex_base + len(other_vertices)] = other_vertices
+        self._vertex_size += len(other_vertices)
+        self._live_vertices += len(other_vertices) - int(self._arrays['vertex_count'][start:start + count].sum())
+        starts = vertex_base + np.cumsum(other_counts, dtype=np.int64) - other_counts
+
+        self._reserve(max(delta, 0))
+        end = self._size
+        for column, values in self._arrays.items():
+            if delta:
+                # NumPy корректно копирует перекрывающиеся диапазоны
+                values[start + size:end + delta] = values[start + count:end]
+            if column == 'name':
+                values[start:start + size] = names
+            elif column == 'vertex_start':
+                values[start:start + size] = starts
+            else:
+                values[start:start + size] = other._arrays[column][:size]
+        self._size += delta
+        self._compact_vertices()
+
+
+# --- Сводка по ТИРам и классам дорог ---
+
+class TierSummary:
+    """
+    Число участков по ТИРам и классам дорог, обновляемое инкрементально: при
+    изменении строк хранилища вычитаются старые и добавляются новые строки
+    (bincount только по измененным строкам). Рекомендованное мероприятие
+    определяется ТИРом и классом дороги, поэтому стоимость группы - число
+    участков на стоимость мероприятия из индекса model.get_action_index.
+    """
+
+    def __init__(self):
+        self.counts = np.zeros((len(TIER_LABELS), len(CLASS_LABELS)), dtype=np.int64)
+
+    def add(self, tier, road_class, sign=1):
+        """Учесть строки с колонками tier (1-4) и road_class (коды); sign=-1 - исключить."""
+        cells = (np.asarray(tier, dtype=np.int64) - 1) * len(CLASS_LABELS) + np.asarray(road_class, dtype=np.int64)
+        self.counts += sign * np.bincount(cells, minlength=self.counts.size).reshape(self.counts.shape)
+
+    def remove(self, tier, road_class):
+        self.add(tier, road_class, -1)
+
+    def costs(self):
+        """Стоимость рекомендованных мероприятий [ТИР, класс дороги], руб."""
+        actions, table = get_action_index()
+        action_costs = np.array([action['cost'] for action in actions], dtype=np.float64)
+        return self.counts * action_costs[table[1:len(TIER_LABELS) + 1, :len(CLASS_LABELS)]]
+
+    def total(self):
+        return int(self.counts.sum())
@@ -0,0 +1,456 @@
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import diagnostics
+from cache import SegmentCache, cache_dir_for
+from loader import find_geojson_files, load_files, simulate_segments, simulation_key, score_segments, SIMULATION_SEED
+from model import MODEL_VERSION, TIER_LABELS, get_recommendation, score_batch, score_segment, segment_columns
+from segments import CLASS_LABELS, SegmentStore
+
+# --- Локальный сервис анализа (HTTP на asyncio) ---
+# Хранилище участков загружается один раз, запросы нескольких планировщиков
+# обслуживает один процесс (HTTP/1.1 с keep-alive, только стандартная библиотека):
+#
+#   GET  /health                         - число участков, отпечаток набора данных и версия модели
+#   GET  /segments/<row>/score           - Индекс Серьезности, ТИР и мероприятие участка (JSON)
+#   GET  /segments/<row>/recommendation  - рекомендация get_recommendation (HTML)
+#   GET  /histogram                      - число участков по ТИРам и классам дорог
+#   POST /score/batch                    - пакетный скоринг: {"rows": [...]} - строки хранилища,
+#                                          {"segments": [{...}, ...]} - произвольные участки
+#
+# Параметры запросов участка: dataset - отпечаток набора данных клиента (dataset_hash:
+# имена участков по строкам, сид симуляции и колонки скоринга; 409, если у сервиса
+# другой набор), name - ожидаемое ST_NAME (409, если данные сервиса другие),
+# spillover - добавка SpilloverLoad (network.py). Пакет {"rows": [...]} принимает
+# поле dataset с тем же смыслом. Отпечаток сервиса - в ответе /health. Ответы по участкам
+# хранятся в LRU-кэше по ключу (вид ответа, строка, версия модели). Пакеты от
+# POOL_MIN_BATCH участков считаются в пуле процессов, меньшие - в потоке.
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+RESPONSE_CACHE_SIZE = 100_000
+POOL_MIN_BATCH = 5000
+MAX_BODY_BYTES = 64 * 1024 * 1024
+CLIENT_TIMEOUT = 30
+
+_REASONS = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    409: 'Conflict', 413: 'Payload Too Large', 500: 'Internal Server Error',
+}
+_JSON = 'application/json; charset=utf-8'
+_HTML = 'text/html; charset=utf-8'
+
+
+class HTTPError(Exception):
+    """Ошибка запроса: код ответа и текст для поля error."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ServiceError(Exception):
+    """Ошибка обращения к сервису анализа на стороне клиента."""
+
+
+def _json_body(value):
+    return json.dumps(value, ensure_ascii=False).encode('utf-8')
+
+
+# --- Пакетный скоринг (в пуле процессов или в потоке) ---
+
+_worker_columns = None
+
+
+def _init_worker(columns):
+    global _worker_columns
+    _worker_columns = columns
+
+
+def _batch_body(scores, **extra):
+    names = [action['name'] for action in scores['actions']]
+    return _json_body(dict(
+        extra,
+        severity=scores['severity'].tolist(),
+        tier=scores['tier'].tolist(),
+        action=[names[index] for index in scores['action'].tolist()],
+        cost=scores['cost'].tolist(),
+        model_version=MODEL_VERSION,
+    ))
+
+
+def _score_rows(columns, rows):
+    """Скоринг строк хранилища по колонкам score_columns; ответ - JSON по колонкам."""
+    scores = score_batch(**{name: values[rows] for name, values in columns.items()})
+    return _batch_body(scores, rows=rows.tolist())
+
+
+def _pool_score_rows(rows):
+    return _score_rows(_worker_columns, rows)
+
+
+def _score_records(records):
+    """Скоринг произвольных участков (dict с полями ST_NAME, CurLoad, ...)."""
+    return _batch_body(score_batch(**segment_columns(records)))
+
+
+def dataset_hash(segments, seed=SIMULATION_SEED):
+    """
+    Отпечаток набора данных для адресации участков по номеру строки: имена участков
+    по строкам, сид симуляции и колонки скоринга. Совпадает у клиента и сервиса,
+    только если строки с одним номером - один и тот же участок с теми же полями.
+    """
+    digest = hashlib.sha1(f"{seed}\n{len(segments)}\n".encode('utf-8'))
+    digest.update('\n'.join(segments.field_values('ST_NAME')).encode('utf-8'))
+    for name, values in sorted(segments.score_columns().items()):
+        digest.update(name.encode('utf-8'))
+        digest.update(np.ascontiguousarray(values).tobytes())
+    return digest.hexdigest()[:16]
+
+
+class ResponseCache:
+    """LRU-кэш готовых тел ответов."""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class AnalysisService:
+    """
+    Сервис анализа над загруженным хранилищем участков (segments.SegmentStore).
+    workers - процессов пула для пакетов (0/1 - пакеты считаются в потоке),
+    seed - сид симуляции, с которым загружены данные (входит в отпечаток dataset).
+    """
+
+    def __init__(self, segments, workers=None, cache_size=RESPONSE_CACHE_SIZE, seed=SIMULATION_SEED):
+        self.segments = segments
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.dataset = dataset_hash(segments, seed)
+        self.cache = ResponseCache(cache_size)
+        self.requests = 0
+        self._columns = segments.score_columns()
+        self._pool = None
+        self._histogram = None
+
+    # --- Ответы ---
+
+    def health(self):
+        return {
+            'segments': len(self.segments),
+            'dataset': self.dataset,
+            'model_version': MODEL_VERSION,
+            'requests': self.requests,
+            'cache_entries': len(self.cache),
+            'cache_hits': self.cache.hits,
+            'cache_misses': self.cache.misses,
+        }
+
+    def histogram(self):
+        """Число участков по ТИРам и по классам дорог (считается один раз)."""
+        if self._histogram is None:
+            tiers = len(TIER_LABELS)
+            counts = np.bincount(
+                self.segments.road_class.astype(np.int64) * tiers + self.segments.tier - 1,
+                minlength=len(CLASS_LABELS) * tiers,
+            ).reshape(len(CLASS_LABELS), tiers)
+            self._histogram = _json_body({
+                'tiers': dict(zip(TIER_LABELS, counts.sum(axis=0).tolist())),
+                'classes': {label: row for label, row in zip(CLASS_LABELS, counts.tolist())},
+                'model_version': MODEL_VERSION,
+            })
+        return self._histogram
+
+    def _check_dataset(self, dataset):
+        """Номера строк клиента относятся к другому набору данных - 409."""
+        if dataset is not None and dataset != self.dataset:
+            raise HTTPError(409, f"Набор данных клиента ({dataset}) не совпадает с данными сервиса ({self.dataset})")
+
+    def segment_response(self, kind, row_text, query):
+        """Ответ по одному участку: kind - 'score' (JSON) или 'recommendation' (HTML)."""
+        try:
+            row = int(row_text)
+        except ValueError:
+            raise HTTPError(400, f"Некорректный номер участка: {row_text}")
+        self._check_dataset(query.get('dataset'))
+        if not 0 <= row < len(self.segments):
+            raise HTTPError(404, f"Участок {row} не найден (всего участков: {len(self.segments)})")
+        record = self.segments[row]
+        name = query.get('name')
+        if name is not None and name != record['ST_NAME']:
+            raise HTTPError(409, f"Участок {row} в данных сервиса - '{record['ST_NAME']}', а не '{name}'")
+        spillover = query.get('spillover')
+        if spillover is not None:
+            try:
+                spillover = float(spillover)
+            except ValueError:
+                raise HTTPError(400, f"Некорректное значение spillover: {spillover}")
+        # Ответ с добавкой от соседей зависит не только от строки - он не кэшируется
+        key = (kind, row, MODEL_VERSION) if not spillover else None
+        body = self.cache.get(key) if key is not None else None
+        if body is None:
+            data = dict(record, SpilloverLoad=spillover) if spillover else record
+            if kind == 'score':
+                score = score_segment(data)
+                body = _json_body(dict(score, row=row, ST_NAME=record['ST_NAME'], model_version=MODEL_VERSION))
+            else:
+                body = get_recommendation(data).encode('utf-8')
+            if key is not None:
+                self.cache.put(key, body)
+        return _JSON if kind == 'score' else _HTML, body
+
+    async def score_batch(self, body):
+        """Пакетный скоринг; большие пакеты - в пуле процессов, не блокируя цикл событий."""
+        try:
+            request = json.loads(body)
+        except ValueError as e:
+            raise HTTPError(400, f"Некорректный JSON: {e}")
+        if not isinstance(request, dict) or ('rows' in request) == ('segments' in request):
+            raise HTTPError(400, "Ожидается объект с полем rows или segments")
+        loop = asyncio.get_running_loop()
+        if 'rows' in request:
+            self._check_dataset(request.get('dataset'))
+            rows = np.asarray(request['rows'] or [], dtype=object)
+            if rows.ndim != 1 or not all(type(row) is int for row in rows.tolist()):
+                raise HTTPError(400, "rows - список номеров участков")
+            rows = rows.astype(np.int64)
+            outside = (rows < 0) | (rows >= len(self.segments))
+            if outside.any():
+                raise HTTPError(404, f"Участок {int(rows[outside][0])} не найден (всего участков: {len(self.segments)})")
+            if len(rows) >= POOL_MIN_BATCH and self.workers > 1:
+                return await loop.run_in_executor(self._get_pool(), _pool_score_rows, rows)
+            return await loop.run_in_executor(None, _score_rows, self._columns, rows)
+
+        records = request['segments']
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            raise HTTPError(400, "segments - список участков (объектов с полями ST_NAME, CurLoad, ...)")
+        executor = self._get_pool() if len(records) >= POOL_MIN_BATCH and self.workers > 1 else None
+        try:
+            return await loop.run_in_executor(executor, _score_records, records)
+        except (TypeError, ValueError) as e:
+            raise HTTPError(400, f"Некорректные поля участков: {e}")
+
+    def _get_pool(self):
+        if self._pool is None:
+            # spawn: колонки участков передаются процессам пула один раз, через initializer
+            context = multiprocessing.get_context('spawn')
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=context,
+                initializer=_init_worker, initargs=(self._columns,),
+            )
+        return self._pool
+
+    # --- HTTP ---
+
+    async def dispatch(self, method, target, body):
+        """Маршрутизация запроса; возвращает (код ответа, Content-Type, тело)."""
+        url = urllib.parse.urlsplit(target)
+        parts = [part for part in url.path.split('/') if part]
+        query = dict(urllib.parse.parse_qsl(url.query))
+        try:
+            if parts == ['score', 'batch']:
+                if method != 'POST':
+                    raise HTTPError(405, "Метод не поддерживается: используйте POST")
+                with diagnostics.stage('service_batch'):
+                    payload = await self.score_batch(body)
+                return 200, _JSON, payload
+            if method != 'GET':
+                raise HTTPError(405, "Метод не поддерживается: используйте GET")
+            if parts == ['health']:
+                return 200, _JSON, _json_body(self.health())
+            if parts == ['histogram']:
+                return 200, _JSON, self.histogram()
+            if len(parts) == 3 and parts[0] == 'segments' and parts[2] in ('score', 'recommendation'):
+                content_type, payload = self.segment_response(parts[2], parts[1], query)
+                return 200, content_type, payload
+            raise HTTPError(404, f"Неизвестный адрес: {url.path}")
+        except HTTPError as e:
+            return e.status, _JSON, _json_body({'error': str(e)})
+        except Exception as e:
+            return 500, _JSON, _json_body({'error': f"{type(e).__name__}: {e}"})
+
+    async def handle_connection(self, reader, writer):
+        """Запросы одного соединения по очереди (keep-alive, пока клиент не закроет)."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                parts = request_line.decode('latin-1').split()
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                if len(parts) != 3 or length < 0:
+                    await self._respond(writer, 400, _JSON, _json_body({'error': "Некорректный запрос"}), False)
+                    break
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, _JSON, _json_body({'error': "Слишком большой запрос"}), False)
+                    break
+                method, target, version = parts
+                body = await reader.readexactly(length) if length else b''
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection == 'keep-alive' or (version == 'HTTP/1.1' and connection != 'close')
+
+                self.requests += 1
+                status, content_type, payload = await self.dispatch(method, target, body)
+                await self._respond(writer, status, content_type, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, content_type, payload, keep_alive):
+        head = (
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode('latin-1') + payload)
+        await writer.drain()
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """Запуск сервера в текущем цикле событий (asyncio.Server)."""
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def load_dataset(data_dir, load_workers=0, use_cache=True, seed=SIMULATION_SEED, history=None, log=sys.stderr):
+    """Загрузка, симуляция и скоринг всех .geojson каталога в одно хранилище (как в пакетном режиме)."""
+    segments = SegmentStore()
+    cache = SegmentCache(cache_dir_for(data_dir)) if use_cache else None
+    for filepath, file_segments, error in load_files(find_geojson_files(data_dir), load_workers, cache):
+        if error:
+            print(error, file=log)
+            continue
+        simulate_segments(file_segments, seed, simulation_key(filepath, data_dir), history)
+        score_segments(file_segments)
+        segments.extend(file_segments)
+    return segments
+
+
+def run_service(data_dir, host=DEFAULT_HOST, port=DEFAULT_PORT, workers=0, use_cache=True,
+                seed=SIMULATION_SEED, history=None, log=sys.stderr):
+    """
+    Загрузка данных и работа сервиса до прерывания (Ctrl+C); возвращает код завершения процесса.
+    workers - процессов для загрузки файлов и для пакетного скоринга (0 - последовательно).
+    """
+    segments = load_dataset(data_dir, workers, use_cache, seed, history, log)
+    if not len(segments):
+        print("Ошибка: Файлы .geojson не найдены или не содержат корректных данных.", file=log)
+        return 1
+    service = AnalysisService(segments, workers=workers, seed=seed)
+
+    async def serve():
+        server = await service.start(host, port)
+        # Фактический порт: при port=0 его выбирает ОС
+        bound_port = server.sockets[0].getsockname()[1]
+        print(f"Сервис анализа: http://{host}:{bound_port} ({len(segments)} участков, набор {service.dataset}, "
+              f"модель v{MODEL_VERSION})", file=log)
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+
+class ServiceClient:
+    """Клиент сервиса анализа (для GUI): синхронные запросы через urllib."""
+
+    def __init__(self, url, timeout=CLIENT_TIMEOUT):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _request(self, path, params=None, payload=None):
+        url = self.url + path
+        params = {key: value for key, value in (params or {}).items() if value is not None}
+        if params:
+            url += '?' + urllib.parse.urlencode(params)
+        data = _json_body(payload) if payload is not None else None
+        request = urllib.request.Request(url, data=data, headers={'Content-Type': _JSON} if data else {})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read())['error']
+            except (ValueError, KeyError, TypeError):
+                message = str(e)
+            raise ServiceError(message)
+        except (urllib.error.URLError, OSError) as e:
+            raise ServiceError(f"Сервис анализа {self.url} недоступен: {getattr(e, 'reason', e)}")
+
+    def health(self):
+        return json.loads(self._request('/health'))
+
+    def histogram(self):
+        return json.loads(self._request('/histogram'))
+
+    def score(self, row, name=None, spillover=None, dataset=None):
+        params = {'dataset': dataset, 'name': name, 'spillover': spillover}
+        return json.loads(self._request(f'/segments/{row}/score', params))
+
+    def recommendation(self, row, name=None, spillover=None, dataset=None):
+        params = {'dataset': dataset, 'name': name, 'spillover': spillover}
+        return self._request(f'/segments/{row}/recommendation', params).decode('utf-8')
+
+    def score_batch(self, rows=None, segments=None, dataset=None):
+        if rows is not None:
+            payload = {'rows': list(rows)}
+            if dataset is not None:
+                payload['dataset'] = dataset
+        else:
+            payload = {'segments': list(segments)}
+        return json.loads(self._request('/score/batch', payload=payload))
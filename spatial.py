@@ -0,0 +1,254 @@
+import math
+import os
+
+import numpy as np
+
+import diagnostics
+from segments import ragged_index
+
+# --- Пространственный индекс участков ---
+# Равномерная сетка над охватывающими прямоугольниками (bbox) линий участков.
+# Координаты (долгота/широта) переводятся в метры локальной равнопромежуточной
+# проекцией с центром в середине сети - на масштабе города искажение мало.
+# Ячейка сетки хранит номера участков, чей bbox ее задевает (формат CSR:
+# cell_ptr - начала ячеек в cell_ids). Участки, задевающие слишком много ячеек,
+# хранятся отдельным списком и проверяются при каждом запросе.
+#
+# Номера участков - строки хранилища (segments.SegmentStore), по которому
+# построен индекс; после изменения хранилища индекс строится заново.
+
+METERS_PER_DEGREE = 6_371_008.8 * math.pi / 180
+# Среднее число участков на ячейку при выборе ее размера
+TARGET_SEGMENTS_PER_CELL = 4
+# Участки, задевающие больше ячеек, не раскладываются по сетке
+MAX_CELLS_PER_SEGMENT = 64
+INDEX_FORMAT_VERSION = 1
+
+
+class SpatialIndex:
+    """
+    Индекс участков хранилища для запросов по прямоугольнику, радиусу и
+    ближайшему участку. Строится методом build, сохраняется методом save.
+    """
+
+    def __init__(self, segments, origin, scale, bbox, grid_origin, cell_size, shape, cell_ptr, cell_ids, large_ids):
+        self.segments = segments
+        self.origin = origin          # (долгота, широта) центра проекции
+        self.scale = scale            # метров на градус (по долготе, по широте)
+        self.bbox = bbox              # (N, 4) bbox участков в метрах, nan - без геометрии
+        self.grid_origin = grid_origin
+        self.cell_size = cell_size
+        self.shape = shape            # (ny, nx)
+        self.cell_ptr = cell_ptr
+        self.cell_ids = cell_ids
+        self.large_ids = large_ids
+        # Границы всей сети (в метрах) - предел радиуса поиска ближайшего участка
+        valid = np.isfinite(bbox).all(axis=1)
+        self.extent = (
+            (bbox[valid, 0].min(), bbox[valid, 1].min(), bbox[valid, 2].max(), bbox[valid, 3].max())
+            if valid.any() else None
+        )
+
+    # --- Построение ---
+
+    @classmethod
+    def build(cls, segments):
+        """Строит индекс по вершинам всех участков хранилища."""
+        with diagnostics.stage('spatial_index', len(segments)):
+            n = len(segments)
+            starts, counts = segments.vertex_start, segments.vertex_count
+            coords = segments.coords[ragged_index(starts, counts)]
+            finite = np.isfinite(coords).all(axis=1)
+            if finite.any():
+                lon0, lat0 = (coords[finite].min(axis=0) + coords[finite].max(axis=0)) / 2
+            else:
+                lon0, lat0 = 0.0, 0.0
+            scale = (METERS_PER_DEGREE * math.cos(math.radians(lat0)), METERS_PER_DEGREE)
+            x = (coords[:, 0] - lon0) * scale[0]
+            y = (coords[:, 1] - lat0) * scale[1]
+
+            # bbox участков: min/max по вершинам каждой строки (nan-разделители пропускаются)
+            bbox = np.full((n, 4), np.nan)
+            has_vertices = counts > 0
+            if has_vertices.any():
+                offsets = (np.cumsum(counts, dtype=np.int64) - counts)[has_vertices]
+                with np.errstate(invalid='ignore'):
+                    bbox[has_vertices, 0] = np.fmin.reduceat(x, offsets)
+                    bbox[has_vertices, 1] = np.fmin.reduceat(y, offsets)
+                    bbox[has_vertices, 2] = np.fmax.reduceat(x, offsets)
+                    bbox[has_vertices, 3] = np.fmax.reduceat(y, offsets)
+
+            valid = np.flatnonzero(np.isfinite(bbox).all(axis=1))
+            if len(valid):
+                extent = bbox[valid]
+                grid_origin = (float(extent[:, 0].min()), float(extent[:, 1].min()))
+                width = float(extent[:, 2].max()) - grid_origin[0]
+                height = float(extent[:, 3].max()) - grid_origin[1]
+                # Ячейка - не меньше типичного участка, в среднем TARGET_SEGMENTS_PER_CELL участков
+                typical = float(np.median(np.maximum(extent[:, 2] - extent[:, 0], extent[:, 3] - extent[:, 1])))
+                cell_size = max(
+                    math.sqrt(max(width, 1.0) * max(height, 1.0) * TARGET_SEGMENTS_PER_CELL / len(valid)),
+                    typical, 1.0,
+                )
+            else:
+                grid_origin, width, height, cell_size = (0.0, 0.0), 0.0, 0.0, 1.0
+            shape = (int(height // cell_size) + 1, int(width // cell_size) + 1)
+            # Вытянутая сеть: число ячеек ограничивается несколькими на участок
+            while shape[0] * shape[1] > TARGET_SEGMENTS_PER_CELL * (len(valid) + 16):
+                cell_size *= 2
+                shape = (int(height // cell_size) + 1, int(width // cell_size) + 1)
+
+            ix0, iy0, ix1, iy1 = _cell_ranges(bbox[valid], grid_origin, cell_size, shape)
+            cells_x = ix1 - ix0 + 1
+            cells = cells_x * (iy1 - iy0 + 1)
+            large = cells > MAX_CELLS_PER_SEGMENT
+            large_ids = valid[large].astype(np.int32)
+
+            small = ~large
+            ids, ix0, iy0, cells_x, cells = valid[small], ix0[small], iy0[small], cells_x[small], cells[small]
+            local = np.arange(int(cells.sum()), dtype=np.int64) - np.repeat(np.cumsum(cells) - cells, cells)
+            cell = (np.repeat(iy0, cells) + local // np.repeat(cells_x, cells)) * shape[1] \
+                + np.repeat(ix0, cells) + local % np.repeat(cells_x, cells)
+            order = np.argsort(cell, kind='stable')
+            cell_ids = np.repeat(ids, cells)[order].astype(np.int32)
+            cell_ptr = np.zeros(shape[0] * shape[1] + 1, dtype=np.int64)
+            np.cumsum(np.bincount(cell, minlength=shape[0] * shape[1]), out=cell_ptr[1:])
+
+        return cls(segments, (float(lon0), float(lat0)), scale, bbox, grid_origin, cell_size, shape,
+                   cell_ptr, cell_ids, large_ids)
+
+    # --- Запросы ---
+
+    def project(self, lon, lat):
+        """Координаты точки в метрах проекции индекса."""
+        return (lon - self.origin[0]) * self.scale[0], (lat - self.origin[1]) * self.scale[1]
+
+    def _candidates(self, x0, y0, x1, y1):
+        """Участки, чей bbox пересекает прямоугольник (в метрах проекции)."""
+        ny, nx = self.shape
+        ix0, iy0, ix1, iy1 = (
+            int(v[0]) for v in _cell_ranges(np.array([[x0, y0, x1, y1]]), self.grid_origin, self.cell_size, self.shape)
+        )
+        if (ix1 - ix0 + 1) * (iy1 - iy0 + 1) * 8 > nx * ny:
+            # Запрос покрывает большую часть сетки - проверяем все bbox
+            ids = np.arange(len(self.bbox))
+        else:
+            rows = [
+                self.cell_ids[self.cell_ptr[iy * nx + ix0]:self.cell_ptr[iy * nx + ix1 + 1]]
+                for iy in range(iy0, iy1 + 1)
+            ]
+            rows.append(self.large_ids)
+            ids = np.unique(np.concatenate(rows)).astype(np.int64)
+        bbox = self.bbox[ids]
+        with np.errstate(invalid='ignore'):
+            hit = (bbox[:, 0] <= x1) & (bbox[:, 2] >= x0) & (bbox[:, 1] <= y1) & (bbox[:, 3] >= y0)
+        return ids[hit]
+
+    def query_bbox(self, min_lon, min_lat, max_lon, max_lat):
+        """Номера участков, чей bbox пересекает прямоугольник (долгота/широта), по возрастанию."""
+        x0, y0 = self.project(min_lon, min_lat)
+        x1, y1 = self.project(max_lon, max_lat)
+        return self._candidates(x0, y0, x1, y1)
+
+    def distances(self, ids, lon, lat):
+        """Расстояния (м) от точки до линий участков ids; inf - участок без геометрии."""
+        ids = np.asarray(ids, dtype=np.int64)
+        result = np.full(len(ids), np.inf)
+        counts = self.segments.vertex_count[ids].astype(np.int64)
+        has_vertices = np.flatnonzero(counts > 0)
+        if not len(has_vertices):
+            return result
+        counts = counts[has_vertices]
+        starts = self.segments.vertex_start[ids[has_vertices]]
+        px, py = self.project(lon, lat)
+
+        # Отрезки линии: пары соседних вершин; у линии из одной вершины - вырожденный отрезок
+        pieces = np.maximum(counts - 1, 1)
+        owner = np.repeat(np.arange(len(counts)), pieces)
+        offsets = np.cumsum(pieces) - pieces
+        step = np.arange(int(pieces.sum()), dtype=np.int64) - offsets[owner]
+        a = starts[owner] + step
+        b = starts[owner] + np.minimum(step + 1, counts[owner] - 1)
+        coords = self.segments.coords
+        ax, ay = self.project(coords[a, 0], coords[a, 1])
+        bx, by = self.project(coords[b, 0], coords[b, 1])
+
+        dx, dy = bx - ax, by - ay
+        length = dx * dx + dy * dy
+        with np.errstate(invalid='ignore', divide='ignore'):
+            t = np.clip(np.where(length > 0, ((px - ax) * dx + (py - ay) * dy) / length, 0.0), 0.0, 1.0)
+            d = np.hypot(ax + t * dx - px, ay + t * dy - py)
+        # Отрезки с разделителем частей (nan) пропускаются
+        result[has_vertices] = np.fmin.reduceat(d, offsets)
+        return np.where(np.isnan(result), np.inf, result)
+
+    def query_radius(self, lon, lat, radius):
+        """Участки не дальше radius метров от точки: (номера, расстояния), по возрастанию расстояния."""
+        x, y = self.project(lon, lat)
+        ids = self._candidates(x - radius, y - radius, x + radius, y + radius)
+        d = self.distances(ids, lon, lat)
+        inside = d <= radius
+        ids, d = ids[inside], d[inside]
+        order = np.argsort(d, kind='stable')
+        return ids[order], d[order]
+
+    def nearest(self, lon, lat, k=1, max_distance=None):
+        """
+        k ближайших к точке участков: (номера, расстояния в метрах) по возрастанию
+        расстояния. Радиус поиска удваивается, начиная с размера ячейки, пока не
+        найдено k участков (или не превышен max_distance).
+        """
+        if self.extent is None:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        x, y = self.project(lon, lat)
+        min_x, min_y, max_x, max_y = self.extent
+        # Радиус, при котором в круг гарантированно попадает вся сеть
+        limit = max(math.hypot(max(abs(x - min_x), abs(x - max_x)), max(abs(y - min_y), abs(y - max_y))), self.cell_size)
+        if max_distance is not None:
+            limit = min(limit, max_distance)
+        radius = min(self.cell_size, limit)
+        while True:
+            ids, d = self.query_radius(lon, lat, radius)
+            if len(ids) >= k or radius >= limit:
+                return ids[:k], d[:k]
+            radius = min(radius * 2, limit)
+
+    # --- Сохранение ---
+
+    def save(self, path, key=''):
+        """Сохраняет индекс в .npz; key - ключ набора данных, по которому индекс построен."""
+        tmp_path = path + '.tmp.npz'
+        np.savez(
+            tmp_path,
+            version=INDEX_FORMAT_VERSION, key=key, rows=len(self.segments),
+            origin=self.origin, scale=self.scale, bbox=self.bbox, grid_origin=self.grid_origin,
+            cell_size=self.cell_size, shape=self.shape, cell_ptr=self.cell_ptr, cell_ids=self.cell_ids,
+            large_ids=self.large_ids,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, segments, key=''):
+        """Индекс из файла для хранилища segments или None, если файл устарел или поврежден."""
+        try:
+            with np.load(path) as data:
+                if int(data['version']) != INDEX_FORMAT_VERSION or str(data['key']) != key \
+                        or int(data['rows']) != len(segments):
+                    return None
+                return cls(
+                    segments, tuple(data['origin'].tolist()), tuple(data['scale'].tolist()), data['bbox'],
+                    tuple(data['grid_origin'].tolist()), float(data['cell_size']), tuple(data['shape'].tolist()),
+                    data['cell_ptr'], data['cell_ids'], data['large_ids'],
+                )
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+def _cell_ranges(bbox, grid_origin, cell_size, shape):
+    """Диапазоны ячеек сетки (ix0, iy0, ix1, iy1), задеваемых прямоугольниками bbox (M, 4)."""
+    ny, nx = shape
+    ix = np.floor((bbox[:, [0, 2]] - grid_origin[0]) / cell_size)
+    iy = np.floor((bbox[:, [1, 3]] - grid_origin[1]) / cell_size)
+    ix = np.clip(ix, 0, nx - 1).astype(np.int64)
+    iy = np.clip(iy, 0, ny - 1).astype(np.int64)
+    return ix[:, 0], iy[:, 0], ix[:, 1], iy[:, 1]
@@ -0,0 +1,36 @@
+import os
+import random
+import sys
+
+import pytest
+
+# Модули проекта лежат в корне репозитория (без пакета), генератор сети - в benchmarks
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'benchmarks')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import synthetic_geojson  # noqa: E402
+from loader import build_segment_record, score_segments, simulate_segments  # noqa: E402
+from segments import SegmentStore  # noqa: E402
+
+
+def synthetic_features(count, seed=0):
+    """Объекты GeoJSON синтетической сетки улиц (как в бенчмарке)."""
+    rng = random.Random(seed)
+    side = synthetic_geojson.grid_size(count)
+    return [synthetic_geojson.make_feature(index, side, rng) for index in range(count)]
+
+
+def build_segments(count, seed=0):
+    """Хранилище участков синтетической сети после симуляции и скоринга."""
+    records = (build_segment_record(feature) for feature in synthetic_features(count, seed))
+    segments = SegmentStore.from_records(record for record in records if record is not None)
+    simulate_segments(segments, seed, 'tests')
+    score_segments(segments)
+    return segments
+
+
+@pytest.fixture(scope='session')
+def segments():
+    return build_segments(2000)
@@ -0,0 +1,126 @@
+import os
+
+import numpy as np
+import pytest
+
+import cache
+from cache import SegmentCache, cache_dir_for
+from loader import score_segments, simulate_segments
+
+
+@pytest.fixture
+def cache_root(tmp_path, monkeypatch):
+    root = tmp_path / 'cache'
+    monkeypatch.setattr(cache, '_cache_root', str(root))
+    return root
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'data' / 'roads.geojson'
+    path.parent.mkdir()
+    path.write_text('{"features": []}', encoding='utf-8')
+    return str(path)
+
+
+def _stored(segments, source):
+    store = SegmentCache(cache_dir_for(os.path.dirname(source)))
+    part = segments[:300]
+    assert store.store(source, part)
+    store.flush()
+    return part
+
+
+def test_round_trip_after_reopen(cache_root, segments, source):
+    part = _stored(segments, source)
+    loaded = SegmentCache(cache_dir_for(os.path.dirname(source))).load(source)
+    for field in ('ST_NAME', 'Width', 'CurLoad', 'Control', 'CrossRoad', 'Lanes'):
+        assert loaded.field_values(field) == part.field_values(field)
+    for row in (0, 150, 299):
+        assert np.array_equal(loaded.vertices(row), part.vertices(row), equal_nan=True)
+
+
+def test_loaded_columns_are_memory_mapped(cache_root, segments, source):
+    part = _stored(segments, source)
+    loaded = SegmentCache(cache_dir_for(os.path.dirname(source))).load(source)
+    # Колонки кэша не копируются: только для чтения и без собственных данных
+    for column in ('cur_load', 'width', 'name', 'vertex_start'):
+        values = getattr(loaded, column)
+        assert not values.flags.writeable and not values.flags.owndata
+    assert not loaded.coords.flags.writeable
+
+    # Симулируемые колонки - свои, изменение строк копирует колонки кэша
+    simulate_segments(loaded, 0, 'roads.geojson')
+    score_segments(loaded)
+    loaded.replace(0, 2, part[10:11])
+    assert loaded.field_values('ST_NAME')[0] == part.field_values('ST_NAME')[10]
+    assert len(loaded) == len(part) - 1
+    reread = SegmentCache(cache_dir_for(os.path.dirname(source))).load(source)
+    assert reread.field_values('ST_NAME') == part.field_values('ST_NAME')
+
+
+@pytest.mark.parametrize('change', ['mtime', 'size'])
+def test_entry_invalidated_when_file_changes(cache_root, segments, source, change):
+    _stored(segments, source)
+    store = SegmentCache(cache_dir_for(os.path.dirname(source)))
+    assert store.is_fresh(source)
+    stat = os.stat(source)
+    if change == 'mtime':
+        os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    else:
+        # Размер меняется, время модификации восстанавливается
+        with open(source, 'a', encoding='utf-8') as f:
+            f.write(' ')
+        os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert not store.is_fresh(source)
+    assert store.load(source) is None
+
+
+def test_store_replaces_entry_without_touching_live_memmaps(cache_root, segments, source):
+    part = _stored(segments, source)
+    store = SegmentCache(cache_dir_for(os.path.dirname(source)))
+    live = store.load(source)
+    expected = {field: live.field_values(field) for field in ('ST_NAME', 'CurLoad', 'Width')}
+    expected_vertices = live.vertices(42).copy()
+
+    # Файл изменился: новая запись того же размера, с другими участками
+    with open(source, 'a', encoding='utf-8') as f:
+        f.write(' ')
+    replacement = segments[300:600]
+    assert store.store(source, replacement)
+    store.flush()
+
+    # Загруженные ранее колонки (memory-map) читают прежние данные
+    for field, values in expected.items():
+        assert live.field_values(field) == values
+    assert np.array_equal(live.vertices(42), expected_vertices, equal_nan=True)
+    reloaded = SegmentCache(store.cache_dir).load(source)
+    assert reloaded.field_values('ST_NAME') == replacement.field_values('ST_NAME')
+    assert reloaded.field_values('ST_NAME') != part.field_values('ST_NAME')
+    # Временные каталоги записи не остаются
+    assert len([name for name in os.listdir(store.cache_dir) if name != cache.MANIFEST_NAME]) == 1
+
+
+def test_evict_stale_removes_missing_files(cache_root, segments, source):
+    _stored(segments, source)
+    store = SegmentCache(cache_dir_for(os.path.dirname(source)))
+    entry_dirs = [name for name in os.listdir(store.cache_dir) if name != cache.MANIFEST_NAME]
+    assert len(entry_dirs) == 1
+    store.evict_stale([])
+    store.flush()
+    assert os.listdir(store.cache_dir) == [cache.MANIFEST_NAME]
+    assert SegmentCache(store.cache_dir).load(source) is None
+
+
+def test_cache_dirs_outside_data_and_per_data_root(cache_root, tmp_path):
+    first, second = cache_dir_for(tmp_path / 'a'), cache_dir_for(tmp_path / 'b')
+    assert first != second
+    assert os.path.dirname(first) == str(cache_root)
+    assert cache_dir_for(tmp_path / 'a') == first
+
+
+def test_default_root_is_user_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(cache, '_cache_root', None)
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+    if os.name != 'nt' and cache.sys.platform != 'darwin':
+        assert cache.cache_root() == os.path.join(str(tmp_path), cache.CACHE_APP_NAME)
@@ -0,0 +1,23 @@
+import diagnostics
+
+
+def test_disabled_stage_ignores_items():
+    diagnostics.enable(False)
+    with diagnostics.stage('first') as st:
+        st.items += 5
+        st.items = 3
+    with diagnostics.stage('second') as other:
+        assert other.items == 0
+    assert st.items == 0
+
+
+def test_enabled_stage_records_items():
+    diagnostics.enable()
+    try:
+        diagnostics.reset()
+        with diagnostics.stage('load', 2) as st:
+            st.items += 3
+        events = [event for event in diagnostics.events() if event['name'] == 'load']
+        assert events[-1]['items'] == 5
+    finally:
+        diagnostics.enable(False)
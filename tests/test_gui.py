@@ -0,0 +1,86 @@
+import os
+
+import numpy as np
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+QtWidgets = pytest.importorskip('PyQt5.QtWidgets')
+
+from PyQt5.QtCore import Qt  # noqa: E402
+
+from conftest import build_segments  # noqa: E402
+from gui import SegmentTableModel, SegmentViewModel  # noqa: E402
+
+FILTERS = [
+    {},
+    {'tier': 2},
+    {'road_class': 1},
+    {'weather': 0},
+    {'min_load': 0.5},
+    {'tier': 3, 'road_class': 0, 'min_load': 0.3},
+]
+
+
+@pytest.fixture(scope='module')
+def qapp():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def _view_rows(view):
+    return [view.source_row(row) for row in range(view.rowCount())]
+
+
+def _expected_rows(segments, column, order, filters):
+    """Порядок строк эталоном: булевы маски по колонкам и устойчивый argsort ключа."""
+    mask = np.ones(len(segments), dtype=bool)
+    for name, value in filters.items():
+        mask &= segments.cur_load >= value if name == 'min_load' else getattr(segments, name) == value
+    rows = np.flatnonzero(mask)
+    if column < 0:
+        return rows.tolist()
+    if column == 0:
+        # sorted(reverse=True) сохраняет порядок равных, как argsort по ключу с обратным знаком
+        names = [segments.names[code] for code in segments.name[rows].tolist()]
+        ranked = sorted(range(len(rows)), key=names.__getitem__, reverse=order == Qt.DescendingOrder)
+        return rows[ranked].tolist()
+    key = getattr(segments, SegmentViewModel.SORT_COLUMNS[column])[rows].astype(np.float64)
+    if order == Qt.DescendingOrder:
+        key = -key
+    return rows[np.argsort(key, kind='stable')].tolist()
+
+
+def _assert_view(view, column, order, filters):
+    expected = _expected_rows(view.segments, column, order, filters)
+    assert _view_rows(view) == expected
+    # Обратное отображение: скрытые фильтром строки - -1
+    inverse = np.full(len(view.segments), -1)
+    inverse[expected] = np.arange(len(expected))
+    assert [view.proxy_row(row) for row in range(len(view.segments))] == inverse.tolist()
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_sort_and_filter_match_numpy(qapp, filters):
+    view = SegmentViewModel(SegmentTableModel(build_segments(600, seed=8)))
+    view.set_filter(**filters)
+    for column in [-1] + list(range(len(SegmentViewModel.SORT_COLUMNS))):
+        for order in (Qt.AscendingOrder, Qt.DescendingOrder):
+            view.sort(column, order)
+            _assert_view(view, column, order, filters)
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+@pytest.mark.parametrize('column', [-1, 0, 2, 9, 10])
+def test_appended_rows_merge_into_order(qapp, filters, column):
+    model = SegmentTableModel(build_segments(400, seed=9))
+    view = SegmentViewModel(model)
+    view.set_filter(**filters)
+    view.sort(column, Qt.DescendingOrder)
+    # Порции загрузки вливаются в готовый порядок, замена строк пересчитывает его
+    for seed in (10, 11):
+        model.append_rows(build_segments(150, seed=seed))
+        _assert_view(view, column, Qt.DescendingOrder, filters)
+    size = len(model.segments)
+    replacement = build_segments(20, seed=12)
+    model.replace_rows(100, 50, replacement)
+    assert len(model.segments) == size - 50 + len(replacement)
+    _assert_view(view, column, Qt.DescendingOrder, filters)
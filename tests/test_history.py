@@ -0,0 +1,166 @@
+import datetime
+
+import numpy as np
+import pytest
+
+import history
+import synthetic_geojson
+from history import HOURS_PER_DAY, LoadHistory, ingest_day
+from loader import find_geojson_files, load_files, simulate_segments, simulation_key
+
+FILES = [['a.geojson', 3], ['b/c.geojson', 4]]
+START = datetime.date(2026, 3, 1)
+
+
+def _days(count, size=7, seed=0):
+    """Почасовые снимки дней [участки, 24] с пропусками (NaN) и участками без наблюдений в начале."""
+    rng = np.random.default_rng(seed)
+    days = []
+    for day in range(count):
+        loads = rng.uniform(0.0, 1.0, (size, HOURS_PER_DAY)).astype(np.float32) + np.float32(0.01 * day)
+        loads[rng.random((size, HOURS_PER_DAY)) < 0.2] = np.nan
+        if day < 3:
+            loads[0, :] = np.nan  # Участок 0 наблюдается с 4-го дня
+        if day % 5 == 4:
+            loads[1, :] = np.nan  # Целый день без данных: берется предыдущий
+        days.append(loads)
+    return days
+
+
+def _reference_daily(days, peak_hours=history.PEAK_HOURS):
+    """Средняя нагрузка в часы пик по дням с заполнением пропусков предыдущим днем."""
+    daily = []
+    for loads in days:
+        peak = loads[:, list(peak_hours)].astype(np.float64)
+        with np.errstate(invalid='ignore'):
+            value = np.nansum(peak, axis=1) / (~np.isnan(peak)).sum(axis=1)
+        if daily:
+            # Пропуск заполняется записанным (float32) значением предыдущего дня
+            value = np.where(np.isnan(value), daily[-1].astype(np.float32), value)
+        daily.append(value)
+    return np.array(daily)
+
+
+@pytest.fixture
+def filled(tmp_path):
+    days = _days(20)
+    store = LoadHistory.create(str(tmp_path / 'history'), FILES, START)
+    for loads in days:
+        store.append_day(loads)
+    return store, days
+
+
+def test_append_and_read_back(filled):
+    store, days = filled
+    assert store.days == 20 and store.end_day == START + datetime.timedelta(days=20)
+    np.testing.assert_array_equal(store.window(), np.concatenate([loads.T for loads in days]))
+    np.testing.assert_array_equal(store.segment_series(2, 24, 48), days[1][2])
+    np.testing.assert_allclose(store.daily_peak(), _reference_daily(days).astype(np.float32), rtol=1e-6)
+    assert store.first_day().tolist() == [3, 0, 0, 0, 0, 0, 0]
+
+    # Открытие заново видит те же данные
+    reopened = LoadHistory(store.path)
+    assert reopened.days == 20
+    np.testing.assert_array_equal(reopened.daily_peak(), store.daily_peak())
+
+
+def test_append_validates_day_and_shape(filled):
+    store, days = filled
+    with pytest.raises(ValueError):
+        store.append_day(days[0], START)
+    with pytest.raises(ValueError):
+        store.append_day(days[0][:3])
+
+
+def test_gap_days_are_filled(tmp_path):
+    days = _days(2)
+    store = LoadHistory.create(str(tmp_path / 'history'), FILES, START)
+    store.append_day(days[0])
+    store.append_day(days[1], START + datetime.timedelta(days=3))
+    assert store.days == 4
+    assert np.isnan(store.window(24, 72)).all()
+    daily = store.daily_peak()
+    np.testing.assert_array_equal(daily[1, 1:], daily[0, 1:])
+    np.testing.assert_array_equal(daily[2, 1:], daily[0, 1:])
+
+
+@pytest.mark.parametrize('window_days, end_day', [(28, None), (5, None), (7, 12), (1, 10), (10, 2)])
+def test_rolling_matches_least_squares(filled, window_days, end_day):
+    store, days = filled
+    # Префиксные суммы считаются по дневной нагрузке в float64 (до записи в daily.f32)
+    daily = _reference_daily(days)
+    result = store.rolling(window_days, end_day)
+    end = store.days if end_day is None else end_day
+    first_day = store.first_day()
+    for column in range(store.size):
+        start = min(max(end - window_days, first_day[column]), end)
+        values = daily[start:end, column]
+        assert result['days'][column] == len(values)
+        if not len(values):
+            assert np.isnan(result['peak_mean'][column])
+            continue
+        assert result['peak_mean'][column] == pytest.approx(values.mean())
+        expected_trend = np.polyfit(np.arange(len(values)), values, 1)[0] if len(values) > 1 else 0.0
+        assert result['trend'][column] == pytest.approx(expected_trend, abs=1e-9)
+
+
+def test_forecast_and_cache(filled):
+    store, days = filled
+    aggregates = store.rolling(20)
+    width = aggregates['days']
+    expected = np.clip(aggregates['peak_mean'] + aggregates['trend'] * ((width - 1) / 2 + 3), 0.0, 1.0)
+    forecast = store.forecast(horizon_days=3, window_days=20, min_days=18)
+    np.testing.assert_allclose(forecast[1:], expected[1:])
+    # Участок 0 наблюдается 17 дней окна - меньше min_days
+    assert np.isnan(forecast[0])
+
+    assert store.forecast() is store.forecast()
+    before = store.forecast()
+    store.append_day(days[0])
+    assert store.forecast() is not before
+
+    np.testing.assert_array_equal(store.forecast_for('b/c.geojson', 4), store.forecast()[3:])
+    assert store.forecast_for('b/c.geojson', 5) is None
+    assert store.forecast_for('missing.geojson', 4) is None
+
+
+def test_refresh_sees_days_from_another_writer(filled):
+    store, days = filled
+    reader = LoadHistory(store.path)
+    store.append_day(days[0])
+    assert reader.days == 20
+    assert reader.refresh()
+    assert reader.days == 21
+    np.testing.assert_array_equal(reader.daily_peak(), store.daily_peak())
+    assert not reader.refresh()
+
+
+def test_unsupported_version(filled):
+    store, _ = filled
+    manifest = store.path + '/' + history.MANIFEST_NAME
+    with open(manifest, encoding='utf-8') as f:
+        text = f.read()
+    with open(manifest, 'w', encoding='utf-8') as f:
+        f.write(text.replace('"version": 1', '"version": 99'))
+    with pytest.raises(ValueError):
+        LoadHistory(store.path)
+
+
+def test_ingest_day_and_simulation_forecast(tmp_path):
+    data_dir = str(tmp_path / 'data')
+    synthetic_geojson.generate(data_dir, 60, files=2, seed=1)
+    loaded = [(simulation_key(path, data_dir), segments)
+              for path, segments, _ in load_files(find_geojson_files(data_dir), cache=None)]
+    size = sum(len(segments) for _, segments in loaded)
+    history_path = str(tmp_path / 'history')
+    rng = np.random.default_rng(0)
+    for day in range(history.MIN_FORECAST_DAYS):
+        snapshot = str(tmp_path / f'day{day}.npy')
+        np.save(snapshot, rng.uniform(0.2, 0.4, (size, HOURS_PER_DAY)))
+        store = ingest_day(history_path, snapshot, data_dir, START + datetime.timedelta(days=day), use_cache=False)
+    assert store.days == history.MIN_FORECAST_DAYS
+    assert [key for key, _ in store.files] == [key for key, _ in loaded]
+
+    key, segments = loaded[1]
+    simulate_segments(segments, key=key, history=store)
+    np.testing.assert_array_equal(segments.pred_load, store.forecast_for(key, len(segments)))
@@ -0,0 +1,172 @@
+import io
+import json
+
+import numpy as np
+import pytest
+
+import synthetic_geojson
+from conftest import synthetic_features
+from loader import build_segment_record, geometry_vertices, iter_geojson_features, load_files
+
+CHUNK_SIZES = [1, 2, 3, 7, 64, 64 * 1024]
+
+AWKWARD_FEATURES = [
+    {'properties': {'ST_NAME': 'ул. "Кавычки" \\ обратная', 'Width': 12, 'CurLoad': 0.5,
+                    'Control': '1', 'CrossRoad': '0'}},
+    {'properties': {'ST_NAME': 'Юникод й \U0001F600 \t\n', 'Width': 7.25, 'CurLoad': 1e-5,
+                    'Control': '0', 'CrossRoad': '1'}},
+    {'geometry': {'type': 'MultiLineString', 'coordinates': [[[37.5, 55.7], [37.6, 55.8]], [[-0.125, 1e3]]]},
+     'properties': {'ST_NAME': 'вложенные [массивы] {и} ,скобки:', 'Width': None, 'CurLoad': -0.0,
+                    'Control': '0', 'CrossRoad': '0', 'extra': [[], [[]], {'features': [1, 2]}]}},
+    {},
+    [],
+    None,
+    12345678901234567890,
+]
+
+
+def _parse(text, chunk_size):
+    return list(iter_geojson_features(io.StringIO(text), chunk_size))
+
+
+def _document(features, **extra):
+    return json.dumps(dict(extra, type='FeatureCollection', features=features), ensure_ascii=False)
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+@pytest.mark.parametrize('ascii_only', [False, True])
+def test_matches_json_load_on_awkward_features(chunk_size, ascii_only):
+    text = json.dumps(
+        {'name': 'x', 'bbox': [1, [2, [3]]], 'features': AWKWARD_FEATURES, 'crs': {'features': 'нет'}},
+        ensure_ascii=ascii_only,
+    )
+    assert _parse(text, chunk_size) == json.load(io.StringIO(text))['features']
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_matches_json_load_on_synthetic_network(chunk_size):
+    text = _document(synthetic_features(300), name='сеть')
+    assert _parse(text, chunk_size) == json.loads(text)['features']
+
+
+@pytest.mark.parametrize('chunk_size', [1, 5, 64 * 1024])
+def test_whitespace_and_key_order(chunk_size):
+    text = '\n\t { "features" :\r\n [ {"a" : [ 1 , 2 ] } ,\n{ } ] , "type" : "FeatureCollection" }  \n'
+    assert _parse(text, chunk_size) == [{'a': [1, 2]}, {}]
+
+
+@pytest.mark.parametrize('text', ['{}', '{"type": "FeatureCollection"}', '{"features": []}', '[]', '"features"'])
+def test_documents_without_features(text):
+    assert _parse(text, 3) == []
+
+
+@pytest.mark.parametrize('text', [
+    '{"features": [{"a": 1}',
+    '{"features": [{"a": 1},]}',
+    '{"features": [1] 2}',
+    '{"features": [1]} []',
+    '{"features": [1], }',
+    '',
+])
+def test_invalid_json_raises_like_json_load(text):
+    with pytest.raises(json.JSONDecodeError):
+        json.loads(text)
+    with pytest.raises(json.JSONDecodeError):
+        _parse(text, 2)
+
+
+def test_records_skip_missing_fields_and_keep_geometry():
+    feature = AWKWARD_FEATURES[2]
+    record = build_segment_record(feature)
+    assert record['Width'] is None and record['Lanes'] == 1
+    vertices = np.array(record['Geometry'], dtype=np.float64)
+    assert vertices.shape == (4, 2) and np.isnan(vertices[2]).all()
+    assert build_segment_record({'properties': {'ST_NAME': 'x'}}) is None
+    assert build_segment_record([]) is None
+    assert geometry_vertices({'type': 'Polygon', 'coordinates': []}) == []
+
+
+class _CountingReader(io.StringIO):
+    """Файл, считающий прочитанные символы."""
+
+    def __init__(self, text):
+        super().__init__(text)
+        self.consumed = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.consumed += len(chunk)
+        return chunk
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64 * 1024])
+def test_literals_and_escapes_split_by_buffer(chunk_size):
+    features = [{'a': [True, False, None, -1.5e-7, 123456789012, '\\u0416\\n', 'éЖ']}] * 20
+    text = _document(features)
+    assert _parse(text, chunk_size) == features
+    text = text.replace('é', '\\u00e9')
+    assert _parse(text, chunk_size) == json.loads(text)['features']
+
+
+@pytest.mark.parametrize('bad_feature', ['{"a": 1,, "b": 2}', '{"a": tru}', '{"a" 1}', '{"a": [1 2]}'])
+def test_syntax_error_does_not_read_rest_of_file(bad_feature):
+    remainder = ',\n'.join(json.dumps(feature, ensure_ascii=False) for feature in synthetic_features(20000))
+    text = '{"type": "FeatureCollection", "features": [' + bad_feature + ',\n' + remainder + ']}'
+    assert len(text) > 4_000_000
+    with pytest.raises(json.JSONDecodeError):
+        json.loads(text)
+    reader = _CountingReader(text)
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_geojson_features(reader, 64 * 1024))
+    # Ошибка выдается по первым блокам, а не после чтения всего файла в память
+    assert reader.consumed <= 2 * 64 * 1024
+
+
+# --- Загрузка набора файлов ---
+
+def _rows(store):
+    return [(dict(row), store.vertices(i).tolist()) for i, row in enumerate(store)]
+
+
+@pytest.fixture(scope='module')
+def data_files(tmp_path_factory):
+    """Файлы синтетической сети разного размера (первые - крупнее) и файлы с ошибками."""
+    root = tmp_path_factory.mktemp('data')
+    good = []
+    for index, count in enumerate((3000, 1500, 40, 800, 5, 200)):
+        good.extend(synthetic_geojson.generate(str(root / f'part{index}'), count, seed=index))
+    bad_json = root / 'bad.geojson'
+    bad_json.write_text('{"type": "FeatureCollection", "features": [{"type": "Feature",, }]}', encoding='utf-8')
+    truncated = root / 'truncated.geojson'
+    truncated.write_text('{"type": "FeatureCollection", "features": [{"type": "Feature", "prop', encoding='utf-8')
+    missing = str(root / 'missing.geojson')
+    return good, [str(bad_json), str(truncated), missing]
+
+
+def test_load_files_pool_keeps_file_order(data_files):
+    good, _ = data_files
+    serial = list(load_files(good, workers=0))
+    parallel = list(load_files(good, workers=3))
+    # Порядок результатов - порядок файлов, хотя первые (крупные) файлы разбираются дольше
+    assert [filepath for filepath, _, _ in parallel] == good
+    for (_, expected, expected_error), (_, segments, error) in zip(serial, parallel):
+        assert error is None and expected_error is None
+        assert _rows(segments) == _rows(expected)
+
+
+def test_load_files_pool_collects_every_error(data_files):
+    good, bad = data_files
+    filepaths = [bad[0], good[0], bad[1], good[2], bad[2], good[4]]
+    results = list(load_files(filepaths, workers=4))
+    assert [filepath for filepath, _, _ in results] == filepaths
+    errors = {filepath: error for filepath, _, error in results}
+    assert all(errors[filepath] for filepath in bad)
+    assert "Некорректный формат JSON" in errors[bad[0]] and "Некорректный формат JSON" in errors[bad[1]]
+    assert bad[2] in errors[bad[2]]
+    for filepath, segments, error in results:
+        if filepath in bad:
+            assert not len(segments)
+        else:
+            assert error is None and len(segments)
+    # Те же ошибки, что и при последовательной загрузке
+    assert [error for _, _, error in load_files(filepaths, workers=0)] == [errors[filepath] for filepath in filepaths]
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+import model
+
+
+def _records():
+    """Участки с граничными значениями: ширина None/0/дробная, все классы, погоды и флаги."""
+    records = []
+    widths = (None, 0, 3, 6, 6.5, 9, 12.2, 30)
+    for i, width in enumerate(widths):
+        for road_class in model.ROAD_CLASSES + ('Н/Д',):
+            for weather in model.WEATHER_CONDITIONS:
+                cur_load = (i * 0.137) % 1.0
+                records.append({
+                    'ST_NAME': f"ул. {i}",
+                    'Width': width,
+                    'CurLoad': cur_load,
+                    'PredictiveLoad': min(1.0, cur_load * 1.3),
+                    'Control': '1' if i % 2 else '0',
+                    'CrossRoad': '1' if i % 3 else '0',
+                    'RoadClass': road_class,
+                    'WeatherImpact': weather,
+                })
+    return records
+
+
+def test_score_batch_matches_score_segment():
+    records = _records()
+    scores = model.score_records(records)
+    for i, record in enumerate(records):
+        scalar = model.score_segment(record)
+        # Побитовое совпадение, а не приближенное
+        assert scores['severity'][i] == scalar['severity']
+        assert scores['lanes'][i] == scalar['lanes']
+        assert scores['tier'][i] == scalar['tier_level']
+        assert scores['actions'][scores['action'][i]] == scalar['action']
+        assert scores['cost'][i] == scalar['action']['cost']
+
+
+def test_score_batch_matches_stored_segments(segments):
+    scores = model.score_batch(**segments.score_columns())
+    for i in range(0, len(segments), 7):
+        scalar = model.score_segment(segments[i])
+        assert scores['severity'][i] == scalar['severity']
+        assert scores['tier'][i] == scalar['tier_level']
+
+
+def test_score_batch_spillover_matches_scalar():
+    records = _records()
+    spillover = np.linspace(0.0, 0.5, len(records))
+    scores = model.score_batch(**model.segment_columns(records), spillover=spillover)
+    for i, record in enumerate(records):
+        scalar = model.score_segment(dict(record, SpilloverLoad=spillover[i]))
+        assert scores['severity'][i] == scalar['severity']
+        assert scores['tier'][i] == scalar['tier_level']
+
+
+def test_score_batch_without_spillover_is_unchanged():
+    columns = model.segment_columns(_records())
+    plain = model.score_batch(**columns)
+    zero = model.score_batch(**columns, spillover=np.zeros(len(columns['cur_load'])))
+    assert np.array_equal(plain['severity'], zero['severity'])
+
+
+@pytest.mark.parametrize('index', [0, 17, 50, 95])
+def test_get_recommendation_reports_scalar_score(index):
+    record = _records()[index]
+    scalar = model.score_segment(record)
+    html = model.get_recommendation(record)
+    assert scalar['tier'] in html
+    assert f"{scalar['severity']:.1f}" in html
+    assert scalar['action']['name'] in html
+    assert record['ST_NAME'] in html
+
+
+def test_tier_thresholds_are_strict():
+    severity = np.array(model.TIER_THRESHOLDS, dtype=np.float64)
+    levels = [model.get_tier_level(value) for value in severity]
+    # Ровно на пороге участок остается в менее приоритетном ТИРе
+    assert levels == [2, 3, 4]
+
+
+def test_actions_are_plain_dict_copies():
+    action = model.select_optimal_action(model.TIER_LABELS[0], model.ROAD_CLASSES[0])
+    assert type(action) is dict
+    action['cost'] = -1
+    assert model.select_optimal_action(model.TIER_LABELS[0], model.ROAD_CLASSES[0])['cost'] != -1
+    assert type(model.score_segment({'CurLoad': 0.5})['action']) is dict
+    scores = model.score_batch(**model.segment_columns([{'CurLoad': 0.5}]))
+    assert all(type(a) is dict for a in scores['actions'])
+
+
+def test_action_library_changes_only_through_set_action_library():
+    from portfolio import library_actions
+
+    original = model.ACTION_LIBRARY
+    with pytest.raises(TypeError):
+        model.ACTION_LIBRARY['Major'] = []
+    with pytest.raises(TypeError):
+        model.ACTION_LIBRARY['Major'][0]['cost'] = 1
+    with pytest.raises(AttributeError):
+        model.ACTION_LIBRARY['Minor'].append({'name': "Новое", 'cost': 1, 'effect_reduction': 0.5})
+
+    library = {action_type: [dict(action) for action in actions] for action_type, actions in original.items()}
+    library['Major'].append({'name': "Дешевый объезд", 'cost': 10, 'effect_reduction': 0.3})
+    try:
+        model.set_action_library(library)
+        # Индекс и плоский список портфеля видят одну и ту же (новую) библиотеку
+        assert model.select_optimal_action(model.TIER_LABELS[0], model.ROAD_CLASSES[0])['name'] == "Дешевый объезд"
+        assert ('Major', library['Major'][-1]) in library_actions()
+        # Изменение переданного словаря после замены на модель не влияет
+        library['Major'][-1]['cost'] = 10 ** 9
+        assert model.select_optimal_action(model.TIER_LABELS[0], model.ROAD_CLASSES[0])['cost'] == 10
+        assert dict(model.ACTION_LIBRARY['Major'][-1])['cost'] == 10
+    finally:
+        model.set_action_library(original)
+    assert model.select_optimal_action(model.TIER_LABELS[0], model.ROAD_CLASSES[0])['name'] != "Дешевый объезд"
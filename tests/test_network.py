@@ -0,0 +1,179 @@
+import math
+
+import numpy as np
+import pytest
+
+import model
+from network import (
+    ENDPOINT_TOLERANCE_M, MAX_ITERATIONS, MAX_JUNCTION_ENDS, METERS_PER_DEGREE, SPILLOVER_SHARE,
+    SPILLOVER_THRESHOLD, RoadGraph,
+)
+from segments import SegmentStore
+
+LAT = 55.75
+
+
+def _store(geometries):
+    """Хранилище участков с заданными линиями (None - участок без геометрии)."""
+    records = []
+    for i, geometry in enumerate(geometries):
+        record = {'ST_NAME': f"ул. {i}", 'CurLoad': 0.5}
+        if geometry is not None:
+            record['Geometry'] = geometry
+        records.append(record)
+    return SegmentStore.from_records(records)
+
+
+def _neighbours(graph):
+    return [sorted(graph.indices[graph.indptr[i]:graph.indptr[i + 1]].tolist()) for i in range(len(graph))]
+
+
+def _cell_center(lon, lat=LAT):
+    """Центр ячейки сетки привязки концов, в которую попадает точка (все концы на широте LAT)."""
+    step_lat = ENDPOINT_TOLERANCE_M / METERS_PER_DEGREE
+    step_lon = step_lat / math.cos(math.radians(LAT))
+    return (math.floor(lon / step_lon) + 0.5) * step_lon, (math.floor(lat / step_lat) + 0.5) * step_lat
+
+
+def _dense_spillover(adjacency, load, threshold=SPILLOVER_THRESHOLD, share=SPILLOVER_SHARE):
+    """Неподвижная точка L = L0 + A D^-1 share max(0, L - threshold) плотной матрицей до полной сходимости."""
+    degree = adjacency.sum(axis=1)
+    weight = np.where(degree > 0, share / np.maximum(degree, 1), 0.0)
+    effective = load.copy()
+    for _ in range(10_000):
+        updated = load + adjacency @ (np.maximum(effective - threshold, 0.0) * weight)
+        if np.max(np.abs(updated - effective)) < 1e-13:
+            break
+        effective = updated
+    return updated - load
+
+
+def test_hand_built_graph_adjacency():
+    a, b, c, d = _cell_center(37.600), _cell_center(37.601), _cell_center(37.602), _cell_center(37.603)
+    far = _cell_center(37.700)
+    graph = RoadGraph.build(_store([
+        [a, b],                                  # 0: a-b
+        [b, c],                                  # 1: b-c, общий конец b с 0 и 2
+        [b, (37.6015, 55.7510)],                 # 2: b-(в сторону)
+        [c, (37.6025, LAT), d],                  # 3: c-d, промежуточная вершина не конец
+        [far, (37.701, LAT)],                    # 4: отдельно от всех
+        None,                                    # 5: без геометрии
+        [d, (37.6035, LAT), (np.nan, np.nan), (37.6995, LAT), far],  # 6: две части, концы d и far
+        [(37.6025, 55.7600), (37.6025, LAT)],    # 7: касается только промежуточной вершины 3
+    ]))
+    assert _neighbours(graph) == [[1, 2], [0, 2, 3], [0, 1], [1, 6], [6], [], [3, 4], []]
+    assert graph.edge_count == 6
+    assert graph.degree.tolist() == [2, 3, 2, 2, 1, 0, 2, 0]
+
+
+def test_endpoint_snapping_tolerance():
+    step_lon = ENDPOINT_TOLERANCE_M / METERS_PER_DEGREE / math.cos(math.radians(LAT))
+    lon, lat = _cell_center(37.6)
+    graph = RoadGraph.build(_store([
+        [(lon - 0.001, lat), (lon - 0.3 * step_lon, lat)],
+        [(lon + 0.3 * step_lon, lat), (lon + 0.001, lat)],   # в той же ячейке: ~0.3 м от конца 0
+        [(lon + 20 * step_lon, lat), (lon + 0.002, lat)],    # 10 м от конца 1
+    ]))
+    assert _neighbours(graph) == [[1], [0], []]
+
+
+def test_junction_pairs_are_limited():
+    count = MAX_JUNCTION_ENDS + 8
+    hub = _cell_center(37.6)
+    graph = RoadGraph.build(_store([[hub, (37.61 + i * 0.001, LAT)] for i in range(count)]))
+    # Концы в одной точке соединяются только со сдвигом меньше MAX_JUNCTION_ENDS (в порядке строк)
+    expected = [[j for j in range(count) if j != i and abs(i - j) < MAX_JUNCTION_ENDS] for i in range(count)]
+    assert _neighbours(graph) == expected
+
+
+def test_csr_from_edges_matches_dense():
+    rng = np.random.default_rng(3)
+    n = 60
+    first, second = rng.integers(0, n, 400), rng.integers(0, n, 400)
+    graph = RoadGraph.from_edges(n, first, second)
+
+    dense = np.zeros((n, n))
+    dense[first, second] = 1
+    dense[second, first] = 1
+    np.fill_diagonal(dense, 0)
+    assert graph.indptr[0] == 0 and graph.indptr[-1] == len(graph.indices)
+    assert np.all(np.diff(graph.indptr) >= 0)
+    # Соседи строки упорядочены и без повторов
+    assert _neighbours(graph) == [np.flatnonzero(row).tolist() for row in dense]
+    assert graph.edge_count == int(dense.sum()) // 2
+    values = rng.random(n)
+    np.testing.assert_allclose(graph.matvec(values), dense @ values)
+
+
+def test_synthetic_graph_matches_shared_endpoints(segments):
+    graph = RoadGraph.build(segments)
+    # Концы линий синтетической сети в узлах сетки совпадают точно
+    ends = {}
+    for i in range(len(segments)):
+        vertices = segments.vertices(i)
+        for point in (vertices[0], vertices[-1]):
+            ends.setdefault((round(point[0], 9), round(point[1], 9)), set()).add(i)
+    assert max(len(owners) for owners in ends.values()) <= MAX_JUNCTION_ENDS
+    expected = [set() for _ in range(len(segments))]
+    for owners in ends.values():
+        for i in owners:
+            expected[i] |= owners - {i}
+    assert _neighbours(graph) == [sorted(owners) for owners in expected]
+    assert graph.edge_count > 0
+
+
+def test_spillover_matches_dense_reference(segments):
+    graph = RoadGraph.build(segments)
+    load = np.random.default_rng(7).uniform(0.3, 1.4, len(segments))
+    spillover, iterations = graph.spillover(load)
+
+    adjacency = np.zeros((len(graph), len(graph)))
+    adjacency[graph._rows, graph.indices] = 1
+    np.testing.assert_allclose(spillover, _dense_spillover(adjacency, load), atol=1e-5)
+    assert 1 < iterations < MAX_ITERATIONS
+    assert np.count_nonzero(spillover > 0) > 0
+    assert np.all(spillover[graph.degree == 0] == 0)
+
+
+def test_spillover_on_chain():
+    # Цепочка 0-1-2: перегружен только участок 0, отдает половину превышения единственному соседу
+    graph = RoadGraph.from_edges(3, [0, 1], [1, 2])
+    spillover, _ = graph.spillover(np.array([1.3, 0.5, 0.5]))
+    np.testing.assert_allclose(spillover, [0.0, 0.2, 0.0], atol=1e-9)
+
+
+def test_spillover_convergence_and_limits():
+    graph = RoadGraph.from_edges(4, [0, 1, 2], [1, 2, 3])
+    load = np.array([2.0, 1.5, 1.2, 0.4])
+    spillover, iterations = graph.spillover(load, share=0.0)
+    assert np.all(spillover == 0) and iterations == 1
+
+    _, converged = graph.spillover(load)
+    _, capped = graph.spillover(load, max_iterations=2)
+    assert capped == 2 < converged
+    # Итог - неподвижная точка с заданной точностью
+    spillover, _ = graph.spillover(load, tolerance=1e-12)
+    effective = load + spillover
+    step = load + graph.matvec(np.maximum(effective - SPILLOVER_THRESHOLD, 0.0) * SPILLOVER_SHARE / graph.degree)
+    np.testing.assert_allclose(step, effective, atol=1e-11)
+
+    with pytest.raises(ValueError):
+        graph.spillover(load, share=1.0)
+    empty = RoadGraph.build(_store([None, None]))
+    assert empty.edge_count == 0
+    assert empty.spillover(np.array([1.5, 1.5]))[0].tolist() == [0.0, 0.0]
+
+
+def test_spillover_feeds_scoring(segments):
+    graph = RoadGraph.build(segments)
+    columns = segments.score_columns()
+    spillover, _ = graph.spillover(np.maximum(columns['cur_load'], columns['pred_load']))
+    plain = model.score_batch(**columns)
+    scores = model.score_batch(**columns, spillover=spillover)
+    # Добавка от соседей не снижает ТИР участка
+    assert np.all(scores['tier'] <= plain['tier'])
+    assert np.all(scores['severity'] >= plain['severity'])
+    for i in np.flatnonzero(spillover > 0)[:50].tolist():
+        scalar = model.score_segment(dict(segments[i], SpilloverLoad=float(spillover[i])))
+        assert scores['severity'][i] == pytest.approx(scalar['severity'])
+        assert scores['tier'][i] == scalar['tier_level']
@@ -0,0 +1,73 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import portfolio
+
+
+def _brute_force(gains, costs, budget):
+    """Перебор всех назначений (вариант -1 - без мероприятия) для малых задач."""
+    best = 0.0
+    n, k = gains.shape
+    for choice in itertools.product(range(-1, k), repeat=n):
+        picked = [(row, option) for row, option in enumerate(choice) if option >= 0]
+        cost = sum(costs[option] for _, option in picked)
+        if cost <= budget:
+            best = max(best, sum(gains[row, option] for row, option in picked))
+    return best
+
+
+def _value(choice, gains, costs):
+    rows = np.flatnonzero(choice >= 0)
+    return float(gains[rows, choice[rows]].sum()), float(costs[choice[rows]].sum())
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_exact_matches_brute_force_and_bounds_greedy(seed):
+    rng = np.random.default_rng(seed)
+    gains = np.round(rng.uniform(-1.0, 10.0, size=(5, 3)), 3)
+    costs = rng.choice([1000.0, 2000.0, 3000.0, 5000.0], size=3)
+    budget = float(rng.integers(0, 12)) * 1000.0
+
+    exact_choice, exact_value = portfolio._solve_exact(gains, costs, budget)
+    value, cost = _value(exact_choice, gains, costs)
+    assert cost <= budget
+    assert value == pytest.approx(exact_value)
+    assert exact_value == pytest.approx(_brute_force(gains, costs, budget))
+
+    greedy_choice, upper_bound = portfolio._solve_greedy(gains, costs, budget)
+    greedy_value, greedy_cost = _value(greedy_choice, gains, costs)
+    assert greedy_cost <= budget
+    # Жадное решение допустимо и не лучше точного; LP-оценка не ниже оптимума
+    assert greedy_value <= exact_value + 1e-9
+    assert upper_bound >= exact_value - 1e-9
+
+
+def test_greedy_takes_last_hull_step_of_each_row():
+    # Оболочка участка 0: вариант 0 (эффект 4 за 1), затем вариант 1 (+3 за +1)
+    gains = np.array([[4.0, 7.0], [1.0, 1.5]])
+    costs = np.array([1.0, 2.0])
+    choice, upper_bound = portfolio._solve_greedy(gains, costs, 2.0)
+    assert choice.tolist() == [1, -1]
+    assert upper_bound == pytest.approx(7.0)
+
+
+def test_optimize_portfolio_methods(segments):
+    columns = segments.score_columns()
+    budget = 200_000
+    greedy = portfolio.optimize_portfolio(columns, budget, 'greedy')
+    exact = portfolio.optimize_portfolio(columns, budget, 'exact')
+    for result in (greedy, exact):
+        assert result['total_cost'] <= budget
+        assert len(np.unique(result['segments'])) == len(result['segments'])
+        assert result['total_severity_reduction'] == pytest.approx(result['severity_reduction'].sum())
+        assert sum(result['tier_changes'].values()) == len(result['segments'])
+    assert greedy['total_severity_reduction'] <= exact['total_severity_reduction'] + 1e-6
+    assert exact['total_severity_reduction'] <= greedy['upper_bound'] + 1e-6
+    assert portfolio.optimize_portfolio(columns, budget, 'auto')['method'] == 'exact'
+
+
+def test_optimize_portfolio_rejects_unknown_method(segments):
+    with pytest.raises(ValueError):
+        portfolio.optimize_portfolio(segments.score_columns(), 1000, 'lp')
@@ -0,0 +1,194 @@
+import os
+
+import pytest
+
+import reports
+from model import TIER_LABELS, score_batch
+
+requires_pdf = pytest.mark.skipif(not reports.pdf_available(), reason="reportlab и pypdf не установлены")
+requires_excel = pytest.mark.skipif(not reports.excel_available(), reason="openpyxl не установлен")
+
+
+def _font_files(reader):
+    """Номера объектов встроенных файлов шрифтов, на которые ссылаются страницы."""
+    files = set()
+    for page in reader.pages:
+        for font in page['/Resources']['/Font'].values():
+            descriptor = font.get_object().get('/FontDescriptor')
+            if descriptor is not None:
+                files.add(descriptor.get_object().raw_get('/FontFile2').idnum)
+    return files
+
+
+@requires_pdf
+@pytest.mark.parametrize('workers', [0, 2])
+def test_export_pdf_merges_parts(tmp_path, monkeypatch, segments, workers):
+    import pypdf
+
+    # Несколько частей по 10 страниц - проверяется склейка, а не одна часть
+    monkeypatch.setattr(reports, 'PDF_PAGES_PER_PART', 10)
+    path = str(tmp_path / 'report.pdf')
+    assert reports.export_pdf(path, segments, workers=workers)
+
+    reader = pypdf.PdfReader(path)
+    table_pages = -(-len(segments) // reports.PDF_ROWS_PER_PAGE)
+    assert len(reader.pages) == 1 + table_pages
+    assert 'Стр. 2 из' in reader.pages[1].extract_text()
+    last = reader.pages[-1].extract_text()
+    assert f"Стр. {1 + table_pages} из {1 + table_pages}" in last
+    # Шрифт встраивается в документ один раз, а не в каждую часть
+    if reports.load_reportlab() == 'DejaVuSans':
+        assert len(_font_files(reader)) == 1
+
+
+@requires_pdf
+def test_export_pdf_cancelled(tmp_path, segments):
+    path = tmp_path / 'report.pdf'
+    assert not reports.export_pdf(str(path), segments, workers=0, is_cancelled=lambda: True)
+    assert not path.exists()
+    assert not (tmp_path / 'report.pdf.tmp').exists()
+
+
+def _write_part(path, label, pages):
+    """PDF-часть из pages страниц с общим для всех частей потоком-«шрифтом» и своим содержимым."""
+    import pypdf
+    from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+    writer = pypdf.PdfWriter()
+    font_file = DecodedStreamObject()
+    font_file.set_data(b'shared font program' * 64)
+    font = DictionaryObject({
+        NameObject('/Type'): NameObject('/Font'),
+        NameObject('/FontFile2'): writer._add_object(font_file),
+    })
+    font_ref = writer._add_object(font)
+    for number in range(pages):
+        page = writer.add_blank_page(200, 200)
+        contents = DecodedStreamObject()
+        contents.set_data(f'% {label} {number}'.encode())
+        page[NameObject('/Contents')] = writer._add_object(contents)
+        page[NameObject('/Resources')] = DictionaryObject({
+            NameObject('/Font'): DictionaryObject({NameObject('/F1'): font_ref}),
+        })
+    writer.write(path)
+
+
+@requires_pdf
+def test_concatenator_streams_parts_and_shares_objects(tmp_path):
+    import pypdf
+    from pdfconcat import PdfConcatenator
+
+    path = tmp_path / 'merged.pdf'
+    concat = PdfConcatenator(str(path))
+    sizes = []
+    for part in range(3):
+        part_path = str(tmp_path / f'part{part}.pdf')
+        _write_part(part_path, f'part{part}', pages=2 + part)
+        concat.append_file(part_path)
+        concat._file.flush()
+        sizes.append(path.stat().st_size)
+    concat.close()
+
+    # Объекты части записываются при добавлении, а не в close;
+    # общий поток пишется один раз, поэтому следующие части меньше первой
+    assert sizes[0] < sizes[1] < sizes[2]
+    assert sizes[1] - sizes[0] < sizes[0]
+
+    reader = pypdf.PdfReader(str(path))
+    assert len(reader.pages) == 2 + 3 + 4
+    labels = [page.get_contents().get_data().decode() for page in reader.pages]
+    assert labels == [f'% part{part} {number}' for part in range(3) for number in range(2 + part)]
+    fonts = {page['/Resources']['/Font'].raw_get('/F1').idnum for page in reader.pages}
+    assert len(fonts) == 1
+    font_files = {
+        page['/Resources']['/Font']['/F1'].raw_get('/FontFile2').idnum for page in reader.pages
+    }
+    assert len(font_files) == 1
+
+
+@requires_pdf
+def test_concatenator_abort_removes_file(tmp_path):
+    from pdfconcat import PdfConcatenator
+
+    part_path = str(tmp_path / 'part.pdf')
+    _write_part(part_path, 'part', pages=1)
+    path = tmp_path / 'merged.pdf'
+    concat = PdfConcatenator(str(path))
+    concat.append_file(part_path)
+    concat.abort()
+    assert not path.exists()
+
+
+def _sheet_rows(workbook, name):
+    return [tuple(row) for row in workbook[name].iter_rows(values_only=True)]
+
+
+@requires_excel
+def test_export_excel_round_trip(tmp_path, segments):
+    import openpyxl
+
+    path = str(tmp_path / 'report.xlsx')
+    calls = []
+    assert reports.export_excel(path, segments, progress=lambda done, total: calls.append((done, total)), seed=7)
+    assert calls[-1] == (len(segments), len(segments))
+    assert not os.path.exists(path + '.tmp')
+
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    assert workbook.sheetnames == ["Участки", "Сведения"]
+    rows = _sheet_rows(workbook, "Участки")
+    assert list(rows[0]) == reports.REPORT_HEADERS
+    assert len(rows) == 1 + len(segments)
+    info = dict(_sheet_rows(workbook, "Сведения"))
+    assert info["Участков"] == len(segments) and info["Сид симуляции"] == 7
+
+    # Строка участка сверяется с пакетным скорингом
+    scores = score_batch(**segments.score_columns())
+    i = len(segments) // 3
+    row, record = rows[1 + i], segments[i]
+    action = scores['actions'][scores['action'][i]]
+    assert row[0] == record['ST_NAME'] and row[1] == record['RoadClass']
+    assert row[2] == round(record['CurLoad'], 2)
+    assert row[9] == round(float(scores['severity'][i]), 2)
+    assert row[10] == TIER_LABELS[scores['tier'][i] - 1]
+    assert row[11:] == (action['name'], action['cost'])
+    workbook.close()
+
+
+@requires_excel
+def test_export_excel_rolls_over_to_new_sheet(tmp_path, monkeypatch, segments):
+    import openpyxl
+
+    # На листе заголовок и EXCEL_MAX_ROWS - 1 строк участков
+    monkeypatch.setattr(reports, 'EXCEL_MAX_ROWS', 700)
+    path = str(tmp_path / 'report.xlsx')
+    assert reports.export_excel(path, segments)
+
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    sheets = -(-len(segments) // 699)
+    names = ["Участки"] + [f"Участки ({number})" for number in range(2, sheets + 1)]
+    # Лист "Сведения" создается вторым, листы продолжения - после него
+    assert workbook.sheetnames == names[:1] + ["Сведения"] + names[1:]
+    rows = []
+    for name in names:
+        sheet_rows = _sheet_rows(workbook, name)
+        assert list(sheet_rows[0]) == reports.REPORT_HEADERS
+        assert len(sheet_rows) <= 700
+        rows.extend(sheet_rows[1:])
+    workbook.close()
+    expected = [row for chunk in reports.iter_report_chunks(segments) for row in chunk]
+    assert rows == expected
+
+
+@requires_excel
+@pytest.mark.parametrize('cancel_after', [0, 1])
+def test_export_excel_cancelled(tmp_path, monkeypatch, segments, cancel_after):
+    # Порции по 500 строк: отмена до первой порции и после нее
+    chunks = reports.iter_report_chunks
+    monkeypatch.setattr(reports, 'iter_report_chunks', lambda segments: chunks(segments, 500))
+    checks = []
+    path = tmp_path / 'report.xlsx'
+    assert not reports.export_excel(str(path), segments, is_cancelled=lambda: checks.append(1) or len(checks) > cancel_after)
+    assert len(checks) == cancel_after + 1
+    assert not path.exists()
+    assert not (tmp_path / 'report.xlsx.tmp').exists()
+    assert os.listdir(tmp_path) == []
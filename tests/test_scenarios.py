@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+import model
+import scenarios
+from conftest import build_segments
+from loader import LOAD_GROWTH_RANGE, WEATHER_SIMULATION
+from segments import SegmentStore
+
+
+@pytest.fixture(scope='module')
+def small():
+    """Синтетические участки и загруженные магистрали, чей Индекс в снег упирается в SEVERITY_CAP."""
+    store = build_segments(40, seed=6)
+    store.extend(SegmentStore.from_records([
+        {'ST_NAME': f"Магистраль {i}", 'CurLoad': 0.8 + 0.05 * i, 'Width': 5, 'CrossRoad': '1', 'Control': '1',
+         'RoadClass': 'Магистральная'}
+        for i in range(4)
+    ]))
+    return store
+
+
+def _reference(segments, count, seed, block_size, effect_spread=scenarios.EFFECT_SPREAD):
+    """
+    Монте-Карло по одному участку и сценарию на Python (правила score_segment) на тех же
+    случайных числах: поток генератора - сид, номер блока участков и номер порции сценариев.
+    """
+    low, high = LOAD_GROWTH_RANGE
+    effects = [action['effect_reduction'] for _, action in scenarios.library_actions()]
+    n = len(segments)
+    tiers = np.zeros((n, len(model.TIER_LABELS)))
+    severity_sum = np.zeros(n)
+    reduction_sum = np.zeros((n, len(effects)))
+    for block_start in range(0, n, block_size):
+        rows = range(block_start, min(block_start + block_size, n))
+        for first in range(0, count, scenarios.SCENARIO_BLOCK):
+            size = min(scenarios.SCENARIO_BLOCK, count - first)
+            rng = np.random.default_rng([seed, block_start // block_size, first // scenarios.SCENARIO_BLOCK])
+            weather = rng.integers(0, len(WEATHER_SIMULATION), (size, len(rows)), dtype=np.int8).tolist()
+            growth = rng.random((size, len(rows)), dtype=np.float32).tolist()
+            effect_scale = rng.random((size, len(rows)), dtype=np.float32).tolist()
+            for column, i in enumerate(rows):
+                row = segments[i]
+                cur_load = row['CurLoad']
+                structural = 15.0 * (row['CrossRoad'] == '1') + 5.0 * (row['Control'] == '1') \
+                    + 10.0 * (model.calculate_lanes(row['Width']) <= 2)
+                for s in range(size):
+                    pred_load = min(1.0, cur_load * (1 + low + (high - low) * growth[s][column]))
+                    multiplier = model.get_weather_multiplier(WEATHER_SIMULATION[weather[s][column]]) \
+                        * model.get_functional_class_weight(row['RoadClass'])
+                    uncapped = (max(cur_load, pred_load) * 100 + structural) * multiplier
+                    severity = min(uncapped, model.SEVERITY_CAP)
+                    tiers[i, model.get_tier_level(severity) - 1] += 1
+                    severity_sum[i] += severity
+                    scale = 1 - effect_spread + 2 * effect_spread * effect_scale[s][column]
+                    for k, effect in enumerate(effects):
+                        relief = max(cur_load, pred_load) * 100 * multiplier * min(1.0, effect * scale)
+                        reduction_sum[i, k] += severity - min(uncapped - relief, model.SEVERITY_CAP)
+    return tiers / count, severity_sum / count, reduction_sum / count
+
+
+def test_matches_python_monte_carlo(small, monkeypatch):
+    # Несколько блоков участков и неполная последняя порция сценариев
+    monkeypatch.setattr(scenarios, 'SEGMENT_BLOCK', 16)
+    count = scenarios.SCENARIO_BLOCK + 44
+    result = scenarios.run_scenarios(small, count, seed=11, workers=0)
+    tiers, severity, reduction = _reference(small, count, 11, 16)
+    # Сценарии считаются во float32: отдельный сценарий у порога ТИР может попасть в соседний ТИР
+    np.testing.assert_allclose(result['tier_probability'], tiers, atol=2 / count)
+    np.testing.assert_allclose(result['expected_severity'], severity, rtol=1e-5)
+    np.testing.assert_allclose(result['expected_reduction'], reduction, rtol=1e-4, atol=1e-4)
+    assert result['scenarios'] == count and result['seed'] == 11
+    assert len(result['actions']) == result['expected_reduction'].shape[1]
+
+
+def test_tier_probabilities_sum_to_one(segments):
+    result = scenarios.run_scenarios(segments, 300, workers=0)
+    probability = result['tier_probability']
+    assert probability.shape == (len(segments), len(model.TIER_LABELS))
+    assert np.all(probability >= 0)
+    np.testing.assert_allclose(probability.sum(axis=1), 1.0)
+    assert np.all((result['expected_severity'] > 0) & (result['expected_severity'] <= model.SEVERITY_CAP))
+    assert np.all(result['expected_reduction'] >= 0)
+    assert np.all(result['expected_reduction'] <= result['expected_severity'][:, None] + 1e-9)
+
+
+def test_result_does_not_depend_on_workers(segments, monkeypatch):
+    monkeypatch.setattr(scenarios, 'SEGMENT_BLOCK', 256)
+    serial = scenarios.run_scenarios(segments, 400, seed=3, workers=0)
+    parallel = scenarios.run_scenarios(segments, 400, seed=3, workers=3)
+    for name in ('tier_probability', 'expected_severity', 'expected_reduction'):
+        np.testing.assert_array_equal(serial[name], parallel[name])
+    other_seed = scenarios.run_scenarios(segments, 400, seed=4, workers=0)
+    assert not np.array_equal(serial['expected_severity'], other_seed['expected_severity'])
+
+
+def test_cancel_and_invalid_spread(small):
+    assert scenarios.run_scenarios(small, 50, workers=0, is_cancelled=lambda: True) is None
+    with pytest.raises(ValueError):
+        scenarios.run_scenarios(small, 50, effect_spread=1.5)
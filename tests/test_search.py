@@ -0,0 +1,102 @@
+import random
+
+import pytest
+
+from search import NameSearchIndex, SegmentSearch, normalize_name
+from segments import SegmentStore
+
+WORDS = ('Тверская', 'Ленина', 'Мира', 'Лесная', 'Береговая', 'Ёлочная', 'Садовая', 'Ленинградский',
+         'Main', 'Park', 'Арбат', 'Мирная', 'Тверь', 'Садовое кольцо', '1-я', '2-я', 'Новая')
+KINDS = ('ул.', 'пр-т', 'пер.', 'ш.', 'наб.', '')
+
+
+def _names(count, seed):
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        parts = [rng.choice(KINDS), rng.choice(WORDS)]
+        if rng.random() < 0.4:
+            parts.append(rng.choice(WORDS))
+        name = ' '.join(part for part in parts if part)
+        names.add(name.upper() if rng.random() < 0.1 else name)
+    return sorted(names)
+
+
+def _expected(names, query, limit, alive=None):
+    """Эталон: префикс, начало слова, подстрока; внутри группы - короче, затем по алфавиту."""
+    query = normalize_name(query)
+    if not query:
+        return []
+    ranked = []
+    for name_id, name in enumerate(map(normalize_name, names)):
+        if alive is not None and not alive[name_id]:
+            continue
+        positions = [i for i in range(len(name)) if name.startswith(query, i)]
+        if not positions:
+            continue
+        if positions[0] == 0:
+            group = 0
+        elif any(not name[i - 1].isalnum() for i in positions):
+            group = 1
+        elif len(query) > 1:
+            group = 2
+        else:
+            continue
+        ranked.append((group, len(name), name, name_id))
+    return [name_id for *_, name_id in sorted(ranked)][:limit]
+
+
+@pytest.fixture(scope='module')
+def names():
+    return _names(1500, seed=7)
+
+
+@pytest.fixture(scope='module')
+def index(names):
+    return NameSearchIndex(names)
+
+
+def _queries(names, seed):
+    rng = random.Random(seed)
+    queries = ['л', 'Ё', 'ул', 'ул.', 'УЛ. ЛЕН', 'елочная', 'ая', 'кольцо', '1-я', 'ma', 'нет такой', ' мира  ']
+    for _ in range(60):
+        name = normalize_name(rng.choice(names))
+        start = rng.randrange(len(name))
+        queries.append(name[start:start + rng.randint(1, 8)])
+    return queries
+
+
+@pytest.mark.parametrize('limit', [1, 5, 50, 10_000])
+def test_search_matches_reference_ranking(names, index, limit):
+    for query in _queries(names, seed=limit):
+        assert index.search(query, limit) == _expected(names, query, limit), query
+
+
+def test_search_skips_dead_names_before_limit(names, index):
+    rng = random.Random(3)
+    alive = [rng.random() < 0.3 for _ in names]
+    for query in _queries(names, seed=11):
+        assert index.search(query, 10, alive) == _expected(names, query, 10, alive), query
+
+
+def test_exact_match_first_and_empty_queries(names, index):
+    target = names[42]
+    assert index.search(target.swapcase(), 5)[0] == 42
+    assert index.search('   ', 5) == []
+    assert index.search('ул', 0) == []
+    assert NameSearchIndex([]).search('ул') == []
+
+
+def test_segment_search_rows_and_dead_names():
+    records = [{'ST_NAME': name, 'CurLoad': 0.1} for name in ['ул. Мира', 'ул. Мирная', 'ул. Мира', 'пр-т Мира']]
+    store = SegmentStore.from_records(records)
+    search = SegmentSearch(store)
+    # Строки одного имени - по порядку строк; имена - по релевантности
+    assert search.search('мир') == [0, 2, 3, 1]
+    assert search.search('ул. мира', 1) == [0]
+
+    # 'ул. Мирная' без строк: не занимает место в limit
+    store.replace(1, 1, SegmentStore.from_records([{'ST_NAME': 'Мирный пр.', 'CurLoad': 0.1}]))
+    search.invalidate()
+    assert search.search('мир', 2) == [1, 0]
+    assert search.search('мирная') == []
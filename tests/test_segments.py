@@ -0,0 +1,121 @@
+import pickle
+
+import numpy as np
+import pytest
+
+import model
+from conftest import build_segments
+from segments import CLASS_LABELS, COLUMNS, SegmentStore, TierSummary
+
+
+def _snapshot(store):
+    """Строки хранилища (dict) и их вершины для сравнения с эталоном."""
+    return [(dict(row), store.vertices(i).copy()) for i, row in enumerate(store)]
+
+
+def _assert_rows_equal(store, expected):
+    assert len(store) == len(expected)
+    for (row, vertices), (expected_row, expected_vertices) in zip(_snapshot(store), expected):
+        assert row == expected_row
+        np.testing.assert_array_equal(vertices, expected_vertices)
+
+
+def test_extend_matches_concatenation():
+    first, second = build_segments(300, seed=1), build_segments(500, seed=2)
+    expected = _snapshot(first) + _snapshot(second)
+    store = SegmentStore()
+    store.extend(first)
+    store.extend(second)
+    _assert_rows_equal(store, expected)
+    # Таблица имен содержит имена обеих частей без дубликатов
+    assert len(store.names) == len(set(store.names))
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_random_replaces_match_list_model(seed):
+    rng = np.random.default_rng(seed)
+    store = build_segments(400, seed=seed)
+    expected = _snapshot(store)
+    # Достаточно замен, чтобы сработало уплотнение вершин
+    for step in range(40):
+        start = int(rng.integers(0, len(store) + 1))
+        count = int(rng.integers(0, min(50, len(store) - start) + 1))
+        other = build_segments(int(rng.integers(0, 60)), seed=seed * 100 + step)
+        store.replace(start, count, other)
+        expected[start:start + count] = _snapshot(other)
+        _assert_rows_equal(store, expected)
+    assert store._live_vertices == int(store.vertex_count.sum())
+
+
+def test_replace_rejects_out_of_range():
+    store = build_segments(10)
+    with pytest.raises(IndexError):
+        store.replace(8, 5, build_segments(1))
+
+
+def test_slice_is_independent_copy():
+    store = build_segments(200)
+    expected = _snapshot(store)[50:120]
+    part = store[50:120]
+    _assert_rows_equal(part, expected)
+    # Вершины среза лежат подряд с начала массива
+    assert part.vertex_start[0] == 0
+    assert len(part.coords) == int(part.vertex_count.sum())
+    part.cur_load[:] = 0.0
+    assert store.cur_load[50:120].any()
+    _assert_rows_equal(store[:0], [])
+    with pytest.raises(ValueError):
+        store[::2]
+
+
+def test_pickle_round_trip_drops_replaced_vertices():
+    store = build_segments(300)
+    store.replace(10, 20, build_segments(20, seed=3))
+    assert store._vertex_size > store._live_vertices
+    restored = pickle.loads(pickle.dumps(store))
+    _assert_rows_equal(restored, _snapshot(store))
+    assert len(restored.coords) == int(restored.vertex_count.sum())
+    assert set(restored._arrays) == set(COLUMNS)
+
+
+def test_field_values_match_rows(segments):
+    for field in dict(segments[0]):
+        assert segments.field_values(field) == [row[field] for row in segments]
+
+
+def _recount(store):
+    """Сводка по ТИРам и классам дорог полным пересчетом строк."""
+    counts = np.zeros((len(model.TIER_LABELS), len(CLASS_LABELS)), dtype=np.int64)
+    np.add.at(counts, (store.tier.astype(np.int64) - 1, store.road_class.astype(np.int64)), 1)
+    return counts
+
+
+def test_tier_summary_follows_extend_and_replace():
+    rng = np.random.default_rng(4)
+    store = build_segments(300, seed=4)
+    summary = TierSummary()
+    summary.add(store.tier, store.road_class)
+    np.testing.assert_array_equal(summary.counts, _recount(store))
+    # Обновление, как в SegmentTableModel: старые строки вычитаются, новые добавляются
+    for step in range(30):
+        other = build_segments(int(rng.integers(0, 80)), seed=40 + step)
+        if step % 3 == 0:
+            store.extend(other)
+        else:
+            start = int(rng.integers(0, len(store) + 1))
+            count = int(rng.integers(0, min(60, len(store) - start) + 1))
+            summary.remove(store.tier[start:start + count], store.road_class[start:start + count])
+            store.replace(start, count, other)
+        summary.add(other.tier, other.road_class)
+        np.testing.assert_array_equal(summary.counts, _recount(store))
+    assert summary.total() == len(store)
+
+
+def test_tier_summary_costs_match_recommended_actions(segments):
+    summary = TierSummary()
+    summary.add(segments.tier, segments.road_class)
+    expected = np.zeros_like(summary.costs())
+    for row in segments:
+        action = model.select_optimal_action(model.TIER_LABELS[row['Tier'] - 1], row['RoadClass'])
+        expected[row['Tier'] - 1, CLASS_LABELS.index(row['RoadClass'])] += action['cost']
+    np.testing.assert_allclose(summary.costs(), expected)
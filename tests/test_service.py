@@ -0,0 +1,174 @@
+import asyncio
+import json
+import threading
+
+import numpy as np
+import pytest
+
+import service
+from model import MODEL_VERSION, get_recommendation, score_batch, score_segment
+from segments import SegmentStore
+from service import AnalysisService, ServiceClient, ServiceError, dataset_hash
+
+
+@pytest.fixture(scope='module')
+def analysis(segments):
+    analysis = AnalysisService(segments, workers=0, seed=7)
+    yield analysis
+    analysis.close()
+
+
+def _get(analysis, target, method='GET', body=b''):
+    status, content_type, payload = asyncio.run(analysis.dispatch(method, target, body))
+    if content_type.startswith('application/json'):
+        return status, json.loads(payload)
+    return status, payload.decode('utf-8')
+
+
+def _post(analysis, request):
+    return _get(analysis, '/score/batch', 'POST', json.dumps(request).encode('utf-8'))
+
+
+def test_health_and_histogram(analysis, segments):
+    status, health = _get(analysis, '/health')
+    assert status == 200
+    assert health['segments'] == len(segments)
+    assert health['dataset'] == dataset_hash(segments, 7)
+    assert health['model_version'] == MODEL_VERSION
+    status, histogram = _get(analysis, '/histogram')
+    assert sum(histogram['tiers'].values()) == len(segments)
+    assert sum(map(sum, histogram['classes'].values())) == len(segments)
+
+
+def test_segment_score_and_recommendation(analysis, segments):
+    row = 17
+    status, score = _get(analysis, f'/segments/{row}/score?name={segments[row]["ST_NAME"]}&dataset={analysis.dataset}')
+    assert status == 200
+    expected = score_segment(segments[row])
+    assert score['severity'] == expected['severity'] and score['tier_level'] == expected['tier_level']
+    assert score['action'] == expected['action'] and score['row'] == row
+    status, html = _get(analysis, f'/segments/{row}/recommendation')
+    assert status == 200 and html == get_recommendation(segments[row])
+
+
+def test_spillover_is_scored_and_not_cached(analysis, segments):
+    entries = len(analysis.cache)
+    status, score = _get(analysis, '/segments/3/score?spillover=0.25')
+    assert status == 200
+    assert score['severity'] == score_segment(dict(segments[3], SpilloverLoad=0.25))['severity']
+    assert len(analysis.cache) == entries
+
+
+@pytest.mark.parametrize('target, status', [
+    ('/segments/abc/score', 400),
+    ('/segments/5/score?spillover=x', 400),
+    ('/segments/-1/score', 404),
+    ('/segments/999999/score', 404),
+    ('/segments/5/score?name=Другая', 409),
+    ('/segments/5/score?dataset=0000000000000000', 409),
+    ('/segments/999999/recommendation?dataset=0000000000000000', 409),
+    ('/segments/5/other', 404),
+    ('/unknown', 404),
+])
+def test_segment_errors(analysis, target, status):
+    code, body = _get(analysis, target)
+    assert code == status
+    assert 'error' in body
+
+
+def test_methods(analysis):
+    assert _get(analysis, '/health', 'POST')[0] == 405
+    assert _get(analysis, '/score/batch')[0] == 405
+
+
+def test_batch_rows_and_segments(analysis, segments):
+    rows = [0, 5, 5, len(segments) - 1]
+    status, result = _post(analysis, {'rows': rows, 'dataset': analysis.dataset})
+    assert status == 200
+    expected = score_batch(**{name: values[rows] for name, values in segments.score_columns().items()})
+    assert result['rows'] == rows
+    assert result['severity'] == expected['severity'].tolist()
+    assert result['tier'] == expected['tier'].tolist()
+
+    records = [dict(segments[row]) for row in rows]
+    status, result = _post(analysis, {'segments': records})
+    assert status == 200 and result['severity'] == expected['severity'].tolist()
+
+
+@pytest.mark.parametrize('request_body, status', [
+    ({'rows': [1], 'segments': []}, 400),
+    ({}, 400),
+    ({'rows': [1.5]}, 400),
+    ({'rows': [10 ** 6]}, 404),
+    ({'rows': [1], 'dataset': 'other'}, 409),
+    ({'segments': [1, 2]}, 400),
+    ({'segments': [{'ST_NAME': 'x', 'CurLoad': 'abc'}]}, 400),
+])
+def test_batch_errors(analysis, request_body, status):
+    assert _post(analysis, request_body)[0] == status
+    assert _get(analysis, '/score/batch', 'POST', b'{not json')[0] == 400
+
+
+def test_dataset_hash_tracks_names_seed_and_columns(segments):
+    base = dataset_hash(segments)
+    assert dataset_hash(segments.copy()) == base
+    assert dataset_hash(segments, seed=1) != base
+    changed = segments.copy()
+    changed.cur_load[10] += 0.01
+    assert dataset_hash(changed) != base
+    renamed = segments.copy()
+    renamed.replace(0, 1, SegmentStore.from_records([dict(segments[0], ST_NAME='Другое имя')]))
+    assert dataset_hash(renamed) != base
+    # Та же улица, но строки переставлены
+    assert dataset_hash(segments[1:]) != dataset_hash(segments[:-1])
+
+
+def test_client_against_running_server(segments, monkeypatch):
+    # Пакеты от 10 участков - в пуле из двух процессов
+    monkeypatch.setattr(service, 'POOL_MIN_BATCH', 10)
+    analysis = AnalysisService(segments, workers=2)
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(analysis.start('127.0.0.1', 0))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        client = ServiceClient(f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}")
+        dataset = client.health()['dataset']
+        assert dataset == analysis.dataset
+        row = 42
+        assert client.recommendation(row, name=segments[row]['ST_NAME'], dataset=dataset) == \
+            get_recommendation(segments[row])
+        assert client.score(row, dataset=dataset)['severity'] == score_segment(segments[row])['severity']
+        with pytest.raises(ServiceError, match='Набор данных'):
+            client.recommendation(row, dataset='0' * 16)
+
+        rows = np.arange(0, len(segments), 7).tolist()
+        result = client.score_batch(rows, dataset=dataset)
+        assert result['severity'] == segments.severity[rows].tolist()
+        assert analysis._pool is not None
+        with pytest.raises(ServiceError):
+            client.score_batch([1], dataset='other')
+    finally:
+        loop.call_soon_threadsafe(server.close)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        analysis.close()
+
+
+def test_client_reports_unreachable_service():
+    with pytest.raises(ServiceError, match='недоступен'):
+        ServiceClient('http://127.0.0.1:9', timeout=2).health()
+
+
+@pytest.mark.parametrize('argv, address', [
+    ([], (service.DEFAULT_HOST, service.DEFAULT_PORT)),
+    (['--port', '0'], (service.DEFAULT_HOST, 0)),
+    (['--host', '', '--port', '9000'], ('', 9000)),
+])
+def test_main_passes_host_and_port(monkeypatch, tmp_path, argv, address):
+    import main
+
+    calls = []
+    monkeypatch.setattr(service, 'run_service', lambda data_dir, host, port, *args, **kwargs: calls.append((host, port)) or 0)
+    assert main.main(['--serve', str(tmp_path)] + argv) == 0
+    assert calls == [address]
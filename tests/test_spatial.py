@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from conftest import build_segments
+from segments import SegmentStore
+from spatial import MAX_CELLS_PER_SEGMENT, SpatialIndex
+
+
+@pytest.fixture(scope='module')
+def store():
+    """Синтетическая сеть плюс особые участки: длинный, без геометрии, MultiLineString, точка."""
+    store = build_segments(1500, seed=5)
+    store.extend(SegmentStore.from_records([
+        {'ST_NAME': 'Длинный', 'CurLoad': 0.5, 'Geometry': [(37.55, 55.70), (37.59, 55.737)]},
+        {'ST_NAME': 'Без геометрии', 'CurLoad': 0.5},
+        {'ST_NAME': 'Две части', 'CurLoad': 0.5,
+         'Geometry': [(37.56, 55.71), (37.561, 55.711), (np.nan, np.nan), (37.58, 55.73), (37.581, 55.731)]},
+        {'ST_NAME': 'Точка', 'CurLoad': 0.5, 'Geometry': [(37.57, 55.72)]},
+    ]))
+    return store
+
+
+@pytest.fixture(scope='module')
+def index(store):
+    return SpatialIndex.build(store)
+
+
+def _query_points(count=40, seed=0):
+    rng = np.random.default_rng(seed)
+    # Точки внутри сети и за ее пределами
+    return np.column_stack((rng.uniform(37.53, 37.61, count), rng.uniform(55.69, 55.75, count)))
+
+
+def test_long_segment_is_kept_outside_grid(store, index):
+    assert len(store) - 4 in index.large_ids.tolist()
+    assert len(store) - 4 not in index.cell_ids.tolist()
+    assert index.shape[0] * index.shape[1] > MAX_CELLS_PER_SEGMENT
+
+
+def test_query_bbox_matches_brute_force(index):
+    rng = np.random.default_rng(1)
+    for lon, lat in _query_points():
+        size = rng.uniform(0.0001, 0.02, 2)
+        x0, y0 = index.project(lon, lat)
+        x1, y1 = index.project(lon + size[0], lat + size[1])
+        bbox = index.bbox
+        with np.errstate(invalid='ignore'):
+            expected = np.flatnonzero((bbox[:, 0] <= x1) & (bbox[:, 2] >= x0) & (bbox[:, 1] <= y1) & (bbox[:, 3] >= y0))
+        np.testing.assert_array_equal(index.query_bbox(lon, lat, lon + size[0], lat + size[1]), expected)
+
+
+@pytest.mark.parametrize('radius', [5.0, 50.0, 400.0, 5000.0])
+def test_query_radius_matches_brute_force(store, index, radius):
+    everything = np.arange(len(store))
+    for lon, lat in _query_points():
+        d = index.distances(everything, lon, lat)
+        ids, distances = index.query_radius(lon, lat, radius)
+        assert sorted(ids.tolist()) == np.flatnonzero(d <= radius).tolist()
+        np.testing.assert_array_equal(distances, d[ids])
+        assert (np.diff(distances) >= 0).all()
+
+
+def test_nearest_matches_brute_force(store, index):
+    everything = np.arange(len(store))
+    for lon, lat in _query_points():
+        d = index.distances(everything, lon, lat)
+        ids, distances = index.nearest(lon, lat, k=5)
+        np.testing.assert_allclose(distances, np.sort(d)[:5])
+        np.testing.assert_array_equal(d[ids], distances)
+    lon, lat = 37.0, 55.0
+    ids, distances = index.nearest(lon, lat, k=3, max_distance=100.0)
+    assert len(ids) == 0
+
+
+def test_distances_of_special_segments(store, index):
+    n = len(store)
+    d = index.distances([n - 3, n - 2, n - 1], 37.57, 55.72)
+    assert d[0] == np.inf
+    assert 0 < d[1] < np.inf
+    assert d[2] == 0.0
+
+
+def test_save_and_load(tmp_path, store, index):
+    path = str(tmp_path / 'index.npz')
+    index.save(path, key='abc')
+    loaded = SpatialIndex.load(path, store, key='abc')
+    np.testing.assert_array_equal(loaded.cell_ids, index.cell_ids)
+    lon, lat = _query_points(1)[0]
+    np.testing.assert_array_equal(loaded.nearest(lon, lat, k=10)[0], index.nearest(lon, lat, k=10)[0])
+    # Другой ключ, другое число строк или поврежденный файл - индекс строится заново
+    assert SpatialIndex.load(path, store, key='other') is None
+    assert SpatialIndex.load(path, store[:10], key='abc') is None
+    (tmp_path / 'broken.npz').write_bytes(b'not a zip')
+    assert SpatialIndex.load(str(tmp_path / 'broken.npz'), store) is None
+
+
+def test_empty_store():
+    index = SpatialIndex.build(SegmentStore())
+    ids, distances = index.nearest(37.5, 55.7)
+    assert len(ids) == len(distances) == 0
+    assert len(index.query_bbox(37.0, 55.0, 38.0, 56.0)) == 0